@@ -0,0 +1,151 @@
+"""bench_cookie_export.py — 06_export_cookies.py の Cookie 読み取り・復号のベンチマーク
+
+Linux Chrome と同じ形式（v10、meta version 24 の SHA-256 プレフィックス付き）の
+合成 Cookie DB を一時ディレクトリに生成し、read_cookies の読み取り・復号のスループットを計測する。
+復号結果が元の値と一致するかも検証する。全件読み取りと差分同期（--sync）の所要時間も比較する。Chrome もネットワーク接続も不要。
+
+使い方:
+  uv run python benchmarks/bench_cookie_export.py
+  uv run python benchmarks/bench_cookie_export.py --cookies 100000 --out bench_cookies.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import importlib
+import json
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+EXAMPLES_DIR = PROJECT_DIR / "examples"
+
+_SCHEMA = """
+CREATE TABLE meta (key LONGVARCHAR NOT NULL UNIQUE PRIMARY KEY, value LONGVARCHAR);
+CREATE TABLE cookies (
+    creation_utc INTEGER NOT NULL, host_key TEXT NOT NULL, top_frame_site_key TEXT NOT NULL DEFAULT '',
+    name TEXT NOT NULL, value TEXT NOT NULL, encrypted_value BLOB NOT NULL, path TEXT NOT NULL,
+    expires_utc INTEGER NOT NULL, is_secure INTEGER NOT NULL, is_httponly INTEGER NOT NULL,
+    last_access_utc INTEGER NOT NULL, has_expires INTEGER NOT NULL DEFAULT 1,
+    is_persistent INTEGER NOT NULL DEFAULT 1, priority INTEGER NOT NULL DEFAULT 1,
+    samesite INTEGER NOT NULL DEFAULT -1, source_scheme INTEGER NOT NULL DEFAULT 0,
+    source_port INTEGER NOT NULL DEFAULT -1, last_update_utc INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def encrypt_value(exporter, host: str, value: str) -> bytes:
+    """Chrome（meta version 24 以上）と同じ形式で値を暗号化する。"""
+    from Crypto.Cipher import AES
+    from Crypto.Util.Padding import pad
+
+    plaintext = hashlib.sha256(host.encode()).digest() + value.encode()
+    cipher = AES.new(exporter.get_encryption_key("v10"), AES.MODE_CBC, exporter.IV)
+    return b"v10" + cipher.encrypt(pad(plaintext, 16))
+
+
+def make_cookies_db(exporter, path: Path, count: int, value_size: int) -> dict[tuple[str, str], str]:
+    """合成 Cookie DB を作成し、(host, name) → 平文の値 を返す。"""
+    conn = sqlite3.connect(path)
+    conn.executescript(_SCHEMA)
+    conn.execute("INSERT INTO meta VALUES ('version', '24')")
+    expected = {}
+    now = (int(time.time()) + 11644473600) * 1_000_000
+    rows = []
+    for i in range(count):
+        host = f".site{i % 500}.example"
+        name = f"c{i}"
+        value = (f"{i:08d}" * (value_size // 8 + 1))[:value_size]
+        expected[(host, name)] = value
+        rows.append((now, host, name, "", encrypt_value(exporter, host, value), "/", now + 86400_000_000, 1, 0, now, i % 3, now + i))
+    conn.executemany(
+        "INSERT INTO cookies (creation_utc, host_key, name, value, encrypted_value, path, expires_utc,"
+        " is_secure, is_httponly, last_access_utc, samesite, last_update_utc) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    conn.commit()
+    conn.close()
+    return expected
+
+
+def bench_read(exporter, path: Path, repeat: int, expected: dict) -> dict:
+    samples = []
+    for _ in range(repeat):
+        conn = sqlite3.connect(path)
+        start = time.perf_counter()
+        cookies = exporter.read_cookies(conn, None)
+        samples.append((time.perf_counter() - start) * 1000)
+        conn.close()
+    mismatched = sum(1 for c in cookies if expected.get((c["domain"], c["name"])) != c["value"])
+    median = statistics.median(samples)
+    return {
+        "median_ms": round(median, 2),
+        "min_ms": round(min(samples), 2),
+        "cookies_per_second": round(len(cookies) / (median / 1000)) if median else 0,
+        "mismatched": mismatched,
+    }
+
+
+def bench_sync(exporter, path: Path, repeat: int, delta: int) -> dict:
+    """export_cookies の全件読み取りと、直近 delta 件だけを読む差分同期を比較する。"""
+    _, watermark = exporter.export_cookies("", None, path)
+    since = watermark - delta
+    full, incremental = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        exporter.export_cookies("", None, path)
+        full.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        cookies, _ = exporter.export_cookies("", None, path, since=since, sync=True)
+        incremental.append((time.perf_counter() - start) * 1000)
+    return {
+        "delta": len(cookies),
+        "full_median_ms": round(statistics.median(full), 2),
+        "incremental_median_ms": round(statistics.median(incremental), 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="06_export_cookies の Cookie 読み取り・復号のベンチマーク")
+    parser.add_argument("--cookies", type=int, default=20000, help="合成 DB の Cookie 数")
+    parser.add_argument("--value-size", type=int, default=64, help="Cookie 値のサイズ")
+    parser.add_argument("--repeat", type=int, default=5, help="繰り返し回数")
+    parser.add_argument("--delta", type=int, default=100, help="差分同期で読む（更新された）Cookie 数")
+    parser.add_argument("--out", type=Path, help="結果の JSON 出力先")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(EXAMPLES_DIR))
+    exporter = importlib.import_module("06_export_cookies")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "Cookies"
+        print(f"合成 Cookie DB を作成中（{args.cookies}件）...", file=sys.stderr)
+        expected = make_cookies_db(exporter, path, args.cookies, args.value_size)
+        print("read ...", file=sys.stderr)
+        read = bench_read(exporter, path, args.repeat, expected)
+        print("sync ...", file=sys.stderr)
+        sync = bench_sync(exporter, path, args.repeat, args.delta)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": {"cookies": args.cookies, "value_size": args.value_size, "repeat": args.repeat},
+        "read": read,
+        "sync": sync,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.out:
+        args.out.write_text(text + "\n")
+    if read["mismatched"]:
+        print("復号結果が一致しない Cookie があります", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,450 @@
+"""bench_launcher.py — 05_chrome_launcher.py のコマンドエンジンのベンチマーク
+
+ローカルの HTTP サーバで生成したフィクスチャページ（深い DOM、長い XPath、大きなフォーム、
+遅いリソース）に対して execute_command / run_file を実行し、結果を JSON で出力する。
+ネットワーク接続は不要（Chromium のインストールのみ必要）。
+
+計測項目:
+  cold_start        sync_playwright 起動 → chromium.launch → 最初のページ表示まで
+  cli_import        python examples/05_chrome_launcher.py --help の所要時間
+  profile_restore   大きなプロファイルの保存・読み込み（profiles.db）と new_context、最初の遷移
+  url / select / click / input[*]   各コマンドのレイテンシ
+  plan              コマンドファイルのコンパイル（compile）とキャッシュからの読み込み（cached）
+  e2e               コマンドファイル実行のスループット（commands/s）
+
+使い方:
+  uv run python benchmarks/bench_launcher.py
+  uv run python benchmarks/bench_launcher.py --out bench.json --repeat 20
+  uv run python benchmarks/bench_launcher.py --compare bench.json   # 前回結果と比較
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import importlib
+import importlib.metadata
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+EXAMPLES_DIR = PROJECT_DIR / "examples"
+
+# 比較時にこの割合を超えて遅くなった項目を退行とみなす
+REGRESSION_THRESHOLD = 0.2
+
+
+# --- フィクスチャページ ---
+
+def deep_page(depth: int) -> str:
+    """depth 段ネストした div の最下層にボタンを置いたページ。"""
+    opening = "".join(f'<div class="lv{i}"><span>level {i}</span>' for i in range(depth))
+    closing = "</div>" * depth
+    return (
+        "<!doctype html><html><head><title>deep</title></head><body>"
+        f'<div id="root">{opening}<button id="target" onclick="this.textContent=\'clicked\'">go</button>{closing}</div>'
+        "</body></html>"
+    )
+
+
+def deep_xpath(depth: int) -> str:
+    """deep_page のボタンを指す絶対 XPath（記録された長い XPath を模したもの）。"""
+    return '//*[@id="root"]' + "/div" * depth + "/button"
+
+
+def wide_page(count: int) -> str:
+    """count 個の要素を並べたページ。"""
+    items = "".join(f'<li class="item" data-i="{i}"><a href="/item/{i}">item {i}</a></li>' for i in range(count))
+    return f"<!doctype html><html><head><title>wide</title></head><body><ul id=\"list\">{items}</ul></body></html>"
+
+
+def form_page(fields: int) -> str:
+    """多数の入力欄とテキストエリアを持つフォーム。"""
+    inputs = "".join(f'<label>f{i}<input name="f{i}" type="text"></label>' for i in range(fields))
+    return (
+        "<!doctype html><html><head><title>form</title></head><body>"
+        f'<form id="form">{inputs}<textarea id="body" rows="10" cols="80"></textarea>'
+        '<button id="submit" type="button">submit</button></form></body></html>'
+    )
+
+
+def slow_page(resources: int, delay_ms: int) -> str:
+    """遅いサブリソース（画像・スクリプト）を含むページ。"""
+    imgs = "".join(f'<img src="/asset?kind=img&delay={delay_ms}&i={i}">' for i in range(resources))
+    return (
+        "<!doctype html><html><head><title>slow</title>"
+        f'<script src="/asset?kind=js&delay={delay_ms}"></script></head>'
+        f'<body><h1 id="ready">slow</h1>{imgs}</body></html>'
+    )
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        parts = urlsplit(self.path)
+        q = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        content_type = "text/html; charset=utf-8"
+        if parts.path == "/deep":
+            body = deep_page(int(q.get("depth", 30)))
+        elif parts.path == "/wide":
+            body = wide_page(int(q.get("n", 10_000)))
+        elif parts.path == "/form":
+            body = form_page(int(q.get("fields", 200)))
+        elif parts.path == "/slow":
+            body = slow_page(int(q.get("n", 20)), int(q.get("delay", 200)))
+        elif parts.path == "/asset":
+            time.sleep(int(q.get("delay", 0)) / 1000)
+            if q.get("kind") == "js":
+                body, content_type = "window.__loaded = true;", "application/javascript"
+            else:
+                body, content_type = "", "image/gif"
+        else:
+            body = "<!doctype html><html><head><title>index</title></head><body>ok</body></html>"
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_server() -> tuple[ThreadingHTTPServer, str]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# --- 計測ヘルパ ---
+
+def summarize(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "min_ms": round(ordered[0], 2),
+        "median_ms": round(statistics.median(ordered), 2),
+        "p90_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))], 2),
+        "max_ms": round(ordered[-1], 2),
+        "mean_ms": round(statistics.fmean(ordered), 2),
+    }
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def run_command(launcher, cmd: str, page, context, state: dict) -> float:
+    """execute_command を出力を捨てて実行し、所要時間（ms）を返す。失敗したら例外にする。"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        elapsed = timed(lambda: launcher.execute_command(cmd, page, context, "_bench", state))
+    if state.get("last_error"):
+        raise RuntimeError(f"{cmd[:60]}: {state['last_error']}")
+    return elapsed
+
+
+def make_storage_state(base_url: str, cookies: int, origins: int, items: int, value_size: int) -> dict:
+    host = urlsplit(base_url).hostname
+    value = "x" * value_size
+    return {
+        "cookies": [
+            {
+                "name": f"c{i}", "value": value[:64], "domain": host, "path": "/",
+                "expires": -1, "httpOnly": False, "secure": False, "sameSite": "Lax",
+            }
+            for i in range(cookies)
+        ],
+        "origins": [
+            {
+                "origin": base_url if i == 0 else f"http://sub{i}.invalid",
+                "localStorage": [{"name": f"k{j}", "value": value} for j in range(items)],
+            }
+            for i in range(origins)
+        ],
+    }
+
+
+# --- ベンチマーク本体 ---
+
+def bench_cold_start(repeat: int, base_url: str) -> dict:
+    from playwright.sync_api import sync_playwright
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pw = sync_playwright().start()
+        browser = pw.chromium.launch(headless=True)
+        page = browser.new_page()
+        page.goto(base_url + "/")
+        samples.append((time.perf_counter() - start) * 1000)
+        browser.close()
+        pw.stop()
+    return summarize(samples)
+
+
+def bench_cli_import(repeat: int) -> dict:
+    script = EXAMPLES_DIR / "05_chrome_launcher.py"
+    samples = [
+        timed(lambda: subprocess.run([sys.executable, str(script), "--help"], capture_output=True, check=True))
+        for _ in range(repeat)
+    ]
+    return summarize(samples)
+
+
+def bench_profile_restore(browser, base_url: str, repeat: int, args) -> dict:
+    from profile_store import ProfileStore
+
+    state = make_storage_state(base_url, args.cookies, args.origins, args.items, args.value_size)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ProfileStore(Path(tmp) / "profiles.db")
+        save_full = timed(lambda: store.save("bench", state))
+        # 変更なしの保存（差分が無いので書き込みは発生しない）
+        save_noop = [timed(lambda: store.save("bench", state)) for _ in range(repeat)]
+
+        load, new_context, first_goto = [], [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            restored = store.load("bench")
+            load.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            context = browser.new_context(storage_state=restored)
+            new_context.append((time.perf_counter() - start) * 1000)
+            page = context.new_page()
+            first_goto.append(timed(lambda: page.goto(base_url + "/")))
+            context.close()
+        size = store.db_path.stat().st_size
+    return {
+        "db_bytes": size,
+        "save_full_ms": round(save_full, 3),
+        "save_noop": summarize(save_noop),
+        "load": summarize(load),
+        "new_context": summarize(new_context),
+        "first_goto": summarize(first_goto),
+    }
+
+
+def bench_commands(launcher, browser, base_url: str, repeat: int, args) -> dict:
+    context = browser.new_context()
+    page = context.new_page()
+    state = launcher.new_state({"wait": args.wait})
+    launcher.prepare_page(page, state)
+    results: dict[str, dict] = {}
+
+    try:
+        results["url"] = summarize([
+            run_command(launcher, f"url:{base_url}/deep?depth={args.depth}", page, context, state)
+            for _ in range(repeat)
+        ])
+        results["url_slow"] = summarize([
+            run_command(launcher, f"url:{base_url}/slow?n=20&delay={args.slow_ms}", page, context, state)
+            for _ in range(repeat)
+        ])
+
+        xpath = deep_xpath(args.depth)
+        select, click, click_cold = [], [], []
+        for _ in range(repeat):
+            run_command(launcher, f"url:{base_url}/deep?depth={args.depth}", page, context, state)
+            click_cold.append(run_command(launcher, f"click:{xpath}", page, context, state))
+            select.append(run_command(launcher, f"select:{xpath}", page, context, state))
+            click.append(run_command(launcher, f"click:{xpath}", page, context, state))
+        results["select_deep_xpath"] = summarize(select)
+        results["click_deep_xpath"] = summarize(click_cold)
+        results["click_after_select"] = summarize(click)
+
+        run_command(launcher, f"url:{base_url}/wide?n={args.wide}", page, context, state)
+        results["select_wide"] = summarize([
+            run_command(launcher, "select:li.item a", page, context, state) for _ in range(repeat)
+        ])
+
+        text = ("ベンチマーク入力 " * 50)[: args.text_len]
+        run_command(launcher, f"url:{base_url}/form?fields={args.fields}", page, context, state)
+        run_command(launcher, "select:#body", page, context, state)
+        for mode in args.input_modes:
+            samples = []
+            for _ in range(repeat if mode != "human" else 1):
+                page.locator("#body").fill("")
+                samples.append(run_command(launcher, f"input[{mode}]:{text}", page, context, state))
+            results[f"input[{mode}]"] = summarize(samples)
+    finally:
+        context.close()
+    return results
+
+
+def bench_e2e(launcher, browser, base_url: str, args) -> dict:
+    """コマンドファイル全体を run_file で実行し、commands/s を計測する。"""
+    xpath = deep_xpath(args.depth)
+    lines = [f"url:{base_url}/form?fields={args.fields}"]
+    for i in range(args.e2e_steps):
+        lines += [f"select:input[name=f{i % args.fields}]", f"input[fill]:value {i}", "click:#submit"]
+    lines += [f"url:{base_url}/deep?depth={args.depth}", f"select:{xpath}", f"click:{xpath}"]
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        f.write("\n".join(lines) + "\n")
+        path = f.name
+
+    context = browser.new_context()
+    page = context.new_page()
+    state = launcher.new_state({"wait": args.wait})
+    launcher.prepare_page(page, state)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            elapsed = timed(lambda: launcher.run_file(path, page, context, "_bench", state))
+    finally:
+        context.close()
+        Path(path).unlink(missing_ok=True)
+    return {
+        "commands": len(lines),
+        "seconds": round(elapsed / 1000, 3),
+        "commands_per_second": round(len(lines) / (elapsed / 1000), 2),
+    }
+
+
+def bench_plan(launcher, repeat: int, args) -> dict:
+    """コマンドファイルのコンパイル（解析・検査）と、キャッシュからの読み込みの所要時間。"""
+    from command_plan import PlanCache
+
+    lines = []
+    for i in range(args.plan_lines // 8):
+        lines += [
+            f"url[networkidle]:https://example.com/{i}",
+            f"select:{deep_xpath(args.depth)}",
+            "input[chunk=4]:<<END",
+            "hello",
+            "END",
+            "ss[jpeg=70,full]",
+            "extract[text,href,limit=10]:a",
+            "wait:100",
+        ]
+    results = {"lines": len(lines), "compile": [], "cached": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "plan.txt"
+        path.write_text("\n".join(lines) + "\n")
+        for i in range(repeat):
+            # 実行ごとに別のキャッシュディレクトリを使い、1回目は必ずコンパイルする
+            cache = PlanCache(Path(tmp) / f"plans{i}")
+            results["compile"].append(timed(lambda: cache.compile_file(path, launcher.command_table())))
+            results["cached"].append(timed(lambda: cache.compile_file(path, launcher.command_table())))
+    return {
+        "lines": results["lines"],
+        "compile": summarize(results["compile"]),
+        "cached": summarize(results["cached"]),
+    }
+
+
+def compare(current: dict, baseline: dict) -> int:
+    """median_ms（e2e は commands_per_second）を比較し、退行した項目数を返す。"""
+    regressions = 0
+
+    def walk(cur: dict, base: dict, prefix: str) -> None:
+        nonlocal regressions
+        for key, value in cur.items():
+            if key not in base or not isinstance(value, dict):
+                continue
+            name = f"{prefix}{key}"
+            if "median_ms" in value:
+                old, new = base[key]["median_ms"], value["median_ms"]
+                ratio = (new - old) / old if old else 0.0
+                worse = ratio > REGRESSION_THRESHOLD
+            elif "commands_per_second" in value:
+                old, new = base[key]["commands_per_second"], value["commands_per_second"]
+                ratio = (old - new) / old if old else 0.0
+                worse = ratio > REGRESSION_THRESHOLD
+            else:
+                walk(value, base[key], f"{name}.")
+                continue
+            regressions += worse
+            mark = "退行" if worse else "OK"
+            print(f"  {mark:<4} {name}: {old} → {new} ({ratio:+.0%})", file=sys.stderr)
+
+    walk(current["results"], baseline["results"], "")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="05_chrome_launcher コマンドエンジンのベンチマーク")
+    parser.add_argument("--repeat", type=int, default=10, help="各項目の繰り返し回数")
+    parser.add_argument("--out", type=str, help="結果 JSON の出力先（省略時は標準出力）")
+    parser.add_argument("--compare", type=str, help="比較対象の結果 JSON（退行があれば終了コード 1）")
+    parser.add_argument("--wait", type=str, default="commit", help="url:/click: の待機戦略")
+    parser.add_argument("--depth", type=int, default=40, help="深い DOM の段数")
+    parser.add_argument("--wide", type=int, default=20_000, help="幅広ページの要素数")
+    parser.add_argument("--fields", type=int, default=300, help="フォームの入力欄の数")
+    parser.add_argument("--slow-ms", type=int, default=300, help="遅いリソースの遅延（ms）")
+    parser.add_argument("--text-len", type=int, default=500, help="input: の文字数")
+    parser.add_argument("--input-modes", type=str, default="fill,insert,chunk", help="計測する入力方式")
+    parser.add_argument("--e2e-steps", type=int, default=50, help="e2e のフォーム操作回数")
+    parser.add_argument("--cookies", type=int, default=2000, help="プロファイルの Cookie 数")
+    parser.add_argument("--origins", type=int, default=20, help="プロファイルの origin 数")
+    parser.add_argument("--items", type=int, default=200, help="origin ごとの localStorage 件数")
+    parser.add_argument("--value-size", type=int, default=512, help="localStorage の値のサイズ")
+    parser.add_argument("--skip-cold", action="store_true", help="cold_start / cli_import を省略")
+    parser.add_argument("--plan-lines", type=int, default=20_000, help="plan（コマンドファイルのコンパイル）の行数")
+    args = parser.parse_args()
+    args.input_modes = [m for m in args.input_modes.split(",") if m]
+
+    sys.path.insert(0, str(EXAMPLES_DIR))
+    launcher = importlib.import_module("05_chrome_launcher")
+    from playwright.sync_api import sync_playwright
+
+    server, base_url = start_server()
+    results: dict = {}
+    try:
+        if not args.skip_cold:
+            print("cold_start ...", file=sys.stderr)
+            results["cold_start"] = bench_cold_start(max(1, args.repeat // 2), base_url)
+            print("cli_import ...", file=sys.stderr)
+            results["cli_import"] = bench_cli_import(max(1, args.repeat // 2))
+
+        print("plan ...", file=sys.stderr)
+        results["plan"] = bench_plan(launcher, max(1, args.repeat // 2), args)
+
+        with sync_playwright() as pw:
+            browser = pw.chromium.launch(headless=True)
+            print("profile_restore ...", file=sys.stderr)
+            results["profile_restore"] = bench_profile_restore(browser, base_url, args.repeat, args)
+            print("commands ...", file=sys.stderr)
+            results["commands"] = bench_commands(launcher, browser, base_url, args.repeat, args)
+            print("e2e ...", file=sys.stderr)
+            results["e2e"] = bench_e2e(launcher, browser, base_url, args)
+            browser.close()
+    finally:
+        server.shutdown()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "env": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "playwright": importlib.metadata.version("playwright"),
+        },
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+        print(f"結果保存: {args.out}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        print(f"=== 比較: {args.compare} ===", file=sys.stderr)
+        if compare(report, baseline):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""bench_startup.py — ブラウザを使わない CLI 操作の起動時間のベンチマーク
+
+--help や --list-profiles など、ブラウザを起動しない操作をサブプロセスで繰り返し実行し、
+起動から終了までの時間（median）が予算（--budget-ms）に収まっているかを確認する。
+あわせて、05 / 06 を import しただけでは playwright / Crypto が読み込まれないことを確認する。
+
+使い方:
+  uv run python benchmarks/bench_startup.py
+  uv run python benchmarks/bench_startup.py --budget-ms 120 --repeat 20 --out bench_startup.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+EXAMPLES_DIR = PROJECT_DIR / "examples"
+
+DEFAULT_BUDGET_MS = 150
+
+# (名前, 引数)。いずれもブラウザを起動しない
+CASES = [
+    ("launcher_help", ["05_chrome_launcher.py", "--help"]),
+    ("launcher_list_profiles", ["05_chrome_launcher.py", "--list-profiles"]),
+    ("export_cookies_help", ["06_export_cookies.py", "--help"]),
+    ("profile_store_list", ["profile_store.py", "list"]),
+    ("session_journal_list", ["session_journal.py", "list"]),
+]
+
+# import しただけで読み込まれてはいけないモジュール
+HEAVY_MODULES = ("playwright", "Crypto")
+
+_IMPORT_CHECK = """
+import importlib, json, sys
+sys.path.insert(0, {examples!r})
+for name in ("05_chrome_launcher", "06_export_cookies"):
+    importlib.import_module(name)
+print(json.dumps(sorted(m for m in {heavy!r} if m in sys.modules)))
+"""
+
+
+def run_case(args: list[str], repeat: int) -> list[float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], capture_output=True, check=True, cwd=PROJECT_DIR)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(samples: list[float]) -> dict:
+    return {
+        "n": len(samples),
+        "min_ms": round(min(samples), 2),
+        "median_ms": round(statistics.median(samples), 2),
+        "max_ms": round(max(samples), 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ブラウザを使わない CLI 操作の起動時間のベンチマーク")
+    parser.add_argument("--repeat", type=int, default=10, help="繰り返し回数")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help=f"median の上限（既定: {DEFAULT_BUDGET_MS}ms）")
+    parser.add_argument("--out", type=Path, help="結果の JSON 出力先")
+    args = parser.parse_args()
+
+    # Python 自体の起動時間（各項目はこれとの差が CLI 側のコスト）
+    baseline = summarize(run_case(["-c", "pass"], args.repeat))
+    print(f"{'python -c pass':<24} {baseline['median_ms']:>8.1f}ms", file=sys.stderr)
+
+    results = {}
+    over_budget = []
+    for name, case_args in CASES:
+        script = EXAMPLES_DIR / case_args[0]
+        result = summarize(run_case([str(script), *case_args[1:]], args.repeat))
+        result["overhead_ms"] = round(result["median_ms"] - baseline["median_ms"], 2)
+        results[name] = result
+        mark = "OK" if result["median_ms"] <= args.budget_ms else "超過"
+        if mark != "OK":
+            over_budget.append(name)
+        print(f"{name:<24} {result['median_ms']:>8.1f}ms  (+{result['overhead_ms']:.1f}ms)  {mark}", file=sys.stderr)
+
+    check = subprocess.run(
+        [sys.executable, "-c", _IMPORT_CHECK.format(examples=str(EXAMPLES_DIR), heavy=HEAVY_MODULES)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    heavy_imported = json.loads(check.stdout)
+    if heavy_imported:
+        print(f"import 時に読み込まれたモジュール: {', '.join(heavy_imported)}", file=sys.stderr)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "budget_ms": args.budget_ms,
+        "baseline": baseline,
+        "results": results,
+        "heavy_imported": heavy_imported,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.out:
+        args.out.write_text(text + "\n")
+    if over_budget or heavy_imported:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
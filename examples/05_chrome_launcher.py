@@ -12,53 +12,454 @@
   save               現在のセッションをプロファイルに保存
   quit               終了
 
+待機戦略（url: / click: の後の待ち方）:
+  --wait で既定値を指定し、コマンドごとに url[<戦略>]: / click[<戦略>]: で上書きできる。
+    fixed[=ms]     固定時間待機（既定 1000ms、従来の動作）
+    commit         ナビゲーション確定のみ待つ（click: では追加待機なし）
+    networkidle    ネットワークが落ち着くまで待つ
+    quiet[=ms]     DOM 変更が ms ミリ秒止まるまで待つ（既定 500ms）
+    selector=<sel> 指定セレクタの要素が表示されるまで待つ
+  どの戦略も --wait-timeout（既定 10000ms）で打ち切られる。解析と実行は page_actions.py（07 と共通）。
+
+リソースブロック:
+  --block <設定.json> で画像・フォント・解析ビーコンなどのリクエストを page.route で中断する。
+  ルールの書式は request_filter.py を参照。ルールごとのヒット数は終了時に集計表示される。
+
+ネットワークキャプチャ:
+  --capture <path.jsonl|path.har> でリクエスト/レスポンスを書き込みスレッド経由でファイルに出力する。
+  --capture-ring N で直近 N 件をメモリに保持し、net:[件数|URLパターン] で参照できる。
+
+スクリーンショット:
+  ss[<オプション>][:<selector>] で撮影する。保存はワーカースレッドで行い、直前と同じ画像は保存しない。
+    png / jpeg[=品質] / webp[=品質]   画像形式（既定は --ss-format）
+    full                              フルページ
+    clip=x,y,w,h                      範囲指定
+  例: ss[jpeg=70]  ss[webp=80,full]  ss://*[@id="main"]
+  --auto-ss 秒 でコマンドの合間に定期撮影する（--auto-ss-budget で最大枚数）。
+
+データ抽出:
+  extract[<フィールド>]:<selector> で一致した全要素のフィールドを JSONL に書き出す。
+  要素はページ側に保持し、page=<n> 件ずつ取り出すため 10 万件規模のページでも往復回数が少ない。
+    text / inner_text / html / tag / href / src / value / @属性 / css:プロパティ / prop:名前
+    out=<path>（既定 logs/extract_<日時>.jsonl）/ limit=<n> / page=<n>
+  例: extract[text,href,out=links.jsonl]:a   extract[@data-id,css:color,limit=100]:.item
+
+メモリ:
+  --mem-limit MB で JS ヒープ使用量がしきい値を超えたとき、--recycle-every N で N コマンドごとに、
+  storage_state を引き継いでコンテキストを作り直し、同じ URL を開き直す（memory_governor.py）。
+  計測値は logs/memory_<日時>_<プロファイル>.jsonl に記録し、mem で直近の値を表示する。
+  --low-memory で Chromium をメモリ節約用のオプションで起動する。
+
+セレクタの最適化:
+  --optimize-selectors で select: / click: の長い XPath を、同じ要素を指す短いセレクタ
+  （data-testid → id → role+name → 短い CSS パス）に置き換えてジャーナルに記録する。
+  置き換えはサイトごとに logs/selector_cache.json にキャッシュする（selector_optimizer.py）。
+
+計測:
+  各コマンドの所要時間（total）と内訳（resolve / action / post_wait）をヒストグラムに集計する。
+  stats でパーセンタイルを表示し、終了時に logs/metrics_<日時>.json（--metrics で変更可）に出力する。
+
+入力方式（input: の打ち方）:
+  --input-mode で既定値を指定し、input[<方式>]:<text> で上書きできる。
+    human          1文字ずつ 80〜300ms 間隔で打鍵（既定、従来の動作）
+    fill           locator.fill で一括設定
+    insert         keyboard.insert_text で一括挿入（input イベントのみ発生）
+    chunk[=n]      n 文字ずつ（既定 8）ブラウザ側で挿入し、チャンク間にランダム待機
+
 使い方:
   uv run python examples/05_chrome_launcher.py                    # 対話で選択
   uv run python examples/05_chrome_launcher.py -p myprofile       # プロファイル指定
   uv run python examples/05_chrome_launcher.py -p myprofile -u https://example.com
   uv run python examples/05_chrome_launcher.py -p myprofile -f commands.txt
+  uv run python examples/05_chrome_launcher.py -p myprofile -f commands.txt --wait quiet=300
+  uv run python examples/05_chrome_launcher.py --batch jobs.jsonl -j 4 --headless
+  uv run python examples/05_chrome_launcher.py -f commands.txt --check        # 検査のみ
+  generate_commands | uv run python examples/05_chrome_launcher.py -p myprofile -f - --headless
+
+コマンドファイルのコンパイル:
+  -f / --batch のコマンドファイルはブラウザを起動する前にコマンドの表（command_table()）で検査し、
+  不明なコマンドや不正な引数（wait:abc、url[foo]: など）があれば実行せずに終了する。
+  コンパイル結果は内容のハッシュごとに logs/plans/ にキャッシュする（command_plan.py）。
+  -f - は標準入力を1行ずつコンパイルしながら実行する（全体を読み終わるのを待たない）。
+
+データ駆動の実行:
+  -f のコマンドファイルに {{変数}} を書き、--data <rows.csv|rows.jsonl> で1行ずつ値を埋めて実行する。
+  ブラウザ・コンテキスト・ページは全行で使い回す。行ごとの結果は logs/data_<コマンド>_<データ>.jsonl
+  （--data-results で変更可）に追記し、再実行すると成功済みの行は飛ばす（data_rows.py）。
+    uv run python examples/05_chrome_launcher.py -p teddy -f post.txt --data messages.csv --headless
+
+バッチモード:
+  --batch には1行1ジョブの JSONL を渡す（profile と file は必須、url は任意）。
+    {"profile": "teddy", "file": "sample/commands.txt"}
+    {"profile": "alice", "file": "sample/commands.txt", "url": "https://x.com"}
+  ワーカーごとにブラウザを1回だけ起動し、ジョブごとに new_context で
+  プロファイルを切り替えるため、ブラウザ起動コストはジョブ数に比例しない。
 """
 
 from __future__ import annotations
 
 import argparse
+import functools
 import json
-import random
+import queue
+import sys
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
 
-from playwright.sync_api import sync_playwright
+# --help / --list-profiles の起動を軽くするため、ここでは引数の定義とプロファイル一覧に要るものだけを読み込む。
+# 機能ごとのモジュール（command_plan, screenshot_pipeline など）は使う関数の中で読み込む
+from memory_governor import DEFAULT_SAMPLE_EVERY as DEFAULT_MEMORY_SAMPLE_EVERY
+from memory_governor import LOW_MEMORY_ARGS
+from page_actions import DEFAULT_INPUT_MODE, DEFAULT_WAIT, DEFAULT_WAIT_TIMEOUT, FIXED_WAIT_MS
+from page_actions import parse_input_mode, parse_wait_strategy, type_text, wait_for_settle
+from profile_store import ProfileStore, format_stats
+
+# screenshot_pipeline.FORMATS と同じ（--ss-format の選択肢のためだけに screenshot_pipeline を読み込まない）
+SCREENSHOT_FORMATS = ("png", "jpeg", "webp")
 
 
 PROJECT_DIR = Path(__file__).resolve().parent.parent
-SCREENSHOTS_DIR = PROJECT_DIR / "screenshots"
 PROFILES_DIR = PROJECT_DIR / "profiles"
 LOGS_DIR = PROJECT_DIR / "logs"
+CHECKPOINTS_DIR = LOGS_DIR / "checkpoints"
+
+# コンパイル済みのコマンドファイルは logs/plans/ に内容のハッシュごとにキャッシュする
+PLANS_DIR = LOGS_DIR / "plans"
+
+# プロファイルは profiles/profiles.db に保存する（従来の profiles/*.json は初回読み込み時に取り込む）
+PROFILE_STORE = ProfileStore(PROFILES_DIR / "profiles.db", legacy_dir=PROFILES_DIR)
 
 # ログに記録しないコマンド
-_NO_LOG_COMMANDS = {"help", "title", "save", "screenshot", "ss"}
+_NO_LOG_COMMANDS = {"help", "title", "save", "screenshot", "ss", "net", "stats", "mem"}
+
+# レイテンシを計測するコマンド（不明なコマンドで集計キーが増え続けないように限定する）
+_TIMED_COMMANDS = {"url", "select", "click", "input", "ss", "screenshot", "wait", "title", "save", "net", "extract"}
+
+# 失敗時にリトライしないコマンド（途中まで入力された可能性があり、やり直すと二重に入力される）
+_NO_RETRY_COMMANDS = {"input", "quit"}
+
+# コマンドファイル実行時のエラー処理の既定値
+DEFAULT_ON_ERROR = "continue"
+DEFAULT_RETRY_BACKOFF_MS = 500
+# チェックポイントはコマンドごとに storage_state の取得とファイル書き込みがかかるため、既定では保存しない
+# （--checkpoint-every で有効化。--resume で再開するときは指定が無ければ 1 として続きも保存する）
+DEFAULT_CHECKPOINT_EVERY = 0
+
+# select: で一致要素を1回の evaluate で調べ、先頭要素に参照用の属性を付ける
+SELECTOR_REF_ATTR = "data-pw-ref"
+CACHED_CLICK_TIMEOUT = 2000
+
+_INSPECT_JS = """
+(els, [attr, newRef]) => {
+    if (els.length === 0) return {count: 0};
+    const el = els[0];
+    const ref = el.getAttribute(attr) || newRef;
+    el.setAttribute(attr, ref);
+    const rect = el.getBoundingClientRect();
+    const style = getComputedStyle(el);
+    return {
+        count: els.length,
+        ref,
+        tag: el.tagName,
+        text: (el.textContent || "").trim().slice(0, 200),
+        visible: rect.width > 0 && rect.height > 0 && style.visibility !== "hidden" && style.display !== "none",
+        box: {x: rect.x, y: rect.y, width: rect.width, height: rect.height},
+    };
+}
+"""
+
+
+def record_wait(state: dict, name: str, kind: str, elapsed_ms: float) -> None:
+    """url: / click: の後の待機時間を集計する。"""
+    stats = state.setdefault("wait_stats", {})
+    entry = stats.setdefault(f"{name}[{kind}]", {"count": 0, "total_ms": 0.0})
+    entry["count"] += 1
+    entry["total_ms"] += elapsed_ms
+
+
+def record_input(state: dict, mode: str, chars: int, elapsed_ms: float) -> None:
+    """input: の入力時間を方式ごとに集計する。"""
+    stats = state.setdefault("input_stats", {})
+    entry = stats.setdefault(mode, {"count": 0, "chars": 0, "total_ms": 0.0})
+    entry["count"] += 1
+    entry["chars"] += chars
+    entry["total_ms"] += elapsed_ms
+
+
+def print_run_summary(state: dict) -> None:
+    """待機時間（固定 1000ms との差）と入力時間の集計を表示する。"""
+    stats = state.get("wait_stats")
+    if stats:
+        print("=== 待機時間 ===")
+        for key, entry in sorted(stats.items()):
+            avg = entry["total_ms"] / entry["count"]
+            saved = FIXED_WAIT_MS * entry["count"] - entry["total_ms"]
+            print(f"  {key}: {entry['count']}回 平均 {avg:.0f}ms（固定 {FIXED_WAIT_MS}ms 比 {-saved:+.0f}ms）")
+
+    stats = state.get("input_stats")
+    if stats:
+        print("=== 入力時間 ===")
+        for mode, entry in sorted(stats.items()):
+            seconds = entry["total_ms"] / 1000
+            rate = entry["chars"] / seconds if seconds > 0 else 0.0
+            print(f"  input[{mode}]: {entry['count']}回 {entry['chars']}文字 {seconds:.2f}s（{rate:.0f}文字/s）")
+
+    if state.get("request_filter"):
+        state["request_filter"].print_summary()
+
+    if state.get("net_capture"):
+        print("=== ネットワークキャプチャ ===")
+        print(f"  {state['net_capture'].summary()}")
+
+    if state.get("screenshots"):
+        print("=== スクリーンショット ===")
+        print(f"  {state['screenshots'].summary()}")
+
+    if state.get("selector_optimizer"):
+        print("=== セレクタ最適化 ===")
+        print(f"  {state['selector_optimizer'].summary()}")
+
+    if state.get("memory"):
+        print("=== メモリ ===")
+        print(f"  {state['memory'].summary()}")
+
+
+def phase(state: dict, command: str, name: str):
+    """フェーズの所要時間を計測するコンテキストマネージャを返す（計測無効なら何もしない）。"""
+    metrics = state.get("metrics")
+    if metrics is None:
+        from contextlib import nullcontext
+
+        return nullcontext()
+    return metrics.phase(command, name)
+
+
+def settle_after(page, name: str, option: str | None, state: dict) -> None:
+    """コマンド後の待機を実行し、かかった時間を記録・表示する。"""
+    kind, value = parse_wait_strategy(option or state.get("wait", DEFAULT_WAIT))
+    if kind == "commit" and name == "click":
+        record_wait(state, name, kind, 0.0)
+        return
+    timeout_ms = state.get("wait_timeout", DEFAULT_WAIT_TIMEOUT)
+    start = time.perf_counter()
+    warning = wait_for_settle(page, kind, value, timeout_ms)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    record_wait(state, name, kind, elapsed_ms)
+    if state.get("metrics") is not None:
+        state["metrics"].record(name, "post_wait", elapsed_ms)
+    if warning is not None:
+        print(f"  {warning}")
+    print(f"  待機: {kind} {elapsed_ms:.0f}ms")
+
+
+def get_screenshots(state: dict):
+    """スクリーンショットのパイプラインを返す（未設定なら既定値で作成する）。"""
+    if state.get("screenshots") is None:
+        from screenshot_pipeline import ScreenshotPipeline
+
+        state["screenshots"] = ScreenshotPipeline(LOGS_DIR)
+    return state["screenshots"]
+
+
+def new_state(options: dict | None = None) -> dict:
+    """コマンド実行用の状態を作成する。options（待機戦略など）はそのまま引き継ぐ。"""
+    return {"selected_element": None, "selector_cache": {}, "ref_seq": 0, **(options or {})}
+
+
+def prepare_page(page, state: dict) -> None:
+    """ページにイベントを登録する。ナビゲーションでセレクタキャッシュを破棄する。"""
+    if state.get("request_filter"):
+        state["request_filter"].install(page)
+    if state.get("net_capture"):
+        state["net_capture"].attach(page)
+
+    def on_navigated(frame) -> None:
+        if frame != page.main_frame:
+            return
+        state["selector_cache"].clear()
+        # 参照属性は遷移で消えるため、選択中の要素は元のセレクタで解決し直す
+        if state.get("selected_selector"):
+            state["selected_element"] = page.locator(state["selected_selector"]).first
+
+    page.on("framenavigated", on_navigated)
+
+
+def start_memory_governor(state: dict, profile_name: str) -> None:
+    """--mem-limit / --recycle-every / --mem-log が指定されていればメモリ監視を開始する。"""
+    if not (state.get("memory_limit") or state.get("recycle_every") or state.get("memory_log")):
+        return
+    from memory_governor import MemoryGovernor
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    state["memory"] = MemoryGovernor(
+        LOGS_DIR / f"memory_{timestamp}_{profile_name}.jsonl",
+        limit_mb=state.get("memory_limit") or 0,
+        recycle_every=state.get("recycle_every") or 0,
+        sample_every=state.get("memory_sample_every", DEFAULT_MEMORY_SAMPLE_EVERY),
+    )
+
+
+def recycle_context(page, context, state: dict, reason: str):
+    """storage_state を引き継いでコンテキストを作り直し、同じ URL を開き直す。
+
+    新しいページとコンテキストを返し、state["page"] / state["context"] にも保持する
+    （呼び出し元はこれを使って続きを実行する）。sessionStorage とページ上の状態は引き継がない。
+    """
+    start = time.perf_counter()
+    url = page.url
+    storage_state = context.storage_state()
+    browser = context.browser
+    context.close()
+    context = browser.new_context(storage_state=storage_state)
+    page = context.new_page()
+    prepare_page(page, state)
+    state["selector_cache"].clear()
+    if url and url != "about:blank":
+        try:
+            page.goto(url, wait_until="domcontentloaded")
+        except Exception as e:
+            print(f"  エラー: {e}")
+    state["page"], state["context"] = page, context
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    state["memory"].recycled(page, reason, elapsed_ms)
+    print(f"  コンテキストを作り直しました（{reason}、{elapsed_ms:.0f}ms）")
+    return page, context
+
+
+def maybe_recycle(page, context, state: dict):
+    """メモリ監視が作り直しを要求していればコンテキストを作り直す。(page, context) を返す。"""
+    governor = state.get("memory")
+    if governor is None:
+        return page, context
+    reason = governor.after_command(page)
+    if reason is None:
+        return page, context
+    return recycle_context(page, context, state, reason)
+
+
+def inspect_selector(page, selector: str, state: dict) -> dict:
+    """セレクタの一致件数・タグ・テキスト・表示状態・位置を1往復で取得する。
+
+    先頭要素には参照属性を付け、以降の click: / input: は属性で高速に解決する。
+    """
+    state["ref_seq"] += 1
+    info = page.locator(selector).evaluate_all(_INSPECT_JS, [SELECTOR_REF_ATTR, str(state["ref_seq"])])
+    if info["count"]:
+        state["selector_cache"][selector] = f'[{SELECTOR_REF_ATTR}="{info["ref"]}"]'
+    else:
+        state["selector_cache"].pop(selector, None)
+    return info
+
+
+def resolve_locator(page, selector: str, state: dict):
+    """select: 済みのセレクタならキャッシュした参照属性で、それ以外は通常どおり解決する。"""
+    ref = state["selector_cache"].get(selector)
+    if ref is not None:
+        return page.locator(ref)
+    return page.locator(selector).first
+
+
+def selected_locator(page, state: dict):
+    """input: の対象（select: で選択中の要素）を返す。
+
+    キャッシュした参照属性の要素が再描画などで消えていれば、選択時のセレクタで解決し直す。
+    """
+    selector = state.get("selected_selector")
+    ref = state["selector_cache"].get(selector) if selector else None
+    if ref is None or page.locator(ref).count():
+        return state["selected_element"]
+    state["selector_cache"].pop(selector, None)
+    state["selected_element"] = page.locator(selector).first
+    return state["selected_element"]
+
+
+def click_selector(page, selector: str, state: dict, fallback: str | None = None) -> str:
+    """要素をクリックする。キャッシュした参照が無効なら元のセレクタで再試行する。
+
+    fallback には最適化前のセレクタを渡す。最適化したセレクタでクリックできなければ
+    キャッシュから外して fallback でクリックする。クリックに使ったセレクタを返す。
+    """
+    from playwright.sync_api import Error as PlaywrightError
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+    ref = state["selector_cache"].get(selector)
+    if ref is not None:
+        try:
+            page.locator(ref).click(timeout=CACHED_CLICK_TIMEOUT)
+            return selector
+        except PlaywrightTimeoutError:
+            state["selector_cache"].pop(selector, None)
+    if fallback is None or fallback == selector:
+        page.locator(selector).first.click()
+        return selector
+    try:
+        page.locator(selector).click(timeout=CACHED_CLICK_TIMEOUT)
+        return selector
+    except PlaywrightError:
+        state["selector_optimizer"].invalidate(page.url, fallback)
+        page.locator(fallback).first.click()
+        return fallback
+
+
+def cached_selector(page, selector: str, state: dict) -> str:
+    """最適化済みのセレクタがキャッシュにあればそれを、無ければ元のセレクタを返す。"""
+    optimizer = state.get("selector_optimizer")
+    if optimizer is None:
+        return selector
+    return optimizer.lookup(page.url, selector) or selector
+
+
+def optimize_selector(page, selector: str, ref: str, state: dict) -> str | None:
+    """長い XPath などを同じ要素を指す短いセレクタに置き換える。置き換えなければ None。"""
+    from selector_optimizer import is_brittle
+
+    optimizer = state.get("selector_optimizer")
+    if optimizer is None or not is_brittle(selector):
+        return None
+    result = optimizer.optimize(page, selector, SELECTOR_REF_ATTR, ref)
+    if result is None:
+        print("  短いセレクタが見つからないため、元のセレクタのまま記録します")
+        return None
+    print(
+        f"  セレクタ最適化 [{result['kind']}]: {result['selector']}"
+        f"（解決 {result['before_ms']:.1f}ms → {result['after_ms']:.1f}ms）"
+    )
+    return result["selector"]
 
 
 def format_command_for_log(cmd: str) -> str | None:
     """コマンドをログ用の文字列に変換する。記録不要なら None を返す。"""
-    bare = cmd.split(":")[0] if ":" in cmd else cmd
-    if bare in _NO_LOG_COMMANDS:
+    from command_plan import parse_command
+
+    name, _, arg = parse_command(cmd)
+    if name in _NO_LOG_COMMANDS:
         return None
 
-    if cmd.startswith("input:"):
-        text = cmd[6:]
-        if "\n" in text:
-            return "input:<<END\n" + text + "\nEND"
-        return cmd
+    if name == "input" and "\n" in arg:
+        head = cmd[: len(cmd) - len(arg)]
+        return head + "<<END\n" + arg + "\nEND"
 
     return cmd
 
 
 def list_profiles() -> list[str]:
     """保存済みプロファイル一覧を返す。"""
-    if not PROFILES_DIR.exists():
-        return []
-    return sorted(p.stem for p in PROFILES_DIR.glob("*.json"))
+    return PROFILE_STORE.names()
+
+
+def new_profile_context(browser, profile_name: str):
+    """プロファイルが存在すればセッションを復元したコンテキストを作成する。"""
+    storage_state = PROFILE_STORE.load(profile_name)
+    if storage_state is not None:
+        return browser.new_context(storage_state=storage_state)
+    return browser.new_context()
+
+
+def save_profile(context, profile_name: str) -> dict:
+    """コンテキストのセッションをプロファイルに差分保存し、変更件数を返す。"""
+    return PROFILE_STORE.save(profile_name, context.storage_state())
 
 
 def select_profile() -> str:
@@ -87,186 +488,639 @@ def select_profile() -> str:
             print("無効な入力です。")
 
 
-def execute_command(cmd: str, page, context, profile_name: str, state: dict) -> bool:
-    """コマンドを1つ実行する。Falseを返すと終了。"""
-    selected_element = state.get("selected_element")
+def _cmd_help(page, context, profile_name: str, state: dict, name: str, option: str | None, arg: str) -> None:
+    print("  url:<URL>          指定URLに遷移")
+    print("  click:<selector>   要素をクリック")
+    print("  select:<selector>  要素を選択（内容を表示）")
+    print("  input:<text>       選択中の要素にテキスト入力")
+    print("  ss[<opt>][:<sel>]  スクリーンショット保存（png, jpeg=q, webp=q, full, clip=x,y,w,h）")
+    print("  title              ページタイトル表示")
+    print("  save               セッションを保存")
+    print("  input[<方式>]:<text> 入力方式を指定（human, fill, insert, chunk=n）")
+    print("  wait:<ms>          指定ミリ秒待機")
+    print("  net:[件数|URL]     直近のネットワークリクエストを表示")
+    print("  extract[<fields>]:<selector>  一致した全要素のフィールドを JSONL に出力")
+    print("  stats              コマンドごとのレイテンシ（p50/p90/p99）を表示")
+    print("  mem                JS ヒープ・DOM ノード数を表示")
+    print("  url[<戦略>]:<URL> / click[<戦略>]:<selector>")
+    print("                     待機戦略を指定（fixed, commit, networkidle, quiet=ms, selector=sel）")
+    print("  quit               終了")
+
+
+def _cmd_url(page, context, profile_name: str, state: dict, name: str, option: str | None, arg: str) -> None:
+    url = arg.strip()
+    kind, _ = parse_wait_strategy(option or state.get("wait", DEFAULT_WAIT))
+    with phase(state, name, "action"):
+        page.goto(url, wait_until="commit" if kind == "commit" else "domcontentloaded")
+    settle_after(page, name, option, state)
+    print(f"  → {page.title()} ({page.url})")
+
+
+def _cmd_select(page, context, profile_name: str, state: dict, name: str, option: str | None, arg: str) -> str | None:
+    from selector_optimizer import rewrite_selector
+
+    original = arg.strip()
+    selector = cached_selector(page, original, state)
+    with phase(state, name, "resolve"):
+        info = inspect_selector(page, selector, state)
+    if info["count"] == 0 and selector != original:
+        # キャッシュしたセレクタが古くなっていれば元のセレクタで探し直す
+        state["selector_optimizer"].invalidate(page.url, original)
+        selector = original
+        info = inspect_selector(page, selector, state)
+    if info["count"] == 0:
+        # 何もしなかったステップとして扱われないよう、エラーにする（--on-error / リトライの対象）
+        state["selected_element"] = None
+        state["selected_selector"] = None
+        raise LookupError(f"要素が見つかりません: {selector}")
+
+    if selector == original:
+        selector = optimize_selector(page, original, info["ref"], state) or original
+    state["selected_element"] = resolve_locator(page, selector, state)
+    state["selected_selector"] = selector
+    box = info["box"]
+    visible = "表示" if info["visible"] else "非表示"
+    print(
+        f"  選択: <{info['tag']}> ({info['count']}件中1件目)"
+        f" {visible} {box['width']:.0f}x{box['height']:.0f} @({box['x']:.0f},{box['y']:.0f})"
+    )
+    if info["text"]:
+        print(f"  内容: {info['text']}")
+    return rewrite_selector(name, option, selector) if selector != original else None
+
+
+def _cmd_click(page, context, profile_name: str, state: dict, name: str, option: str | None, arg: str) -> str | None:
+    from selector_optimizer import is_brittle, rewrite_selector
+
+    original = arg.strip()
+    selector = cached_selector(page, original, state)
+    if selector == original and state.get("selector_optimizer") is not None and is_brittle(original):
+        # クリックで遷移する前に、要素を調べて短いセレクタを求めておく
+        with phase(state, name, "resolve"):
+            info = inspect_selector(page, original, state)
+        if info["count"]:
+            selector = optimize_selector(page, original, info["ref"], state) or original
+    with phase(state, name, "action"):
+        selector = click_selector(page, selector, state, fallback=original)
+    settle_after(page, name, option, state)
+    print(f"  クリック完了 → {page.url}")
+    return rewrite_selector(name, option, selector) if selector != original else None
+
+
+def _cmd_input(page, context, profile_name: str, state: dict, name: str, option: str | None, arg: str) -> None:
+    if state.get("selected_element") is None:
+        raise LookupError("先に select: で要素を選択してください")
+    text = arg.strip()
+    if not text:
+        # 複数行入力モード（空行で確定）
+        print("  (複数行入力 — 空行で確定)")
+        lines = []
+        while True:
+            line = input("  | ")
+            if line == "":
+                break
+            lines.append(line)
+        text = "\n".join(lines)
+    else:
+        text = text.replace("\\n", "\n")
+    mode, chunk_size = parse_input_mode(option or state.get("input_mode", DEFAULT_INPUT_MODE))
+    type_start = time.perf_counter()
+    type_text(page, selected_locator(page, state), text, mode, chunk_size)
+    elapsed_ms = (time.perf_counter() - type_start) * 1000
+    record_input(state, mode, len(text), elapsed_ms)
+    if state.get("metrics") is not None:
+        state["metrics"].record(name, "action", elapsed_ms)
+    print(f"  入力完了 [{mode}] {len(text)}文字 {elapsed_ms:.0f}ms: {text}")
+
+
+def _cmd_screenshot(page, context, profile_name: str, state: dict, name: str, option: str | None, arg: str) -> None:
+    from screenshot_pipeline import parse_screenshot_options
+
+    opts = parse_screenshot_options(option)
+    selector = arg.strip()
+    target = resolve_locator(page, selector, state) if selector else page
+    with phase(state, "ss", "action"):
+        path = get_screenshots(state).capture(
+            target,
+            fmt=opts.get("format"),
+            quality=opts.get("quality"),
+            clip=opts.get("clip"),
+            full_page=opts.get("full_page", False),
+        )
+    if path is None:
+        print("  直前と同じ画面のため保存をスキップ")
+    else:
+        print(f"  保存: {path}")
 
-    try:
-        if cmd == "quit":
-            return False
 
-        elif cmd == "help":
-            print("  url:<URL>          指定URLに遷移")
-            print("  click:<selector>   要素をクリック")
-            print("  select:<selector>  要素を選択（内容を表示）")
-            print("  input:<text>       選択中の要素にテキスト入力")
-            print("  ss                 スクリーンショット保存")
-            print("  title              ページタイトル表示")
-            print("  save               セッションを保存")
-            print("  wait:<ms>          指定ミリ秒待機")
-            print("  quit               終了")
-
-        elif cmd.startswith("url:"):
-            url = cmd[4:].strip()
-            page.goto(url, wait_until="domcontentloaded")
-            page.wait_for_timeout(1000)
-            print(f"  → {page.title()} ({page.url})")
-
-        elif cmd.startswith("select:"):
-            selector = cmd[7:].strip()
-            loc = page.locator(selector)
-            count = loc.count()
-            if count == 0:
-                print(f"  要素が見つかりません: {selector}")
-                state["selected_element"] = None
-            else:
-                state["selected_element"] = loc.first
-                text = loc.first.text_content() or ""
-                tag = loc.first.evaluate("el => el.tagName")
-                print(f"  選択: <{tag}> ({count}件中1件目)")
-                if text.strip():
-                    print(f"  内容: {text.strip()[:200]}")
-
-        elif cmd.startswith("click:"):
-            selector = cmd[6:].strip()
-            page.locator(selector).first.click()
-            page.wait_for_timeout(1000)
-            print(f"  クリック完了 → {page.url}")
-
-        elif cmd.startswith("input:"):
-            text = cmd[6:].strip()
-            if not text:
-                # 複数行入力モード（空行で確定）
-                print("  (複数行入力 — 空行で確定)")
-                lines = []
-                while True:
-                    line = input("  | ")
-                    if line == "":
-                        break
-                    lines.append(line)
-                text = "\n".join(lines)
-            else:
-                text = text.replace("\\n", "\n")
-            if state.get("selected_element") is None:
-                print("  先に select: で要素を選択してください")
-            else:
-                state["selected_element"].click()
-                for ch in text:
-                    page.keyboard.type(ch)
-                    page.wait_for_timeout(random.randint(80, 300))
-                print(f"  入力完了: {text}")
-
-        elif cmd in ("screenshot", "ss"):
-            LOGS_DIR.mkdir(exist_ok=True)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            path = LOGS_DIR / f"screenshot_{timestamp}.png"
-            page.screenshot(path=str(path))
-            print(f"  保存: {path}")
-
-        elif cmd == "title":
-            print(f"  {page.title()} ({page.url})")
-
-        elif cmd == "save":
-            PROFILES_DIR.mkdir(exist_ok=True)
-            path = PROFILES_DIR / f"{profile_name}.json"
-            context.storage_state(path=str(path))
-            print(f"  プロファイル保存: {path}")
-
-        elif cmd.startswith("wait:"):
-            ms = int(cmd[5:].strip())
-            page.wait_for_timeout(ms)
-            print(f"  {ms}ms 待機完了")
+def _cmd_extract(page, context, profile_name: str, state: dict, name: str, option: str | None, arg: str) -> None:
+    from extractor import extract_to_jsonl, parse_extract_options
 
-        else:
+    selector = arg.strip()
+    opts = parse_extract_options(option)
+    if opts["out"]:
+        out_path = Path(opts["out"])
+    else:
+        out_path = LOGS_DIR / f"extract_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jsonl"
+    with phase(state, name, "action"):
+        total, written = extract_to_jsonl(
+            page, selector, opts["fields"], out_path, limit=opts["limit"], page_size=opts["page_size"]
+        )
+    print(f"  抽出: {written}件（一致 {total}件） [{','.join(opts['fields'])}] → {out_path}")
+
+
+def _cmd_net(page, context, profile_name: str, state: dict, name: str, option: str | None, arg: str) -> None:
+    capture = state.get("net_capture")
+    if capture is None:
+        print("  ネットワークキャプチャが無効です（--capture / --capture-ring で有効化）")
+        return
+    for line in capture.query(arg.strip()):
+        print(f"  {line}")
+    print(f"  {capture.summary()}")
+
+
+def _cmd_stats(page, context, profile_name: str, state: dict, name: str, option: str | None, arg: str) -> None:
+    metrics = state.get("metrics")
+    if metrics is None or not metrics.histograms:
+        print("  計測データがありません")
+        return
+    for line in metrics.format_table():
+        print(f"  {line}")
+
+
+def _cmd_mem(page, context, profile_name: str, state: dict, name: str, option: str | None, arg: str) -> None:
+    governor = state.get("memory")
+    if governor is None:
+        print("  メモリ監視が無効です（--mem-limit / --recycle-every / --mem-log で有効化）")
+        return
+    record = governor.sample(page, event="mem")
+    if record is None:
+        print("  メモリを取得できませんでした")
+        return
+    print(
+        f"  JS ヒープ {record.get('heap_used')}MB / {record.get('heap_total')}MB"
+        f"  ノード {record.get('nodes')}  リスナー {record.get('listeners')}"
+    )
+    print(f"  {governor.summary()}")
+
+
+def _cmd_title(page, context, profile_name: str, state: dict, name: str, option: str | None, arg: str) -> None:
+    print(f"  {page.title()} ({page.url})")
+
+
+def _cmd_save(page, context, profile_name: str, state: dict, name: str, option: str | None, arg: str) -> None:
+    stats = save_profile(context, profile_name)
+    print(f"  プロファイル保存: {profile_name}（{format_stats(stats)}）")
+
+
+def _cmd_wait(page, context, profile_name: str, state: dict, name: str, option: str | None, arg: str) -> None:
+    ms = int(arg.strip())
+    page.wait_for_timeout(ms)
+    print(f"  {ms}ms 待機完了")
+
+
+def _require_arg(option: str | None, arg: str) -> None:
+    if not arg.strip():
+        raise ValueError("引数がありません")
+
+
+def _reject_option(option: str | None, arg: str) -> None:
+    # オプションを取らないコマンドの [...] は書き間違いとして扱う（黙って無視しない）
+    if option is not None:
+        raise ValueError(f"このコマンドはオプションを取りません: [{option}]")
+
+
+def _check_select(option: str | None, arg: str) -> None:
+    _reject_option(option, arg)
+    _require_arg(option, arg)
+
+
+def _check_navigation(option: str | None, arg: str) -> None:
+    _require_arg(option, arg)
+    if option is not None:
+        parse_wait_strategy(option)
+
+
+def _check_input(option: str | None, arg: str) -> None:
+    if option is not None:
+        parse_input_mode(option)
+
+
+def _check_screenshot(option: str | None, arg: str) -> None:
+    from screenshot_pipeline import parse_screenshot_options
+
+    parse_screenshot_options(option)
+
+
+def _check_extract(option: str | None, arg: str) -> None:
+    from extractor import parse_extract_options
+
+    _require_arg(option, arg)
+    parse_extract_options(option)
+
+
+def _check_wait(option: str | None, arg: str) -> None:
+    _reject_option(option, arg)
+    if not arg.strip().isdigit():
+        raise ValueError("待機時間はミリ秒の整数で指定してください")
+
+
+@functools.cache
+def command_table() -> dict:
+    """コマンドの表（名前 → command_plan.CommandSpec）を返す。
+
+    CommandSpec は (実行関数, 引数の検査, オプション・引数を取らないか)。
+    実行関数はジャーナルに記録するコマンドを置き換えるときだけ文字列を返す。quit は execute_command で扱う。
+    command_plan の読み込みを --help などで払わないよう、初めて使うときに作る。
+    """
+    from command_plan import CommandSpec
+
+    return {
+        "url": CommandSpec(_cmd_url, _check_navigation),
+        "click": CommandSpec(_cmd_click, _check_navigation),
+        "select": CommandSpec(_cmd_select, _check_select),
+        "input": CommandSpec(_cmd_input, _check_input),
+        "screenshot": CommandSpec(_cmd_screenshot, _check_screenshot),
+        "ss": CommandSpec(_cmd_screenshot, _check_screenshot),
+        "extract": CommandSpec(_cmd_extract, _check_extract),
+        "wait": CommandSpec(_cmd_wait, _check_wait),
+        "net": CommandSpec(_cmd_net, _reject_option),
+        "stats": CommandSpec(_cmd_stats, bare=True),
+        "mem": CommandSpec(_cmd_mem, bare=True),
+        "title": CommandSpec(_cmd_title, bare=True),
+        "save": CommandSpec(_cmd_save, bare=True),
+        "help": CommandSpec(_cmd_help, bare=True),
+        "quit": CommandSpec(None, bare=True),
+    }
+
+
+def execute_command(
+    cmd: str, page, context, profile_name: str, state: dict, parsed: tuple[str, str | None, str] | None = None
+) -> bool:
+    """コマンドを1つ実行する。Falseを返すと終了。
+
+    コマンドの表（command_table()）から実行関数を引いて呼ぶ。parsed にコンパイル済みの
+    (名前, オプション, 引数) を渡すと解析を省く。
+    エラーは表示して継続し、内容を state["last_error"] に残す。
+    """
+    from command_plan import parse_command
+
+    name, option, arg = parsed if parsed is not None else parse_command(cmd)
+    state["last_error"] = None
+    start = time.perf_counter()
+    # ジャーナルに記録するコマンド（セレクタを最適化した場合は置き換えたもの）
+    log_cmd = cmd
+
+    try:
+        spec = command_table().get(name)
+        if spec is None or (spec.bare and (option is not None or arg)):
+            state["last_error"] = f"不明なコマンド: {cmd}"
             print(f"  不明なコマンド: {cmd}")
+        elif spec.handler is None:
+            return False
+        else:
+            log_cmd = spec.handler(page, context, profile_name, state, name, option, arg) or cmd
+
+        if state.get("screenshots") is not None:
+            state["screenshots"].maybe_auto_capture(page)
 
     except Exception as e:
+        state["last_error"] = str(e)
         print(f"  エラー: {e}")
 
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if state.get("metrics") is not None and name in _TIMED_COMMANDS:
+            command = "ss" if name == "screenshot" else name
+            state["metrics"].record(command, "total", elapsed_ms)
+        if state.get("journal") is not None:
+            state["journal"].record(cmd, format_command_for_log(log_cmd), elapsed_ms, state["last_error"])
+
+    return True
+
+
+def execute_with_retry(cmd: str, page, context, profile_name: str, state: dict, parsed=None) -> bool:
+    """state["retries"] 回までリトライしてコマンドを実行する。待ち時間は指数的に延ばす。"""
+    from command_plan import parse_command
+
+    retries = state.get("retries", 0)
+    if (parsed or parse_command(cmd))[0] in _NO_RETRY_COMMANDS:
+        retries = 0
+    backoff_ms = state.get("retry_backoff", DEFAULT_RETRY_BACKOFF_MS)
+    for attempt in range(retries + 1):
+        if not execute_command(cmd, page, context, profile_name, state, parsed):
+            return False
+        if state["last_error"] is None or attempt == retries:
+            return True
+        delay_ms = backoff_ms * 2 ** attempt
+        print(f"  リトライ {attempt + 1}/{retries}（{delay_ms}ms 後）")
+        page.wait_for_timeout(delay_ms)
+    return True
+
+
+def execute_step(step, page, context, profile_name: str, state: dict) -> bool:
+    """コンパイル済みのコマンド（command_plan.Step）を実行する。検査で不正だったコマンドは実行せずエラーとする。"""
+    if step.error is not None:
+        state["last_error"] = f"{step.error}: {step.cmd}"
+        print(f"  {state['last_error']}")
+        return True
+    return execute_with_retry(step.cmd, page, context, profile_name, state, (step.name, step.option, step.arg))
+
+
+def compile_command_file(filepath: str, save: bool = True):
+    """コマンドファイルをコンパイルする（内容が同じならキャッシュを使う。save が偽ならキャッシュに書かない）。"""
+    from command_plan import PlanCache
+
+    return PlanCache(PLANS_DIR).compile_file(Path(filepath), command_table(), save)
+
+
+def check_command_files(filepaths: list[str]) -> bool:
+    """コマンドファイルを検査してエラーを表示する（ブラウザは起動しない）。エラーが無ければ True。"""
+    from command_plan import compile_steps, format_errors
+
+    ok = True
+    for filepath in filepaths:
+        if filepath == "-":
+            steps = list(compile_steps(sys.stdin, command_table(), interactive=False))
+            errors = [f"-:{step.lineno}: {step.error}: {step.label}" for step in steps if step.error is not None]
+        elif not Path(filepath).exists():
+            steps, errors = [], [f"{filepath}: ファイルが見つかりません"]
+        else:
+            # 検査だけの実行ではプロジェクト内にファイルを残さない
+            plan = compile_command_file(filepath, save=False)
+            steps, errors = plan.steps, format_errors(plan)
+        for line in errors:
+            print(line)
+        if errors:
+            ok = False
+        else:
+            print(f"{filepath}: OK（{len(steps)}コマンド）")
+    return ok
+
+
+def load_checkpoint(profile_name: str, filepath: str) -> dict | None:
+    """コマンドファイルの再開可能なチェックポイントを返す。無ければ None。"""
+    from checkpoint import RunCheckpoint
+
+    path = Path(filepath)
+    if not path.exists():
+        return None
+    commands = [step.cmd for step in compile_command_file(filepath).steps]
+    return RunCheckpoint(CHECKPOINTS_DIR, profile_name, path).load(commands)
+
+
+def restore_checkpoint(page, saved: dict, state: dict) -> None:
+    """チェックポイントの URL に戻り、選択中だった要素を選択し直す。"""
+    print(f"=== [{saved['lineno']}] まで完了済み（{saved['index']}コマンド）。続きから再開します ===")
+    if saved.get("url") and saved["url"] != "about:blank":
+        page.goto(saved["url"], wait_until="domcontentloaded")
+    if saved.get("selected_selector"):
+        state["selected_selector"] = saved["selected_selector"]
+        state["selected_element"] = resolve_locator(page, saved["selected_selector"], state)
+
+
+def run_file(filepath: str, page, context, profile_name: str, state: dict, start: int = 0) -> bool:
+    """ファイルからコマンドを順次実行する（書式は command_plan.parse_command_lines を参照）。
+
+    ファイルは実行前に全体をコンパイルし、不正なコマンドがあれば1つも実行せずに False を返す。
+    filepath が "-" なら標準入力を1行ずつコンパイルしながら実行する（チェックポイントは使わない）。
+    start 個目までのコマンドは実行済みとして飛ばす（--resume）。
+    state["checkpoint_every"] 個ごとにチェックポイントを保存し、state["on_error"] が
+    "stop" なら失敗したコマンドで止めて False を返す。
+    途中でコンテキストを作り直した場合、新しいページは state["page"] / state["context"] に残る。
+    """
+    from checkpoint import RunCheckpoint
+    from command_plan import compile_steps, format_errors
+
+    checkpoint = None
+    if filepath == "-":
+        steps = compile_steps(sys.stdin, command_table(), interactive=False)
+    else:
+        path = Path(filepath)
+        if not path.exists():
+            print(f"  ファイルが見つかりません: {filepath}")
+            return True
+        plan = compile_command_file(filepath)
+        if plan.errors:
+            for line in format_errors(plan):
+                print(f"  {line}")
+            first = plan.errors[0]
+            state["aborted"] = {"lineno": first.lineno, "cmd": first.label, "error": f"{first.error}（エラー {len(plan.errors)}件）"}
+            print(f"=== コマンドファイルにエラーがあるため実行しません: {filepath} ===\n")
+            return False
+        steps = plan.steps
+        commands = [step.cmd for step in steps]
+        every = state.get("checkpoint_every", 0)
+        if every:
+            checkpoint = RunCheckpoint(CHECKPOINTS_DIR, profile_name, path)
+            checkpoint.saved_index = start
+
+    print(f"=== ファイル実行: {filepath} ===")
+    done = (start, 0)
+    for index, step in enumerate(steps, 1):
+        if index <= start:
+            continue
+        lineno = step.lineno
+        print(f"[{lineno}] {step.label}")
+        if not execute_step(step, page, context, profile_name, state):
+            return False
+        page, context = maybe_recycle(page, context, state)
+        if state["last_error"] is not None:
+            if state.get("on_error", DEFAULT_ON_ERROR) == "stop":
+                state["aborted"] = {"lineno": lineno, "cmd": step.label, "error": state["last_error"]}
+                if checkpoint is not None and checkpoint.saved_index < done[0]:
+                    checkpoint.save(commands, done[0], done[1], page, context, state)
+                print(f"=== [{lineno}] で停止しました（--resume で続きから再開できます） ===\n")
+                return False
+            continue
+        done = (index, lineno)
+        if checkpoint is not None and index % every == 0:
+            checkpoint.save(commands, index, lineno, page, context, state)
+    if checkpoint is not None:
+        checkpoint.clear()
+    print(f"=== ファイル実行完了 ===\n")
     return True
 
 
-def run_file(filepath: str, page, context, profile_name: str, state: dict) -> bool:
-    """ファイルからコマンドを順次実行する。
+def render_steps(steps: list, step_vars: list[set[str]], row: dict) -> list[tuple]:
+    """テンプレートの Step に行の値を埋め、(行番号, コマンド, ラベル, 解析結果) のリストを返す。
+
+    値を埋めたコマンドはコンパイル時と同じ表で検査し、不正なら ValueError を送出する
+    （行のコマンドは1つも実行しない）。値が空で input: だけになった場合も、対話入力を待たずにエラーにする。
+    {{変数}} を含まないコマンドはコンパイル済みの結果を使う。
+    """
+    from command_plan import check_command, check_noninteractive, parse_command
+    from data_rows import render
 
-    input:<<DELIM で複数行入力（ヒアドキュメント）:
-        input:<<END
-        1行目
-        2行目
-        END
+    commands = []
+    for step, names in zip(steps, step_vars):
+        if not names:
+            commands.append((step.lineno, step.cmd, step.label, (step.name, step.option, step.arg)))
+            continue
+        cmd = render(step.cmd, row)
+        name, option, arg = parse_command(cmd)
+        error = check_command(name, option, arg, command_table()) or check_noninteractive(name, arg)
+        if error is not None:
+            raise ValueError(f"[{step.lineno}] {error}: {cmd}")
+        commands.append((step.lineno, cmd, step.label, (name, option, arg)))
+    return commands
+
+
+def run_data(filepath: str, data_path: str, page, context, profile_name: str, state: dict) -> bool:
+    """コマンドファイルをテンプレートとして、データの1行ごとに {{変数}} を埋めて実行する。
+
+    コマンドファイルのコンパイルは1回だけ行い（{{変数}} を含むコマンドは行ごとに値を埋めてから解析・検査する）、
+    ページとコンテキストは全行で使い回す。
+    行の中でエラーが起きたら、state["on_error"] が "stop" ならその行の残りを飛ばして次の行へ進む。
+    quit は行の終わりとして扱う。途中でコンテキストを作り直した場合は run_file と同じく state に残る。
     """
+    from command_plan import check_noninteractive, format_errors
+    from data_rows import DataResults, iter_rows, row_key, template_vars
+
     path = Path(filepath)
     if not path.exists():
         print(f"  ファイルが見つかりません: {filepath}")
         return True
 
-    print(f"=== ファイル実行: {filepath} ===")
-    lines = path.read_text().splitlines()
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-        i += 1
-        if not line or line.startswith("#"):
+    plan = compile_command_file(filepath)
+    if plan.errors:
+        for line in format_errors(plan):
+            print(f"  {line}")
+        print(f"=== コマンドファイルにエラーがあるため実行しません: {filepath} ===\n")
+        return False
+    steps = []
+    for step in plan.steps:
+        if step.cmd == "quit":
+            break
+        steps.append(step)
+    step_vars = [template_vars(step.cmd) for step in steps]
+    # 値を埋めない空の input: は全行で対話入力を待つことになるため、実行前にエラーにする
+    errors = [
+        f"{filepath}:{step.lineno}: {error}: {step.label}"
+        for step, names in zip(steps, step_vars)
+        if not names and (error := check_noninteractive(step.name, step.arg)) is not None
+    ]
+    if errors:
+        for line in errors:
+            print(f"  {line}")
+        print(f"=== コマンドファイルにエラーがあるため実行しません: {filepath} ===\n")
+        return False
+    variables = sorted(set().union(*step_vars))
+    results_path = state.get("data_results") or LOGS_DIR / f"data_{path.stem}_{Path(data_path).stem}.jsonl"
+    results = DataResults(Path(results_path))
+    stop = state.get("on_error", DEFAULT_ON_ERROR) == "stop"
+
+    print(f"=== データ実行: {filepath} × {data_path}（変数: {', '.join(variables) or 'なし'}） ===")
+    run_start = time.perf_counter()
+    for row_no, row, row_error in iter_rows(Path(data_path)):
+        # 壊れた行はその行の失敗として記録し、次の行へ進む
+        if row_error is None:
+            try:
+                key = row_key(row, state.get("data_key"))
+            except ValueError as e:
+                row_error = str(e)
+        if row_error is not None:
+            print(f"[行 {row_no}] {row_error}")
+            results.record(row_no, f"row:{row_no}", row_error, None, 0.0)
+            continue
+        if key in results.succeeded:
+            results.skipped += 1
             continue
 
-        # input:<<DELIM のヒアドキュメント処理
-        if line.startswith("input:<<"):
-            delimiter = line[8:].strip()
-            body_lines = []
-            while i < len(lines):
-                if lines[i].strip() == delimiter:
-                    i += 1
+        start = time.perf_counter()
+        error = failed_line = None
+        # 前の行で選択した要素は引き継がない
+        state["selected_element"] = None
+        state["selected_selector"] = None
+        try:
+            commands = render_steps(steps, step_vars, row)
+        except ValueError as e:
+            commands = []
+            error = str(e)
+            print(f"[行 {row_no}] {error}")
+        for lineno, cmd, label, parsed in commands:
+            print(f"[行 {row_no}:{lineno}] {label}")
+            if not execute_with_retry(cmd, page, context, profile_name, state, parsed):
+                break
+            page, context = maybe_recycle(page, context, state)
+            if state["last_error"] is not None:
+                if error is None:
+                    error, failed_line = state["last_error"], lineno
+                if stop:
                     break
-                body_lines.append(lines[i])
-                i += 1
-            cmd = "input:" + "\n".join(body_lines)
-            print(f"[{i}] input:(heredoc {len(body_lines)}行)")
-        else:
-            cmd = line
-            print(f"[{i}] {cmd}")
-
-        if not execute_command(cmd, page, context, profile_name, state):
-            return False
-    print(f"=== ファイル実行完了 ===\n")
-    return True
+        results.record(row_no, key, error, failed_line, time.perf_counter() - start)
 
+        done = results.ok + results.failed
+        elapsed = time.perf_counter() - run_start
+        rate = done / elapsed * 60 if elapsed > 0 else 0.0
+        status = "OK" if error is None else f"NG ({error})"
+        print(f"[行 {row_no}] {status} {time.perf_counter() - start:.1f}s（{done}行完了, {rate:.1f} rows/min）")
 
-def save_session_log(command_log: list[str], page) -> None:
-    """実行コマンドのログとスクリーンショットを保存する。"""
-    if not command_log:
-        return
-    LOGS_DIR.mkdir(exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    results.close()
+    print(f"=== データ実行完了: {results.summary()} ===\n")
+    return True
 
-    log_path = LOGS_DIR / f"commands_{timestamp}.txt"
-    log_path.write_text("\n".join(command_log) + "\n")
-    print(f"コマンドログ保存: {log_path}")
 
-    ss_path = LOGS_DIR / f"screenshot_{timestamp}.png"
-    page.screenshot(path=str(ss_path))
-    print(f"スクリーンショット保存: {ss_path}")
+def save_session_log(page, state: dict) -> None:
+    """ジャーナルを閉じ、終了時のスクリーンショットを保存する。
 
+    コマンドは実行のたびにジャーナルへ追記済みのため、ここで書き出すものは無い。
+    """
+    if state.get("memory") is not None:
+        state["memory"].close()
+    journal = state.get("journal")
+    if journal is None:
+        return
+    journal.close()
+    if not journal.seq:
+        return
+    print(f"セッションジャーナル: {journal.summary()}")
+
+    ss_path = get_screenshots(state).capture(page)
+    if ss_path is not None:
+        print(f"スクリーンショット保存: {ss_path}")
+
+
+def run_shell(
+    page,
+    context,
+    profile_name: str,
+    command_file: str | None = None,
+    initial_url: str | None = None,
+    options: dict | None = None,
+    resume: dict | None = None,
+):
+    """インタラクティブシェル。実行したコマンドは logs/session_<日時>.jsonl に逐次記録する。
+
+    resume にチェックポイントを渡すと、command_file をその続きから実行する。
+    終了時点のコンテキストを返す（メモリ監視で作り直した場合は新しいもの）。
+    """
+    from session_journal import SessionJournal
 
-def run_shell(page, context, profile_name: str, command_file: str | None = None, initial_url: str | None = None) -> None:
-    """インタラクティブシェル。"""
-    state = {"selected_element": None}
-    command_log: list[str] = []
+    state = new_state(options)
+    prepare_page(page, state)
+    start_memory_governor(state, profile_name)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    state["journal"] = SessionJournal(LOGS_DIR / f"session_{timestamp}.jsonl", profile=profile_name)
 
-    # 初期URLをログに記録
-    if initial_url:
-        command_log.append(f"url:{initial_url}")
+    # 初期URLに遷移（再開時はチェックポイントの URL に戻る）
+    if resume is not None:
+        restore_checkpoint(page, resume, state)
+    elif initial_url:
+        execute_command(f"url:{initial_url}", page, context, profile_name, state)
 
-    # ファイル指定があれば先に実行（ファイルの内容をログに記録）
+    # ファイル指定があれば先に実行
+    start = resume["index"] if resume is not None else 0
     if command_file:
-        file_path = Path(command_file)
-        if file_path.exists():
-            for line in file_path.read_text().splitlines():
-                stripped = line.strip()
-                if stripped and not stripped.startswith("#"):
-                    command_log.append(stripped)
-        if not run_file(command_file, page, context, profile_name, state):
-            save_session_log(command_log, page)
-            return
+        if state.get("data"):
+            finished = run_data(command_file, state["data"], page, context, profile_name, state)
+        else:
+            finished = run_file(command_file, page, context, profile_name, state, start)
+        page, context = state.get("page", page), state.get("context", context)
+        if not finished:
+            save_session_log(page, state)
+            print_run_summary(state)
+            return context
 
     print("\n=== コマンド入力 (help でヘルプ表示) ===\n")
 
@@ -280,70 +1134,348 @@ def run_shell(page, context, profile_name: str, command_file: str | None = None,
         if not cmd:
             continue
 
-        # ログに記録
-        log_entry = format_command_for_log(cmd)
-        if log_entry is not None:
-            command_log.append(log_entry)
-
         if not execute_command(cmd, page, context, profile_name, state):
             break
+        page, context = maybe_recycle(page, context, state)
 
-    save_session_log(command_log, page)
+    save_session_log(page, state)
+    print_run_summary(state)
+    return context
 
 
-def main() -> None:
-    SCREENSHOTS_DIR.mkdir(exist_ok=True)
-    PROFILES_DIR.mkdir(exist_ok=True)
+def load_jobs(filepath: str) -> list[dict]:
+    """バッチジョブ定義（JSONL）を読み込む。"""
+    jobs = []
+    for lineno, line in enumerate(Path(filepath).read_text().splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        job = json.loads(line)
+        if "profile" not in job or "file" not in job:
+            raise ValueError(f"{filepath}:{lineno}: profile と file を指定してください")
+        jobs.append(job)
+    return jobs
+
+
+def run_job(browser, job: dict, options: dict | None = None) -> dict:
+    """ジョブを1つ実行する。コンテキストはジョブごとに作成・破棄する。"""
+    profile_name = job["profile"]
+    start = time.perf_counter()
+    result = {"profile": profile_name, "file": job["file"], "ok": True, "error": None}
+
+    saved = None
+    if options and options.get("resume"):
+        saved = load_checkpoint(profile_name, job["file"])
+
+    if saved is not None:
+        context = browser.new_context(storage_state=saved["storage_state"])
+    else:
+        context = new_profile_context(browser, profile_name)
+    # ジョブごとに独立した状態を持つ
+    state = new_state(options)
+    try:
+        page = context.new_page()
+        prepare_page(page, state)
+        start_memory_governor(state, profile_name)
+        if saved is not None:
+            restore_checkpoint(page, saved, state)
+        elif job.get("url"):
+            execute_command(f"url:{job['url']}", page, context, profile_name, state)
+        run_file(job["file"], page, context, profile_name, state, saved["index"] if saved else 0)
+        context = state.get("context", context)
+        if state.get("aborted"):
+            aborted = state["aborted"]
+            result["ok"] = False
+            result["error"] = f"[{aborted['lineno']}] {aborted['cmd']}: {aborted['error']}"
+        save_profile(context, profile_name)
+    except Exception as e:
+        result["ok"] = False
+        result["error"] = str(e)
+    finally:
+        state.get("context", context).close()
+        if state.get("memory") is not None:
+            state["memory"].close()
+
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def _batch_worker(jobs: queue.Queue, results: list[dict], headless: bool, options: dict | None, report) -> None:
+    """ブラウザを1回起動し、キューが空になるまでジョブを処理する。
+
+    sync_api のオブジェクトは作成したスレッドでしか使えないため、
+    ブラウザはワーカースレッドごとに起動して使い回す。
+    """
+    from playwright.sync_api import sync_playwright
+
+    with sync_playwright() as pw:
+        low_memory = options and options.get("low_memory")
+        browser = pw.chromium.launch(headless=headless, args=LOW_MEMORY_ARGS if low_memory else None)
+        while True:
+            try:
+                job = jobs.get_nowait()
+            except queue.Empty:
+                break
+            result = run_job(browser, job, options)
+            results.append(result)
+            report(result)
+        browser.close()
+
+
+def run_batch(jobs: list[dict], concurrency: int, headless: bool, options: dict | None = None) -> list[dict]:
+    """ジョブ一覧を最大 concurrency 並列で実行し、スループットを表示する。"""
+    pending: queue.Queue = queue.Queue()
+    for job in jobs:
+        pending.put(job)
+
+    results: list[dict] = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def report(result: dict) -> None:
+        with lock:
+            elapsed = time.perf_counter() - start
+            rate = len(results) / elapsed * 60 if elapsed > 0 else 0.0
+            status = "OK" if result["ok"] else f"NG ({result['error']})"
+            print(
+                f"[{len(results)}/{len(jobs)}] {result['profile']} {result['file']}"
+                f" {status} {result['seconds']:.1f}s ({rate:.1f} jobs/min)"
+            )
+
+    workers = max(1, min(concurrency, len(jobs)))
+    print(f"=== バッチ実行: {len(jobs)} ジョブ / {workers} 並列 ===")
+    threads = [
+        threading.Thread(target=_batch_worker, args=(pending, results, headless, options, report))
+        for _ in range(workers)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for r in results if not r["ok"])
+    rate = len(results) / elapsed * 60 if elapsed > 0 else 0.0
+    print(f"=== バッチ完了: {len(results)} 件（失敗 {failed} 件）{elapsed:.1f}s, {rate:.1f} jobs/min ===")
+    if options and options.get("request_filter"):
+        options["request_filter"].print_summary()
+    if options and options.get("screenshots"):
+        options["screenshots"].close()
+    if options and options.get("net_capture"):
+        options["net_capture"].close()
+        print(f"ネットワークキャプチャ: {options['net_capture'].summary()}")
+    return results
+
+
+def export_metrics(metrics, path: str | None) -> None:
+    """計測結果（metrics.Metrics）を JSON に出力する。"""
+    if not metrics.histograms:
+        return
+    if path is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        out = LOGS_DIR / f"metrics_{timestamp}.json"
+    else:
+        out = Path(path)
+    print(f"計測結果保存: {metrics.export(out)}")
+
+
+def run_browser_session(browser, profile_name: str, storage_state: dict | None, saved: dict | None, args, options: dict) -> None:
+    """コンテキストを作成してシェルを実行し、終了時にプロファイルを保存する。"""
+    if args.resume and saved is None:
+        print("  チェックポイントが無いため最初から実行します")
 
+    # プロファイルが存在すればセッションを復元
+    if storage_state is not None:
+        context = browser.new_context(storage_state=storage_state)
+        print("  チェックポイントのセッションを復元しました" if saved else "  セッションを復元しました")
+    else:
+        context = browser.new_context()
+        print("  新規セッションで開始")
+
+    page = context.new_page()
+
+    context = run_shell(page, context, profile_name, command_file=args.f, initial_url=args.u, options=options, resume=saved)
+
+    # 終了時に自動保存
+    stats = save_profile(context, profile_name)
+    print(f"プロファイル自動保存: {profile_name}（{format_stats(stats)}）")
+
+    context.close()
+    browser.close()
+
+
+def load_session_state(profile_name: str, command_file: str | None, resume: bool) -> tuple[dict | None, dict | None]:
+    """new_context に渡す storage_state と、再開するチェックポイントを読み込む。"""
+    saved = load_checkpoint(profile_name, command_file) if resume else None
+    if saved is not None:
+        return saved["storage_state"], saved
+    return PROFILE_STORE.load(profile_name), None
+
+
+def main() -> None:
     parser = argparse.ArgumentParser(description="Playwright インタラクティブシェル")
     parser.add_argument("-p", type=str, help="プロファイル名")
     parser.add_argument("-u", type=str, help="開くURL")
-    parser.add_argument("-f", type=str, help="コマンドファイル")
+    parser.add_argument("-f", type=str, help="コマンドファイル（- で標準入力から読みながら実行）")
     parser.add_argument("--headless", action="store_true", help="ヘッドレスモードで実行")
+    parser.add_argument("--batch", type=str, help="バッチジョブ定義ファイル（JSONL）")
+    parser.add_argument("-j", "--concurrency", type=int, default=4, help="バッチの並列数")
+    parser.add_argument("--wait", type=str, default=DEFAULT_WAIT, help="url:/click: 後の待機戦略（既定: fixed）")
+    parser.add_argument("--wait-timeout", type=int, default=DEFAULT_WAIT_TIMEOUT, help="待機戦略のタイムアウト（ms）")
+    parser.add_argument("--input-mode", type=str, default=DEFAULT_INPUT_MODE, help="input: の入力方式（既定: human）")
+    parser.add_argument("--block", type=str, help="リソースブロックの設定ファイル（JSON）")
+    parser.add_argument("--capture", type=str, help="ネットワークキャプチャの出力先（.jsonl / .har）")
+    parser.add_argument("--capture-sample", type=float, default=1.0, help="キャプチャする割合（0〜1、URL単位）")
+    parser.add_argument("--capture-filter", action="append", help="キャプチャする URL の glob（複数指定可）")
+    parser.add_argument("--capture-types", type=str, help="キャプチャするリソース種別（カンマ区切り）")
+    parser.add_argument("--capture-ring", type=int, default=0, help="net: で参照する直近件数")
+    parser.add_argument("--capture-rotate-mb", type=int, default=100, help="キャプチャファイルのローテーションサイズ（MB）")
+    parser.add_argument("--ss-format", choices=SCREENSHOT_FORMATS, default="png", help="スクリーンショットの形式")
+    parser.add_argument("--ss-quality", type=int, help="JPEG / WebP の品質（0〜100）")
+    parser.add_argument("--ss-no-dedup", action="store_true", help="直前と同じ画像も保存する")
+    parser.add_argument("--auto-ss", type=float, default=0.0, help="自動撮影の間隔（秒）")
+    parser.add_argument("--auto-ss-budget", type=int, default=100, help="自動撮影の最大枚数")
+    parser.add_argument("--metrics", type=str, help="計測結果の出力先（既定: logs/metrics_<日時>.json）")
+    parser.add_argument("--on-error", choices=("continue", "stop"), default=DEFAULT_ON_ERROR, help="コマンドファイルでエラーが起きたときの動作（既定: continue）")
+    parser.add_argument("--retries", type=int, default=0, help="失敗したコマンドのリトライ回数")
+    parser.add_argument("--retry-backoff", type=int, default=DEFAULT_RETRY_BACKOFF_MS, help="最初のリトライまでの待ち時間（ms、以降は倍々）")
+    parser.add_argument("--checkpoint-every", type=int, help=f"チェックポイントを保存する間隔（コマンド数、0 で無効。既定: {DEFAULT_CHECKPOINT_EVERY}、--resume 時は 1）")
+    parser.add_argument("--resume", action="store_true", help="-f / --batch のコマンドファイルを最後のチェックポイントから再開")
+    parser.add_argument("--mem-limit", type=float, default=0, help="JS ヒープ使用量がこれ（MB）を超えたらコンテキストを作り直す")
+    parser.add_argument("--recycle-every", type=int, default=0, help="コンテキストを作り直す間隔（コマンド数、0 で無効）")
+    parser.add_argument("--mem-sample-every", type=int, default=DEFAULT_MEMORY_SAMPLE_EVERY, help=f"メモリを計測する間隔（コマンド数、既定: {DEFAULT_MEMORY_SAMPLE_EVERY}）")
+    parser.add_argument("--mem-log", action="store_true", help="作り直しはせずメモリの計測・記録だけ行う")
+    parser.add_argument("--low-memory", action="store_true", help="Chromium をメモリ節約用のオプションで起動する")
+    parser.add_argument("--data", type=str, help="-f のコマンドファイルの {{変数}} を埋めるデータ（.csv / .jsonl）")
+    parser.add_argument("--data-key", type=str, help="行を識別する列（省略時は行の内容のハッシュ）")
+    parser.add_argument("--data-results", type=str, help="行ごとの結果の出力先（既定: logs/data_<コマンド>_<データ>.jsonl）")
+    parser.add_argument("--optimize-selectors", action="store_true", help="select: / click: の長い XPath を短いセレクタに置き換えて記録する")
+    parser.add_argument("--check", action="store_true", help="-f / --batch のコマンドファイルを検査して終了（ブラウザは起動しない）")
+    parser.add_argument("--list-profiles", action="store_true", help="保存済みプロファイルを一覧表示して終了")
     args = parser.parse_args()
 
+    # ブラウザを使わない操作は Playwright を読み込まずに済ませる
+    if args.list_profiles:
+        for name in list_profiles():
+            print(name)
+        return
+
+    if args.resume and not (args.f or args.batch):
+        parser.error("--resume には -f または --batch が必要です")
+    if args.data and (not args.f or args.batch or args.resume):
+        parser.error("--data は -f と組み合わせて使います（--batch / --resume とは併用できません。成功済みの行は自動で飛ばします）")
+
+    try:
+        parse_wait_strategy(args.wait)
+        parse_input_mode(args.input_mode)
+    except ValueError as e:
+        parser.error(str(e))
+
+    jobs = load_jobs(args.batch) if args.batch else []
+    command_files = [args.f] if args.f else list(dict.fromkeys(job["file"] for job in jobs))
+    if args.check:
+        if not command_files:
+            parser.error("--check には -f または --batch が必要です")
+        sys.exit(0 if check_command_files(command_files) else 1)
+    if args.f == "-" and (args.resume or args.data or not args.p):
+        parser.error("-f - は -p と組み合わせて使います（--resume / --data とは併用できません）")
+    from command_plan import format_errors
+    from metrics import Metrics
+    from net_capture import NetworkCapture
+    from request_filter import RequestFilter
+    from screenshot_pipeline import ScreenshotPipeline
+    from selector_optimizer import SelectorOptimizer
+
+    # ブラウザを起動する前にコマンドファイルをコンパイルし、不正なコマンドがあれば実行しない
+    errors = [
+        line
+        for filepath in command_files
+        if filepath != "-" and Path(filepath).exists()
+        for line in format_errors(compile_command_file(filepath))
+    ]
+    if errors:
+        print("\n".join(errors))
+        parser.exit(1, f"コマンドファイルに {len(errors)} 件のエラーがあります（--check で確認できます）\n")
+
+    options = {
+        "wait": args.wait,
+        "wait_timeout": args.wait_timeout,
+        "input_mode": args.input_mode,
+        "on_error": args.on_error,
+        "retries": args.retries,
+        "retry_backoff": args.retry_backoff,
+        "checkpoint_every": args.checkpoint_every if args.checkpoint_every is not None else (1 if args.resume else DEFAULT_CHECKPOINT_EVERY),
+        "resume": args.resume,
+        "memory_limit": args.mem_limit,
+        "recycle_every": args.recycle_every,
+        "memory_sample_every": args.mem_sample_every,
+        "memory_log": args.mem_log,
+        "low_memory": args.low_memory,
+        "data": args.data,
+        "data_key": args.data_key,
+        "data_results": args.data_results,
+    }
+    if args.block:
+        try:
+            options["request_filter"] = RequestFilter.load(args.block)
+        except (OSError, ValueError) as e:
+            parser.error(f"--block: {e}")
+    if args.capture or args.capture_ring:
+        options["net_capture"] = NetworkCapture(
+            args.capture,
+            sample=args.capture_sample,
+            url_patterns=args.capture_filter,
+            resource_types=args.capture_types.split(",") if args.capture_types else None,
+            ring_size=args.capture_ring,
+            rotate_bytes=args.capture_rotate_mb * 1024 * 1024,
+        )
+
+    if args.optimize_selectors:
+        options["selector_optimizer"] = SelectorOptimizer(LOGS_DIR / "selector_cache.json")
+
+    options["metrics"] = Metrics()
+    options["screenshots"] = ScreenshotPipeline(
+        LOGS_DIR,
+        fmt=args.ss_format,
+        quality=args.ss_quality,
+        dedup=not args.ss_no_dedup,
+        interval=args.auto_ss,
+        max_frames=args.auto_ss_budget,
+    )
+
+    if args.batch:
+        run_batch(jobs, args.concurrency, args.headless, options)
+        export_metrics(options["metrics"], args.metrics)
+        return
+
     # プロファイル選択
     if args.p:
         profile_name = args.p
-        profile_path = PROFILES_DIR / f"{profile_name}.json"
-        if profile_path.exists():
+        if PROFILE_STORE.exists(profile_name):
             print(f"→ {profile_name} を使用")
         else:
             print(f"→ {profile_name} を新規作成")
     else:
         profile_name = select_profile()
-        profile_path = PROFILES_DIR / f"{profile_name}.json"
-
-    with sync_playwright() as pw:
-        browser = pw.chromium.launch(headless=args.headless)
-
-        # プロファイルが存在すればセッションを復元
-        if profile_path.exists():
-            context = browser.new_context(storage_state=str(profile_path))
-            print("  セッションを復元しました")
-        else:
-            context = browser.new_context()
-            print("  新規セッションで開始")
 
-        page = context.new_page()
-
-        # 初期URL
-        url = args.u or ""
-        if url:
-            page.goto(url, wait_until="domcontentloaded")
-            page.wait_for_timeout(1000)
-            print(f"  → {page.title()} ({page.url})")
-
-        run_shell(page, context, profile_name, command_file=args.f, initial_url=args.u)
+    from concurrent.futures import ThreadPoolExecutor
 
-        # 終了時に自動保存
-        PROFILES_DIR.mkdir(exist_ok=True)
-        context.storage_state(path=str(profile_path))
-        print(f"プロファイル自動保存: {profile_name}")
-
-        context.close()
-        browser.close()
+    from playwright.sync_api import sync_playwright
 
+    # プロファイル（またはチェックポイント）の読み込みはブラウザの起動と並行して行う
+    # （sync_api はスレッドをまたげないため、ブラウザ側をメインスレッドで起動する）
+    loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile-load")
+    loading = loader.submit(load_session_state, profile_name, args.f, args.resume)
+    loader.shutdown(wait=False)
+    with sync_playwright() as pw:
+        browser = pw.chromium.launch(headless=args.headless, args=LOW_MEMORY_ARGS if args.low_memory else None)
+        storage_state, saved = loading.result()
+        run_browser_session(browser, profile_name, storage_state, saved, args, options)
+
+    options["screenshots"].close()
+    if options.get("net_capture"):
+        options["net_capture"].close()
+    export_metrics(options["metrics"], args.metrics)
     print("終了しました")
 
 
@@ -1,34 +1,55 @@
 """06_export_cookies.py — Chrome の Cookie を Playwright プロファイルにエクスポート
 
 通常の Chrome でログイン済みのサイトの Cookie を抽出し、
-Playwright の storage_state 形式（profiles/*.json）に保存する。
+Playwright のプロファイル（profiles/profiles.db）にマージする。
+
+macOS と Linux の Chrome（v10 / v11 形式の暗号化）に対応する。
+行は fetchmany でチャンク単位に読み、チャンクごとに復号する（メモリに載せるのは復号済みの Cookie のみ）。
+
+Cookie DB はコピーせず SQLite の URI で読み取り専用（ロックされていれば immutable）で開く。
+--sync では前回の同期以降に更新された Cookie（last_update_utc がウォーターマークより新しいもの）
+だけを読み、プロファイルに差分としてマージする。
 
 使い方:
   uv run python examples/06_export_cookies.py
   uv run python examples/06_export_cookies.py -p teddy -d x.com
+  uv run python examples/06_export_cookies.py -p teddy --cookies-db /path/to/Cookies
+  uv run python examples/06_export_cookies.py -p teddy --chrome-profile Default -d x.com --sync
 """
 
 import argparse
 import json
-import shutil
 import sqlite3
 import subprocess
-import tempfile
-from datetime import datetime, timezone
+import sys
+import time
+from functools import lru_cache
 from pathlib import Path
 
-from Crypto.Cipher import AES
-from Crypto.Protocol.KDF import PBKDF2
+from profile_store import ProfileStore, format_stats
 
 
-CHROME_DIR = Path.home() / "Library/Application Support/Google/Chrome"
+if sys.platform == "darwin":
+    CHROME_DIR = Path.home() / "Library/Application Support/Google/Chrome"
+else:
+    CHROME_DIR = Path.home() / ".config/google-chrome"
 PROFILES_DIR = Path(__file__).resolve().parent.parent / "profiles"
 
-# macOS Chrome の暗号化パラメータ
+# Chrome の暗号化パラメータ（PBKDF2 の反復回数は macOS が 1003、Linux が 1）
 SALT = b"saltysalt"
 IV = b" " * 16
 KEY_LENGTH = 16
-ITERATIONS = 1003
+ITERATIONS = 1003 if sys.platform == "darwin" else 1
+# Linux でキーリングを使わない場合（v10）の固定パスワード
+LINUX_V10_PASSWORD = "peanuts"
+# meta テーブルの version がこれ以上なら、復号後の先頭 32 バイトは host_key の SHA-256
+HASH_PREFIX_META_VERSION = 24
+HASH_PREFIX_LENGTH = 32
+
+SAMESITE_MAP = {-1: "None", 0: "None", 1: "Lax", 2: "Strict"}
+
+# fetchmany で一度に読む行数（= 復号ワーカーに渡す1チャンクの行数）
+FETCH_ROWS = 2000
 
 
 def get_chrome_profiles() -> list[dict[str, str]]:
@@ -61,8 +82,8 @@ def select_profile(profiles: list[dict[str, str]]) -> dict[str, str]:
         print("無効な入力です。")
 
 
-def get_encryption_key() -> bytes:
-    """macOS Keychain から Chrome の暗号化キーを取得する。"""
+def _keychain_password() -> str:
+    """macOS Keychain から Chrome Safe Storage のパスワードを取得する。"""
     result = subprocess.run(
         [
             "security", "find-generic-password",
@@ -72,24 +93,103 @@ def get_encryption_key() -> bytes:
         capture_output=True,
         text=True,
     )
-    password = result.stdout.strip()
+    return result.stdout.strip()
+
+
+def _linux_keyring_password() -> str:
+    """GNOME キーリング（libsecret）から Chrome Safe Storage のパスワードを取得する。
+
+    secret-tool が無い・キーリングに無い場合は空文字（Chrome 自身のフォールバックと同じ）。
+    """
+    try:
+        result = subprocess.run(
+            ["secret-tool", "lookup", "application", "chrome"],
+            capture_output=True,
+            text=True,
+        )
+    except FileNotFoundError:
+        return ""
+    return result.stdout.strip()
+
+
+@lru_cache(maxsize=None)
+def get_encryption_key(version: str = "v10") -> bytes:
+    """Chrome の暗号化キーを取得する。PBKDF2 の導出はプロセス内で1回だけ行う。"""
+    from Crypto.Protocol.KDF import PBKDF2
+
+    if sys.platform == "darwin":
+        password = _keychain_password()
+    elif version == "v11":
+        password = _linux_keyring_password()
+    else:
+        password = LINUX_V10_PASSWORD
     return PBKDF2(password.encode(), SALT, dkLen=KEY_LENGTH, count=ITERATIONS)
 
 
-def decrypt_cookie_value(encrypted: bytes, key: bytes) -> str:
-    """Chrome の暗号化 Cookie 値を復号する。"""
-    if encrypted[:3] == b"v10":
-        encrypted = encrypted[3:]
-        cipher = AES.new(key, AES.MODE_CBC, IV)
-        decrypted = cipher.decrypt(encrypted)
+def read_meta_version(conn: sqlite3.Connection) -> int:
+    """Cookie DB の meta テーブルからスキーマバージョンを読む。"""
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    except sqlite3.DatabaseError:
+        return 0
+    return int(row[0]) if row else 0
+
+
+class CookieDecryptor:
+    """Chrome の暗号化 Cookie 値を復号する。
+
+    AES-CBC の暗号オブジェクトは IV を状態として持つため毎回作り直す必要があるが、
+    ECB の暗号オブジェクトはキーのバージョンごとに1つ作って使い回し、CBC の連鎖は XOR で計算する。
+    """
+
+    def __init__(self, meta_version: int = 0) -> None:
+        from Crypto.Util.strxor import strxor
+
+        self.strip_hash = meta_version >= HASH_PREFIX_META_VERSION
+        self._strxor = strxor
+        self._ciphers: dict = {}
+
+    def _cipher(self, version: str):
+        cipher = self._ciphers.get(version)
+        if cipher is None:
+            from Crypto.Cipher import AES
+
+            cipher = self._ciphers[version] = AES.new(get_encryption_key(version), AES.MODE_ECB)
+        return cipher
+
+    def decrypt(self, encrypted: bytes) -> str:
+        version = encrypted[:3]
+        if version not in (b"v10", b"v11"):
+            return encrypted.decode("utf-8", errors="replace")
+        data = encrypted[3:]
+        if not data or len(data) % 16:
+            return ""
+        # CBC 復号: P[i] = AES_ECB_decrypt(C[i]) XOR C[i-1]（C[-1] は IV）
+        decrypted = self._strxor(self._cipher(version.decode()).decrypt(data), IV + data[:-16])
         # PKCS7 パディング除去
         padding = decrypted[-1]
-        if isinstance(padding, int) and 1 <= padding <= 16:
+        if 1 <= padding <= 16:
             decrypted = decrypted[:-padding]
-        # macOS Chrome は復号後の先頭 32 バイトにゴミデータが入るためスキップ
-        decrypted = decrypted[32:]
+        if self.strip_hash:
+            decrypted = decrypted[HASH_PREFIX_LENGTH:]
         return decrypted.decode("utf-8", errors="replace")
-    return encrypted.decode("utf-8", errors="replace")
+
+    def rows_to_cookies(self, rows: list[tuple]) -> list[dict]:
+        """Cookie DB の行（_COOKIE_QUERY の列順）を storage_state の Cookie に変換する。"""
+        decrypt = self.decrypt
+        return [
+            {
+                "name": name,
+                "value": decrypt(encrypted_value) if encrypted_value else value,
+                "domain": host,
+                "path": path,
+                "expires": chrome_timestamp_to_unix(expires),
+                "httpOnly": bool(httponly),
+                "secure": bool(secure),
+                "sameSite": SAMESITE_MAP.get(samesite, "None"),
+            }
+            for host, name, value, path, encrypted_value, secure, httponly, samesite, expires in rows
+        ]
 
 
 def chrome_timestamp_to_unix(chrome_ts: int) -> float:
@@ -100,82 +200,159 @@ def chrome_timestamp_to_unix(chrome_ts: int) -> float:
     return (chrome_ts / 1_000_000) - epoch_diff
 
 
-def export_cookies(
-    profile_dir_name: str,
-    domain_filter: str | None = None,
-) -> list[dict]:
-    """Chrome の Cookie DB から Cookie を読み取る。"""
-    cookies_db = CHROME_DIR / profile_dir_name / "Cookies"
-    if not cookies_db.exists():
-        print(f"エラー: Cookie DB が見つかりません: {cookies_db}")
-        return []
+_COOKIE_QUERY = (
+    "SELECT host_key, name, value, path, encrypted_value, is_secure, is_httponly, samesite, expires_utc"
+    " FROM cookies"
+)
 
-    # DB をコピーして読む（Chrome がロックしている可能性があるため）
-    tmp = tempfile.mktemp(suffix=".db")
-    shutil.copy2(cookies_db, tmp)
 
-    key = get_encryption_key()
+def find_cookies_db(profile_dir_name: str) -> Path:
+    """Chrome プロファイルの Cookie DB のパスを返す（新しい Chrome は Network/Cookies）。"""
+    profile_dir = CHROME_DIR / profile_dir_name
+    network = profile_dir / "Network" / "Cookies"
+    return network if network.exists() else profile_dir / "Cookies"
 
-    try:
-        conn = sqlite3.connect(tmp)
-        cursor = conn.cursor()
 
-        query = "SELECT host_key, name, path, encrypted_value, is_secure, is_httponly, samesite, expires_utc FROM cookies"
-        params = []
-        if domain_filter:
-            query += " WHERE host_key LIKE ?"
-            params.append(f"%{domain_filter}%")
+def open_cookies_db(path: Path, immutable: bool = False) -> sqlite3.Connection:
+    """Cookie DB をコピーせずに読み取り専用で開く。
 
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
+    Chrome がロックしていて読めない場合は immutable=1 で開き直す（ロックを取らずにファイルを
+    そのまま読む。Chrome が書き込み中だと途中の状態が見えることがあるが、次回の同期で読み直される）。
+    """
+    uri = f"{path.resolve().as_uri()}?mode=ro"
+    if immutable:
+        return sqlite3.connect(uri + "&immutable=1", uri=True)
+    conn = sqlite3.connect(uri, uri=True)
+    try:
+        conn.execute("SELECT 1 FROM cookies LIMIT 1").fetchone()
+    except sqlite3.OperationalError:
         conn.close()
+        return open_cookies_db(path, immutable=True)
+    return conn
 
-        cookies = []
-        for host, name, path, encrypted_value, secure, httponly, samesite, expires in rows:
-            value = decrypt_cookie_value(encrypted_value, key)
 
-            sameSite_map = {-1: "None", 0: "None", 1: "Lax", 2: "Strict"}
+def has_last_update_column(conn: sqlite3.Connection) -> bool:
+    """cookies テーブルに last_update_utc 列があるか（古い Chrome には無い）。"""
+    return any(row[1] == "last_update_utc" for row in conn.execute("PRAGMA table_info(cookies)"))
 
-            cookies.append({
-                "name": name,
-                "value": value,
-                "domain": host,
-                "path": path,
-                "expires": chrome_timestamp_to_unix(expires),
-                "httpOnly": bool(httponly),
-                "secure": bool(secure),
-                "sameSite": sameSite_map.get(samesite, "None"),
-            })
 
-        return cookies
+def read_cookies(
+    conn: sqlite3.Connection,
+    domain_filter: str | None = None,
+    since: int = 0,
+    until: int | None = None,
+) -> list[dict]:
+    """開いた Cookie DB から Cookie を読み取り、チャンク単位で復号する。
+
+    復号は GIL を保持したまま行われるため、スレッドで並列化しても速くならない（bench_cookie_export.py で確認）。
+
+    until を指定すると since < last_update_utc <= until の行だけを読む（since が 0 なら下限なし）。
+    """
+    decryptor = CookieDecryptor(read_meta_version(conn))
+
+    conditions = []
+    params: list = []
+    if domain_filter:
+        conditions.append("host_key LIKE ?")
+        params.append(f"%{domain_filter}%")
+    if until is not None:
+        # 初回の同期（since=0）では last_update_utc が 0 の行も読む
+        if since:
+            conditions.append("last_update_utc > ?")
+            params.append(since)
+        conditions.append("last_update_utc <= ?")
+        params.append(until)
+    query = _COOKIE_QUERY
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    cursor = conn.execute(query, params)
+
+    cookies: list[dict] = []
+    while rows := cursor.fetchmany(FETCH_ROWS):
+        cookies.extend(decryptor.rows_to_cookies(rows))
+    return cookies
+
+
+def export_cookies(
+    profile_dir_name: str,
+    domain_filter: str | None = None,
+    cookies_db: Path | None = None,
+    since: int = 0,
+    immutable: bool = False,
+    sync: bool = False,
+) -> tuple[list[dict], int]:
+    """Chrome の Cookie DB から Cookie を読み取る。sync なら since より後に更新されたものだけを読む。
+
+    読み取った Cookie と、次回の since に渡すウォーターマーク（last_update_utc の最大値）を返す。
+    全件の読み取り（sync でない）では last_update_utc で絞り込まない（0 の行も読む）。
+    """
+    cookies_db = cookies_db or find_cookies_db(profile_dir_name)
+    if not cookies_db.exists():
+        print(f"エラー: Cookie DB が見つかりません: {cookies_db}")
+        return [], since
+
+    conn = open_cookies_db(cookies_db, immutable)
+    try:
+        if not has_last_update_column(conn):
+            return read_cookies(conn, domain_filter), 0
+        # ウォーターマークの取得と行の読み取りを同じスナップショットで行う
+        conn.execute("BEGIN")
+        until = conn.execute("SELECT MAX(last_update_utc) FROM cookies").fetchone()[0] or 0
+        if not sync:
+            return read_cookies(conn, domain_filter), until
+        if until <= since:
+            return [], since
+        return read_cookies(conn, domain_filter, since, until), until
     finally:
-        Path(tmp).unlink(missing_ok=True)
+        conn.close()
 
 
-def main() -> None:
-    PROFILES_DIR.mkdir(exist_ok=True)
-    profiles = get_chrome_profiles()
+def sync_source(cookies_db: Path, domain_filter: str | None) -> str:
+    """ウォーターマークのキー。同じ DB でもドメインフィルタが違えば別に管理する。"""
+    return f"{cookies_db.resolve()}#{domain_filter or ''}"
 
+
+def main() -> None:
     parser = argparse.ArgumentParser(description="Chrome Cookie エクスポーター")
     parser.add_argument("-p", type=str, help="保存先プロファイル名")
     parser.add_argument("-d", type=str, help="ドメインフィルタ（例: x.com）")
+    parser.add_argument("--cookies-db", type=Path, help="Cookie DB のパスを直接指定（プロファイル選択を省略）")
+    parser.add_argument("--chrome-profile", type=str, help="Chrome のプロファイルディレクトリ名（例: Default。プロファイル選択を省略）")
+    parser.add_argument("--sync", action="store_true", help="前回の同期以降に更新された Cookie だけを読む（-p 必須、対話なし）")
+    parser.add_argument("--immutable", action="store_true", help="Cookie DB をロックせずに immutable で開く")
     args = parser.parse_args()
 
+    if args.sync and not args.p:
+        parser.error("--sync には -p が必要です")
+
     # Chrome プロファイル選択
-    selected = select_profile(profiles)
+    if args.cookies_db:
+        dir_name = ""
+        cookies_db = args.cookies_db
+    else:
+        dir_name = args.chrome_profile or select_profile(get_chrome_profiles())["dir_name"]
+        cookies_db = find_cookies_db(dir_name)
 
     # ドメインフィルタ
     domain = args.d
-    if not domain:
+    if not domain and not args.sync:
         domain = input("ドメインフィルタ（空欄で全て）: ").strip() or None
 
+    store = ProfileStore(PROFILES_DIR / "profiles.db", legacy_dir=PROFILES_DIR)
+    source = sync_source(cookies_db, domain)
+    since = store.get_watermark(args.p, source) if args.sync else 0
+
     # Cookie エクスポート
-    print("Cookie を読み取り中...")
-    cookies = export_cookies(selected["dir_name"], domain)
-    print(f"  {len(cookies)} 件の Cookie を取得")
+    print("Cookie を読み取り中..." if not args.sync else f"前回の同期以降の Cookie を読み取り中...（ウォーターマーク: {since}）")
+    start = time.perf_counter()
+    cookies, watermark = export_cookies(dir_name, domain, cookies_db, since, args.immutable, sync=args.sync)
+    elapsed = time.perf_counter() - start
+    print(f"  {len(cookies)} 件の Cookie を取得（{elapsed:.2f}秒）")
 
     if not cookies:
-        print("Cookie が見つかりませんでした")
+        if args.sync and watermark > since:
+            store.set_watermark(args.p, source, watermark)
+        print("変更はありません" if args.sync else "Cookie が見つかりませんでした")
         return
 
     # プロファイル名
@@ -186,32 +363,14 @@ def main() -> None:
             print("プロファイル名を入力してください")
             return
 
-    # Playwright storage_state 形式で保存
-    profile_path = PROFILES_DIR / f"{profile_name}.json"
-
-    # 既存プロファイルがあればマージ
-    if profile_path.exists():
-        existing = json.loads(profile_path.read_text())
-        existing_cookies = existing.get("cookies", [])
-        # 同じ name+domain の Cookie は上書き
-        existing_map = {(c["name"], c["domain"]): c for c in existing_cookies}
-        for cookie in cookies:
-            existing_map[(cookie["name"], cookie["domain"])] = cookie
-        cookies = list(existing_map.values())
-        origins = existing.get("origins", [])
-    else:
-        origins = []
-
-    storage_state = {
-        "cookies": cookies,
-        "origins": origins,
-    }
-
-    profile_path.write_text(json.dumps(storage_state, indent=2, ensure_ascii=False))
-    print(f"\n保存完了: {profile_path}")
-    print(f"  Cookie数: {len(cookies)}")
-    print(f"\n05_chrome_launcher.py で使用:")
-    print(f"  uv run python examples/05_chrome_launcher.py -p {profile_name}")
+    # 既存プロファイルにマージ（同じ domain+path+name の Cookie は上書き、origin はそのまま）
+    store.load(profile_name)  # 従来の JSON プロファイルがあれば先に取り込む
+    stats = store.merge_cookies(profile_name, cookies, watermark=(source, watermark))
+    print(f"\n保存完了: {profile_name}（{store.db_path}）")
+    print(f"  {format_stats(stats)}")
+    if not args.sync:
+        print(f"\n05_chrome_launcher.py で使用:")
+        print(f"  uv run python examples/05_chrome_launcher.py -p {profile_name}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,366 @@
+"""07_async_engine.py — asyncio 版コマンドエンジン
+
+05_chrome_launcher.py と同じコマンド言語（url:, click:, select:, input:, wait:, ss, extract:, title, save と
+待機戦略・入力方式・ss のオプション）を playwright.async_api で実行する。1つのイベントループ・1つのブラウザで
+複数ページを並行に進める。
+
+  - コマンドの検査は 05 と共通（command_plan.py）。05 の対話シェル向けのコマンド（net, stats, mem, help）と
+    複数行入力モード（空の input:）は実行できないため、ブラウザを起動する前にエラーにする
+  - ページごとにコマンドキュー（asyncio.Queue）を持つ PageSession
+  - セッション単位のキャンセル（タイムアウト・Ctrl-C）
+  - 05 と同じ JSONL ジョブ定義（--batch）を1ブラウザで並列実行
+  - 待機戦略・入力方式の解析と実行は 05 と共通（page_actions.py）。--wait / --wait-timeout / --input-mode の
+    既定値も 05 と同じ
+
+使い方:
+  uv run python examples/07_async_engine.py --batch jobs.jsonl -j 8 --headless
+  uv run python examples/07_async_engine.py --batch jobs.jsonl --timeout 300
+  uv run python examples/07_async_engine.py --batch jobs.jsonl --wait quiet --input-mode chunk=16
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import time
+from datetime import datetime
+from pathlib import Path
+
+from playwright.async_api import async_playwright
+
+from command_plan import check_command, parse_command
+from extractor import extract_to_jsonl_async, parse_extract_options
+from page_actions import DEFAULT_INPUT_MODE, DEFAULT_WAIT, DEFAULT_WAIT_TIMEOUT
+from page_actions import parse_input_mode, parse_wait_strategy, type_text_async, wait_for_settle_async
+from screenshot_pipeline import ScreenshotPipeline, parse_screenshot_options
+
+# 05_chrome_launcher.py のプロファイル管理・コマンドファイル解析を共有する
+launcher = importlib.import_module("05_chrome_launcher")
+
+
+def _log(state: dict, message: str) -> None:
+    """セッション名付きで出力する（複数ページの出力が混ざっても追えるように）。"""
+    print(f"[{state.get('label', '-')}] {message}")
+
+
+async def new_profile_context(browser, profile_name: str):
+    """プロファイルが存在すればセッションを復元したコンテキストを作成する。"""
+    storage_state = launcher.PROFILE_STORE.load(profile_name)
+    if storage_state is not None:
+        return await browser.new_context(storage_state=storage_state)
+    return await browser.new_context()
+
+
+async def save_profile(context, profile_name: str) -> dict:
+    """コンテキストのセッションをプロファイルに差分保存し、変更件数を返す。"""
+    return launcher.PROFILE_STORE.save(profile_name, await context.storage_state())
+
+
+async def settle_after_async(page, option: str | None, state: dict) -> None:
+    """url: / click: の後、05 と同じ待機戦略でページが落ち着くまで待つ。"""
+    kind, value = parse_wait_strategy(option or state.get("wait", DEFAULT_WAIT))
+    warning = await wait_for_settle_async(page, kind, value, state.get("wait_timeout", DEFAULT_WAIT_TIMEOUT))
+    if warning is not None:
+        _log(state, warning)
+
+
+async def _cmd_url(page, context, profile_name: str, state: dict, option: str | None, arg: str) -> None:
+    kind, _ = parse_wait_strategy(option or state.get("wait", DEFAULT_WAIT))
+    await page.goto(arg.strip(), wait_until="commit" if kind == "commit" else "domcontentloaded")
+    await settle_after_async(page, option, state)
+    _log(state, f"→ {await page.title()} ({page.url})")
+
+
+async def _cmd_select(page, context, profile_name: str, state: dict, option: str | None, arg: str) -> None:
+    selector = arg.strip()
+    loc = page.locator(selector)
+    count = await loc.count()
+    if count == 0:
+        _log(state, f"要素が見つかりません: {selector}")
+        state["selected_element"] = None
+        return
+    state["selected_element"] = loc.first
+    text = await loc.first.text_content() or ""
+    tag = await loc.first.evaluate("el => el.tagName")
+    _log(state, f"選択: <{tag}> ({count}件中1件目)")
+    if text.strip():
+        _log(state, f"内容: {text.strip()[:200]}")
+
+
+async def _cmd_click(page, context, profile_name: str, state: dict, option: str | None, arg: str) -> None:
+    await page.locator(arg.strip()).first.click()
+    await settle_after_async(page, option, state)
+    _log(state, f"クリック完了 → {page.url}")
+
+
+async def _cmd_input(page, context, profile_name: str, state: dict, option: str | None, arg: str) -> None:
+    text = arg.strip().replace("\\n", "\n")
+    element = state.get("selected_element")
+    if element is None:
+        _log(state, "先に select: で要素を選択してください")
+        return
+    mode, chunk_size = parse_input_mode(option or state.get("input_mode", DEFAULT_INPUT_MODE))
+    await type_text_async(page, element, text, mode, chunk_size)
+    _log(state, f"入力完了 [{mode}]: {len(text)}文字")
+
+
+async def _cmd_screenshot(page, context, profile_name: str, state: dict, option: str | None, arg: str) -> None:
+    opts = parse_screenshot_options(option)
+    selector = arg.strip()
+    target = page.locator(selector).first if selector else page
+    screenshots = state["screenshots"]
+    fmt, quality, kwargs = screenshots.screenshot_args(
+        opts.get("format"), opts.get("quality"), opts.get("clip"), opts.get("full_page", False)
+    )
+    data = await target.screenshot(**kwargs)
+    path = screenshots.store(data, page, f"screenshot_{state.get('label', 'page')}", fmt, quality)
+    _log(state, "直前と同じ画面のため保存をスキップ" if path is None else f"保存: {path}")
+
+
+async def _cmd_extract(page, context, profile_name: str, state: dict, option: str | None, arg: str) -> None:
+    opts = parse_extract_options(option)
+    if opts["out"]:
+        out_path = Path(opts["out"])
+    else:
+        out_path = launcher.LOGS_DIR / f"extract_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jsonl"
+    total, written = await extract_to_jsonl_async(
+        page, arg.strip(), opts["fields"], out_path, limit=opts["limit"], page_size=opts["page_size"]
+    )
+    _log(state, f"抽出: {written}件（一致 {total}件） [{','.join(opts['fields'])}] → {out_path}")
+
+
+async def _cmd_title(page, context, profile_name: str, state: dict, option: str | None, arg: str) -> None:
+    _log(state, f"{await page.title()} ({page.url})")
+
+
+async def _cmd_save(page, context, profile_name: str, state: dict, option: str | None, arg: str) -> None:
+    stats = await save_profile(context, profile_name)
+    _log(state, f"プロファイル保存: {profile_name}（{launcher.format_stats(stats)}）")
+
+
+async def _cmd_wait(page, context, profile_name: str, state: dict, option: str | None, arg: str) -> None:
+    ms = int(arg.strip())
+    await page.wait_for_timeout(ms)
+    _log(state, f"{ms}ms 待機完了")
+
+
+# 05 のコマンドの表（launcher.command_table()）のうち、このエンジンで実行できるもの。quit は execute_command_async で扱う
+# （net / stats / mem / help は 05 の対話シェル向けのため対象外）
+ASYNC_COMMANDS = {
+    "url": _cmd_url,
+    "select": _cmd_select,
+    "click": _cmd_click,
+    "input": _cmd_input,
+    "screenshot": _cmd_screenshot,
+    "ss": _cmd_screenshot,
+    "extract": _cmd_extract,
+    "title": _cmd_title,
+    "save": _cmd_save,
+    "wait": _cmd_wait,
+    "quit": None,
+}
+
+
+def check_step(name: str, option: str | None, arg: str) -> str | None:
+    """05 と同じ検査に加え、このエンジンで実行できないコマンドをエラーにする。"""
+    error = check_command(name, option, arg, launcher.command_table())
+    if error is not None:
+        return error
+    if name not in ASYNC_COMMANDS:
+        return "07 では実行できないコマンド"
+    if name == "input" and not arg.strip():
+        return "複数行入力モードは非対応です（ヒアドキュメントを使用）"
+    return None
+
+
+def check_job_files(jobs: list[dict]) -> list[str]:
+    """ジョブのコマンドファイルを検査し、エラーを "ファイル:行: 内容" の形で返す（ブラウザは起動しない）。"""
+    errors = []
+    for filepath in dict.fromkeys(job["file"] for job in jobs):
+        if not Path(filepath).exists():
+            errors.append(f"{filepath}: ファイルが見つかりません")
+            continue
+        for step in launcher.compile_command_file(filepath).steps:
+            error = check_step(step.name, step.option, step.arg)
+            if error is not None:
+                errors.append(f"{filepath}:{step.lineno}: {error}: {step.label}")
+    return errors
+
+
+async def execute_command_async(cmd: str, page, context, profile_name: str, state: dict) -> bool:
+    """コマンドを1つ実行する。Falseを返すと終了。
+
+    書式は 05 と同じ（name[option]:arg）で、ASYNC_COMMANDS から実行関数を引いて呼ぶ。
+    """
+    name, option, arg = parse_command(cmd)
+    try:
+        error = check_step(name, option, arg)
+        if error is not None:
+            _log(state, f"{error}: {cmd}")
+        elif name == "quit":
+            return False
+        else:
+            await ASYNC_COMMANDS[name](page, context, profile_name, state, option, arg)
+
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        _log(state, f"エラー: {e}")
+
+    return True
+
+
+class PageSession:
+    """1ページ分のコマンドキューを持ち、投入されたコマンドを順に実行する。"""
+
+    def __init__(self, label: str, page, context, profile_name: str, screenshots: ScreenshotPipeline, options: dict) -> None:
+        self.page = page
+        self.context = context
+        self.profile_name = profile_name
+        # options: wait / wait_timeout / input_mode（コマンド行で戦略を省略したときの既定値）
+        self.state = {"selected_element": None, "label": label, "screenshots": screenshots, **options}
+        self.queue: asyncio.Queue[str | None] = asyncio.Queue()
+        self.task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self._loop())
+
+    def submit(self, cmd: str) -> None:
+        self.queue.put_nowait(cmd)
+
+    def submit_file(self, filepath: str) -> None:
+        """コマンドファイルの内容をキューに積む。"""
+        path = Path(filepath)
+        if not path.exists():
+            _log(self.state, f"ファイルが見つかりません: {filepath}")
+            return
+        for step in launcher.compile_command_file(filepath).steps:
+            self.submit(step.cmd)
+
+    def close(self) -> None:
+        """キューに終端を積む。積まれ済みのコマンドを実行し終えてから終了する。"""
+        self.queue.put_nowait(None)
+
+    def cancel(self) -> None:
+        """実行中のコマンドを含めて即座に中断する。"""
+        if self.task is not None:
+            self.task.cancel()
+
+    async def join(self) -> None:
+        if self.task is not None:
+            await self.task
+
+    async def _loop(self) -> None:
+        while True:
+            cmd = await self.queue.get()
+            if cmd is None:
+                break
+            _log(self.state, cmd if "\n" not in cmd else "input:(heredoc)")
+            if not await execute_command_async(cmd, self.page, self.context, self.profile_name, self.state):
+                break
+
+
+async def run_job_async(
+    browser, job: dict, label: str, timeout: float | None, screenshots: ScreenshotPipeline, options: dict
+) -> dict:
+    """ジョブを1つ実行する。timeout 秒を超えたらセッションをキャンセルする。"""
+    profile_name = job["profile"]
+    start = time.perf_counter()
+    result = {"profile": profile_name, "file": job["file"], "ok": True, "error": None}
+
+    context = await new_profile_context(browser, profile_name)
+    session = None
+    try:
+        page = await context.new_page()
+        session = PageSession(label, page, context, profile_name, screenshots, options)
+        if job.get("url"):
+            session.submit(f"url:{job['url']}")
+        session.submit_file(job["file"])
+        session.close()
+        session.start()
+        await asyncio.wait_for(session.join(), timeout=timeout)
+        await save_profile(context, profile_name)
+    except asyncio.TimeoutError:
+        result["ok"] = False
+        result["error"] = f"タイムアウト ({timeout}s)"
+    except Exception as e:
+        result["ok"] = False
+        result["error"] = str(e)
+    finally:
+        if session is not None:
+            session.cancel()
+        await context.close()
+
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+async def run_batch_async(
+    jobs: list[dict], concurrency: int, headless: bool, timeout: float | None, options: dict
+) -> list[dict]:
+    """1つのブラウザ内で最大 concurrency 個のコンテキストを並行実行する。"""
+    results: list[dict] = []
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    start = time.perf_counter()
+    screenshots = ScreenshotPipeline(launcher.LOGS_DIR)
+
+    async with async_playwright() as pw:
+        browser = await pw.chromium.launch(headless=headless)
+
+        async def worker(index: int, job: dict) -> None:
+            async with semaphore:
+                result = await run_job_async(browser, job, f"{index}:{job['profile']}", timeout, screenshots, options)
+            results.append(result)
+            elapsed = time.perf_counter() - start
+            rate = len(results) / elapsed * 60 if elapsed > 0 else 0.0
+            status = "OK" if result["ok"] else f"NG ({result['error']})"
+            print(
+                f"[{len(results)}/{len(jobs)}] {result['profile']} {result['file']}"
+                f" {status} {result['seconds']:.1f}s ({rate:.1f} jobs/min)"
+            )
+
+        print(f"=== 非同期バッチ実行: {len(jobs)} ジョブ / {concurrency} 並列 ===")
+        await asyncio.gather(*(worker(i, job) for i, job in enumerate(jobs, 1)))
+        await browser.close()
+    screenshots.close()
+
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for r in results if not r["ok"])
+    rate = len(results) / elapsed * 60 if elapsed > 0 else 0.0
+    print(f"=== バッチ完了: {len(results)} 件（失敗 {failed} 件）{elapsed:.1f}s, {rate:.1f} jobs/min ===")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Playwright 非同期コマンドエンジン")
+    parser.add_argument("--batch", type=str, required=True, help="バッチジョブ定義ファイル（JSONL）")
+    parser.add_argument("-j", "--concurrency", type=int, default=8, help="同時に開くコンテキスト数")
+    parser.add_argument("--timeout", type=float, help="ジョブごとのタイムアウト（秒）")
+    parser.add_argument("--headless", action="store_true", help="ヘッドレスモードで実行")
+    parser.add_argument("--wait", type=str, default=DEFAULT_WAIT, help="url:/click: 後の待機戦略（既定: fixed）")
+    parser.add_argument("--wait-timeout", type=int, default=DEFAULT_WAIT_TIMEOUT, help="待機戦略のタイムアウト（ms）")
+    parser.add_argument("--input-mode", type=str, default=DEFAULT_INPUT_MODE, help="input: の入力方式（既定: human）")
+    args = parser.parse_args()
+
+    try:
+        parse_wait_strategy(args.wait)
+        parse_input_mode(args.input_mode)
+    except ValueError as e:
+        parser.error(str(e))
+    options = {"wait": args.wait, "wait_timeout": args.wait_timeout, "input_mode": args.input_mode}
+
+    jobs = launcher.load_jobs(args.batch)
+    # ブラウザを起動する前に、全ジョブのコマンドファイルをこのエンジンで実行できるか検査する
+    errors = check_job_files(jobs)
+    if errors:
+        print("\n".join(errors))
+        parser.exit(1, f"コマンドファイルに {len(errors)} 件のエラーがあります\n")
+    try:
+        asyncio.run(run_batch_async(jobs, args.concurrency, args.headless, args.timeout, options))
+    except KeyboardInterrupt:
+        print("\n中断しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+"""08_launcher_daemon.py — 常駐ブラウザデーモンとクライアント
+
+ブラウザとプロファイルごとのコンテキストを起動したまま保持し、Unix ソケット経由の
+JSON-RPC 2.0（1行1メッセージ）で 05_chrome_launcher.py のコマンドを受け付ける。
+クライアントは Playwright を import しないため、コールドスタートのコストがかからない。
+
+メソッド:
+  open      {"profile", "url"?}             プロファイルのコンテキストを開く（開いていれば再利用）
+  execute   {"profile", "command"}          コマンドを1つ実行
+  run_file  {"profile", "lines" | "path"}   コマンドファイルを実行
+  save      {"profile"}                     セッションをプロファイルに保存
+  close     {"profile"}                     保存してコンテキストを閉じる
+  list      {}                              開いているセッション一覧
+  shutdown  {}                              すべて保存してデーモンを終了
+
+使い方:
+  uv run python examples/08_launcher_daemon.py serve --headless
+  uv run python examples/08_launcher_daemon.py client -p teddy -f commands.txt
+  uv run python examples/08_launcher_daemon.py client -p teddy -c "url:https://x.com" -c title
+  uv run python examples/08_launcher_daemon.py call list
+  uv run python examples/08_launcher_daemon.py stop
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+from pathlib import Path
+
+
+DEFAULT_SOCKET = Path(tempfile.gettempdir()) / f"playwright-launcher-{os.getuid()}.sock"
+
+# リクエストは1接続ずつ順に処理するため、この秒数リクエストを送らない接続は切断して次の接続を受け付ける
+DEFAULT_IDLE_TIMEOUT = 30.0
+
+# JSON-RPC 2.0 のエラーコード
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+
+class RpcError(Exception):
+    def __init__(self, code: int, message: str) -> None:
+        super().__init__(message)
+        self.code = code
+
+
+class LauncherDaemon:
+    """ブラウザを1つ起動し、プロファイルごとのセッションを保持する。
+
+    sync_api のオブジェクトは作成したスレッドでしか使えないため、
+    リクエストはすべてメインスレッドで順に処理する。
+    """
+
+    def __init__(self, headless: bool, options: dict) -> None:
+        from metrics import Metrics
+        from playwright.sync_api import sync_playwright
+
+        self.launcher = importlib.import_module("05_chrome_launcher")
+        self.options = {"metrics": Metrics(), **options}
+        self.pw = sync_playwright().start()
+        self.browser = self.pw.chromium.launch(headless=headless)
+        self.sessions: dict[str, dict] = {}
+        self.running = True
+
+    # --- セッション管理 ---
+
+    def _session(self, params: dict) -> dict:
+        profile = params.get("profile")
+        if not profile:
+            raise RpcError(INVALID_PARAMS, "profile を指定してください")
+        session = self.sessions.get(profile)
+        if session is None:
+            context = self.launcher.new_profile_context(self.browser, profile)
+            page = context.new_page()
+            state = self.launcher.new_state(self.options)
+            self.launcher.prepare_page(page, state)
+            session = {"profile": profile, "context": context, "page": page, "state": state}
+            self.sessions[profile] = session
+        return session
+
+    def _check_command(self, cmd: str) -> str | None:
+        """05 のコマンドの表で検査し、不正なコマンドならエラーの内容を返す（問題なければ None）。
+
+        空の input: は標準入力から複数行を読むが、デーモンの標準入力は端末ではないため受け付けない。
+        """
+        from command_plan import check_command, check_noninteractive, parse_command
+
+        name, option, arg = parse_command(cmd)
+        return check_command(name, option, arg, self.launcher.command_table()) or check_noninteractive(name, arg)
+
+    def _execute(self, session: dict, cmd: str) -> dict:
+        """コマンドを実行し、標準出力を捕捉して結果にまとめる。"""
+        buf = io.StringIO()
+        with contextlib.redirect_stdout(buf):
+            keep_going = self.launcher.execute_command(
+                cmd, session["page"], session["context"], session["profile"], session["state"]
+            )
+        error = session["state"].get("last_error")
+        return {
+            "command": cmd,
+            "ok": error is None,
+            "error": error,
+            "quit": not keep_going,
+            "output": [line.strip() for line in buf.getvalue().splitlines() if line.strip()],
+            "url": session["page"].url,
+        }
+
+    # --- RPC メソッド ---
+
+    def rpc_open(self, params: dict) -> dict:
+        session = self._session(params)
+        result = {"profile": session["profile"], "url": session["page"].url}
+        if params.get("url"):
+            result = self._execute(session, f"url:{params['url']}")
+        return result
+
+    def rpc_execute(self, params: dict) -> dict:
+        if not params.get("command"):
+            raise RpcError(INVALID_PARAMS, "command を指定してください")
+        error = self._check_command(params["command"])
+        if error is not None:
+            raise RpcError(INVALID_PARAMS, error)
+        return self._execute(self._session(params), params["command"])
+
+    def rpc_run_file(self, params: dict) -> dict:
+        from command_plan import parse_command_lines
+
+        if "lines" in params:
+            lines = params["lines"]
+        elif "path" in params:
+            path = Path(params["path"])
+            if not path.exists():
+                raise RpcError(INVALID_PARAMS, f"ファイルが見つかりません: {path}")
+            lines = path.read_text().splitlines()
+        else:
+            raise RpcError(INVALID_PARAMS, "lines または path を指定してください")
+
+        # 実行できないコマンドがあれば1つも実行しない
+        commands = list(parse_command_lines(lines))
+        for lineno, cmd, label in commands:
+            error = self._check_command(cmd)
+            if error is not None:
+                raise RpcError(INVALID_PARAMS, f"{lineno}行目: {error}: {label}")
+
+        session = self._session(params)
+        steps = []
+        for lineno, cmd, label in commands:
+            step = self._execute(session, cmd)
+            step["line"] = lineno
+            step["command"] = label
+            steps.append(step)
+            if step["quit"]:
+                break
+        return {
+            "profile": session["profile"],
+            "ok": all(step["ok"] for step in steps),
+            "steps": steps,
+            "url": session["page"].url,
+        }
+
+    def rpc_save(self, params: dict) -> dict:
+        session = self._session(params)
+        stats = self.launcher.save_profile(session["context"], session["profile"])
+        return {"profile": session["profile"], "changes": stats}
+
+    def rpc_close(self, params: dict) -> dict:
+        profile = params.get("profile")
+        session = self.sessions.pop(profile, None)
+        if session is None:
+            return {"profile": profile, "closed": False}
+        self.launcher.save_profile(session["context"], profile)
+        session["context"].close()
+        return {"profile": profile, "closed": True}
+
+    def rpc_list(self, params: dict) -> dict:
+        return {"sessions": [{"profile": name, "url": s["page"].url} for name, s in self.sessions.items()]}
+
+    def rpc_shutdown(self, params: dict) -> dict:
+        self.running = False
+        return {"profiles": list(self.sessions)}
+
+    # --- ディスパッチ ---
+
+    def handle(self, message: dict) -> dict | None:
+        """JSON-RPC リクエストを1つ処理してレスポンスを返す。
+
+        id の無いリクエスト（通知）には、失敗した場合も含めて応答しない（None を返す）。
+        """
+        if not isinstance(message, dict) or message.get("jsonrpc") != "2.0" or not isinstance(message.get("method"), str):
+            # 形式が不正なものは通知として扱わず、必ずエラーを返す
+            msg_id = message.get("id") if isinstance(message, dict) else None
+            return {"jsonrpc": "2.0", "id": msg_id, "error": {"code": INVALID_REQUEST, "message": "不正なリクエスト"}}
+        notification = "id" not in message
+        msg_id = message.get("id")
+        try:
+            method = message["method"]
+            handler = getattr(self, f"rpc_{method}", None)
+            if handler is None:
+                raise RpcError(METHOD_NOT_FOUND, f"不明なメソッド: {method}")
+            params = message.get("params") or {}
+            if not isinstance(params, dict):
+                raise RpcError(INVALID_PARAMS, "params はオブジェクトで指定してください")
+            result = handler(params)
+        except RpcError as e:
+            error = {"code": e.code, "message": str(e)}
+        except Exception as e:
+            error = {"code": INTERNAL_ERROR, "message": str(e)}
+        else:
+            error = None
+        if notification:
+            # 通知には応答できないため、失敗はデーモン側に表示するだけにする
+            if error is not None:
+                print(f"通知の処理に失敗しました: {method}: {error['message']}")
+            return None
+        if error is not None:
+            return {"jsonrpc": "2.0", "id": msg_id, "error": error}
+        return {"jsonrpc": "2.0", "id": msg_id, "result": result}
+
+    def close(self) -> None:
+        for profile in list(self.sessions):
+            self.rpc_close({"profile": profile})
+        self.browser.close()
+        self.pw.stop()
+
+
+def serve(socket_path: Path, headless: bool, options: dict, idle_timeout: float = DEFAULT_IDLE_TIMEOUT) -> None:
+    """デーモンを起動し、shutdown を受け取るまでリクエストを処理する。
+
+    sync_api のためリクエストはメインスレッドで1接続ずつ処理する。何も送らずに接続したままの
+    クライアントが他のクライアントを待たせ続けないよう、idle_timeout 秒で切断する。
+    """
+    daemon = LauncherDaemon(headless, options)
+
+    class Handler(socketserver.StreamRequestHandler):
+        timeout = idle_timeout
+
+        def handle(self) -> None:
+            try:
+                for raw in self.rfile:
+                    if not raw.strip():
+                        continue
+                    try:
+                        message = json.loads(raw)
+                    except json.JSONDecodeError as e:
+                        response = {"jsonrpc": "2.0", "id": None, "error": {"code": PARSE_ERROR, "message": str(e)}}
+                    else:
+                        response = daemon.handle(message)
+                    if response is not None:
+                        self.wfile.write(json.dumps(response, ensure_ascii=False).encode() + b"\n")
+                        self.wfile.flush()
+                    if not daemon.running:
+                        break
+            except TimeoutError:
+                print(f"{idle_timeout:.0f}秒間リクエストが無いため接続を切断しました")
+
+    socket_path.unlink(missing_ok=True)
+    with socketserver.UnixStreamServer(str(socket_path), Handler) as server:
+        os.chmod(socket_path, 0o600)
+        print(f"デーモン起動: {socket_path}")
+        try:
+            while daemon.running:
+                server.handle_request()
+        except KeyboardInterrupt:
+            print()
+        finally:
+            daemon.close()
+            socket_path.unlink(missing_ok=True)
+    print("デーモンを終了しました")
+
+
+class RpcClient:
+    """デーモンへの JSON-RPC クライアント（1接続で複数リクエストを送る）。"""
+
+    def __init__(self, socket_path: Path) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(str(socket_path))
+        self.file = self.sock.makefile("rwb")
+        self.next_id = 0
+
+    def call(self, method: str, params: dict | None = None) -> dict:
+        self.next_id += 1
+        request = {"jsonrpc": "2.0", "id": self.next_id, "method": method, "params": params or {}}
+        self.file.write(json.dumps(request, ensure_ascii=False).encode() + b"\n")
+        self.file.flush()
+        response = json.loads(self.file.readline())
+        if "error" in response:
+            raise RpcError(response["error"]["code"], response["error"]["message"])
+        return response["result"]
+
+    def close(self) -> None:
+        self.file.close()
+        self.sock.close()
+
+
+def print_step(step: dict) -> None:
+    prefix = f"[{step['line']}] " if "line" in step else ""
+    print(f"{prefix}{step['command']}")
+    for line in step["output"]:
+        print(f"  {line}")
+
+
+def run_client(args) -> int:
+    """open → execute / run_file の順に送り、結果を表示する。失敗があれば 1 を返す。"""
+    client = RpcClient(args.socket)
+    try:
+        results = [client.call("open", {"profile": args.p, "url": args.u})]
+        if args.f:
+            lines = sys.stdin.read().splitlines() if args.f == "-" else Path(args.f).read_text().splitlines()
+            results.append(client.call("run_file", {"profile": args.p, "lines": lines}))
+        for cmd in args.c or []:
+            results.append(client.call("execute", {"profile": args.p, "command": cmd}))
+        if args.save:
+            results.append(client.call("save", {"profile": args.p}))
+    finally:
+        client.close()
+
+    ok = True
+    for result in results:
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False))
+            continue
+        for step in result.get("steps", [result] if "command" in result else []):
+            print_step(step)
+        ok = ok and result.get("ok", True)
+    return 0 if ok else 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Playwright 常駐ブラウザデーモン")
+    parser.add_argument("--socket", type=Path, default=DEFAULT_SOCKET, help="Unix ソケットのパス")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    p_serve = sub.add_parser("serve", help="デーモンを起動")
+    p_serve.add_argument("--headless", action="store_true", help="ヘッドレスモードで実行")
+    p_serve.add_argument("--wait", type=str, default="fixed", help="url:/click: 後の待機戦略")
+    p_serve.add_argument("--input-mode", type=str, default="human", help="input: の入力方式")
+    p_serve.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT, help=f"リクエストを送らない接続を切断するまでの秒数（既定: {DEFAULT_IDLE_TIMEOUT:.0f}）")
+
+    p_client = sub.add_parser("client", help="コマンドを送信")
+    p_client.add_argument("-p", type=str, required=True, help="プロファイル名")
+    p_client.add_argument("-u", type=str, help="開くURL")
+    p_client.add_argument("-f", type=str, help="コマンドファイル（- で標準入力）")
+    p_client.add_argument("-c", action="append", help="実行するコマンド（複数指定可）")
+    p_client.add_argument("--save", action="store_true", help="実行後にプロファイルを保存")
+    p_client.add_argument("--json", action="store_true", help="結果を JSON で出力")
+
+    p_call = sub.add_parser("call", help="任意のメソッドを呼び出す")
+    p_call.add_argument("method", type=str)
+    p_call.add_argument("params", type=str, nargs="?", default="{}", help="JSON 形式のパラメータ")
+
+    sub.add_parser("stop", help="デーモンを終了")
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        serve(args.socket, args.headless, {"wait": args.wait, "input_mode": args.input_mode}, args.idle_timeout)
+        return
+
+    try:
+        if args.mode == "client":
+            sys.exit(run_client(args))
+        client = RpcClient(args.socket)
+        try:
+            if args.mode == "stop":
+                result = client.call("shutdown")
+            else:
+                result = client.call(args.method, json.loads(args.params))
+        finally:
+            client.close()
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"デーモンに接続できません: {args.socket}（serve で起動してください）")
+        sys.exit(2)
+    except RpcError as e:
+        print(f"エラー ({e.code}): {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
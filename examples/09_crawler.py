@@ -0,0 +1,290 @@
+"""09_crawler.py — タブプールで URL 一覧を並行に巡回するクローラ
+
+1つのブラウザ・1つのコンテキストで K 個のタブ（ページ）を開いたまま使い回し、
+URL ごとに遷移 → ページごとのコマンド（title / extract / ss / wait）を実行して、
+結果を JSONL に1行ずつ書き出す。
+
+  - タブ数（-k）で全体の同時実行数を、--per-domain でドメインごとの同時実行数を制限する
+  - 同じドメインへのリクエストの開始間隔を --delay ミリ秒以上あける（politeness delay）
+  - 遷移の失敗と 5xx / 429 は --retries 回まで指数バックオフでリトライする
+  - 結果は完了した順に書き出す（tail -f で追える）
+
+ページごとのコマンド（-c で複数指定、05 と同じ書式）:
+  title                             タイトル
+  extract[<フィールド>]:<selector>   一致した要素のフィールド（extractor.py を参照）。行は出力先と同名の
+                                    ディレクトリの JSONL に書き出し、結果の行には件数とパスだけを含める
+  ss[full]                          スクリーンショット（出力先ディレクトリに保存）
+  wait:<ms>                         待機
+
+使い方:
+  uv run python examples/09_crawler.py https://example.com https://example.org
+  uv run python examples/09_crawler.py --urls urls.txt -k 8 --per-domain 2 --delay 500 \\
+      -c title -c "extract[text,href,limit=50]:a" --out logs/crawl.jsonl
+  uv run python examples/09_crawler.py --urls urls.txt -p teddy --headless   # プロファイルのセッションで巡回
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import json
+import time
+from collections import Counter, deque
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from command_plan import parse_command
+from extractor import extract_to_jsonl_async, parse_extract_options
+
+# 05_chrome_launcher.py のコマンド解析・プロファイル管理を共有する
+launcher = importlib.import_module("05_chrome_launcher")
+
+DEFAULT_TABS = 4
+DEFAULT_PER_DOMAIN = 2
+DEFAULT_DELAY_MS = 1000
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF_MS = 1000
+DEFAULT_TIMEOUT_MS = 30000
+
+# リトライ対象の HTTP ステータス
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RetryableStatus(Exception):
+    pass
+
+
+def load_urls(path: Path) -> list[str]:
+    """1行1URL のファイルを読み込む（空行と # で始まる行は無視）。"""
+    urls = []
+    for line in path.read_text().splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            urls.append(line)
+    return urls
+
+
+class DomainScheduler:
+    """ドメインごとの同時実行数と開始間隔を守って、次に巡回する URL を払い出す。"""
+
+    def __init__(self, urls: list[str], per_domain: int, delay_ms: int) -> None:
+        self.pending: dict[str, deque[str]] = {}
+        for url in dict.fromkeys(urls):  # 重複を除いて順序を保つ
+            self.pending.setdefault(urlsplit(url).netloc, deque()).append(url)
+        self.total = sum(len(q) for q in self.pending.values())
+        self.per_domain = max(1, per_domain)
+        self.delay = delay_ms / 1000
+        self.active: Counter[str] = Counter()
+        self.next_start: dict[str, float] = {}
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> str | None:
+        """巡回してよい URL を返す。残りが無ければ None。"""
+        loop = asyncio.get_running_loop()
+        async with self._cond:
+            while True:
+                if not any(self.pending.values()):
+                    return None
+                now = loop.time()
+                wait = None
+                for domain, queue in self.pending.items():
+                    if not queue or self.active[domain] >= self.per_domain:
+                        continue
+                    start = self.next_start.get(domain, 0.0)
+                    if start <= now:
+                        self.active[domain] += 1
+                        self.next_start[domain] = now + self.delay
+                        return queue.popleft()
+                    wait = start - now if wait is None else min(wait, start - now)
+                # 空きが出る（release）か、開始間隔が明けるまで待つ
+                try:
+                    await asyncio.wait_for(self._cond.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, url: str) -> None:
+        async with self._cond:
+            self.active[urlsplit(url).netloc] -= 1
+            self._cond.notify_all()
+
+    async def wait_politely(self, url: str, delay_s: float) -> None:
+        """リトライ前のバックオフ。同じドメインの次の開始時刻も後ろにずらす。"""
+        domain = urlsplit(url).netloc
+        loop = asyncio.get_running_loop()
+        async with self._cond:
+            self.next_start[domain] = max(self.next_start.get(domain, 0.0), loop.time() + delay_s + self.delay)
+        await asyncio.sleep(delay_s)
+
+
+async def run_page_commands(page, commands: list[str], out_base: Path) -> dict:
+    """ページごとのコマンドを実行し、コマンド → 結果 の dict を返す。
+
+    スクリーンショットは <out_base>.png、抽出した行は <out_base>_<コマンドの番号>.jsonl に書き出す
+    （結果にはパスと件数だけを含め、行はメモリに溜めない）。
+    """
+    data: dict = {}
+    for i, cmd in enumerate(commands, 1):
+        name, option, arg = parse_command(cmd)
+        try:
+            if name == "title":
+                data[cmd] = await page.title()
+            elif name == "extract":
+                # out= はページごとに上書きしてしまうため使わない
+                opts = parse_extract_options(option)
+                out_path = out_base.with_name(f"{out_base.name}_{i}.jsonl")
+                total, written = await extract_to_jsonl_async(
+                    page, arg.strip(), opts["fields"], out_path, limit=opts["limit"], page_size=opts["page_size"]
+                )
+                data[cmd] = {"count": total, "written": written, "path": str(out_path)}
+            elif name in ("ss", "screenshot"):
+                ss_path = out_base.with_name(f"{out_base.name}.png")
+                image = await page.screenshot(full_page=option == "full")
+                await asyncio.to_thread(_write_atomic, ss_path, image)
+                data[cmd] = str(ss_path)
+            elif name == "wait":
+                await page.wait_for_timeout(int(arg.strip()))
+            else:
+                data[cmd] = {"error": f"不明なコマンド: {cmd}"}
+        except Exception as e:
+            data[cmd] = {"error": str(e)}
+    return data
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+
+
+async def crawl_one(page, url: str, index: int, commands: list[str], scheduler: DomainScheduler, args) -> dict:
+    """URL を1つ巡回する。失敗したらバックオフしてリトライする。"""
+    result: dict = {"url": url, "ok": False, "attempts": 0, "status": None, "error": None}
+    start = time.perf_counter()
+    for attempt in range(args.retries + 1):
+        result["attempts"] = attempt + 1
+        try:
+            load_start = time.perf_counter()
+            response = await page.goto(url, wait_until=args.wait_until, timeout=args.timeout)
+            result["load_ms"] = round((time.perf_counter() - load_start) * 1000, 1)
+            result["status"] = response.status if response is not None else None
+            if result["status"] in RETRY_STATUSES:
+                raise RetryableStatus(f"HTTP {result['status']}")
+            result["final_url"] = page.url
+            if result["status"] is not None and result["status"] >= 400:
+                # 404 などはリトライしても変わらないので、そのまま失敗として記録する
+                result["error"] = f"HTTP {result['status']}"
+                break
+            out_base = args.out_dir / f"{index:05d}_{urlsplit(url).netloc}"
+            result["data"] = await run_page_commands(page, commands, out_base)
+            result["ok"] = True
+            result["error"] = None
+            break
+        except Exception as e:
+            result["error"] = str(e).splitlines()[0] if str(e) else type(e).__name__
+            if attempt < args.retries:
+                await scheduler.wait_politely(url, args.backoff * 2 ** attempt / 1000)
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+async def crawl(urls: list[str], commands: list[str], args) -> Counter:
+    """URL 一覧を巡回し、結果を args.out に書き出す。集計（done / failed / retried）を返す。
+
+    結果の行は書き出したら保持せず、集計用の件数だけを数える。
+    """
+    from playwright.async_api import async_playwright
+
+    scheduler = DomainScheduler(urls, args.per_domain, args.delay)
+    totals: Counter = Counter()
+    per_domain: dict[str, Counter] = {}
+    counter = iter(range(1, scheduler.total + 1))
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+
+    async with async_playwright() as pw:
+        browser = await pw.chromium.launch(headless=args.headless)
+        storage_state = launcher.PROFILE_STORE.load(args.p) if args.p else None
+        context = await browser.new_context(storage_state=storage_state)
+
+        with args.out.open("w", encoding="utf-8") as out:
+
+            async def worker() -> None:
+                page = await context.new_page()
+                while (url := await scheduler.acquire()) is not None:
+                    try:
+                        if page.is_closed():
+                            page = await context.new_page()
+                        result = await crawl_one(page, url, next(counter), commands, scheduler, args)
+                    finally:
+                        await scheduler.release(url)
+                    totals["done"] += 1
+                    totals["failed"] += not result["ok"]
+                    totals["retried"] += result["attempts"] > 1
+                    per_domain.setdefault(urlsplit(url).netloc, Counter())["ok" if result["ok"] else "failed"] += 1
+                    out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    out.flush()
+                    elapsed = time.perf_counter() - start
+                    rate = totals["done"] / elapsed * 60 if elapsed > 0 else 0.0
+                    status = f"OK {result['status']}" if result["ok"] else f"NG ({result['error']})"
+                    print(f"[{totals['done']}/{scheduler.total}] {status} {result['seconds']:.1f}s ({rate:.0f} pages/min) {url}")
+                await page.close()
+
+            tabs = max(1, min(args.tabs, scheduler.total))
+            print(f"=== 巡回開始: {scheduler.total} URL / {len(scheduler.pending)} ドメイン / タブ {tabs} ===")
+            await asyncio.gather(*(worker() for _ in range(tabs)))
+
+        await context.close()
+        await browser.close()
+
+    elapsed = time.perf_counter() - start
+    rate = totals["done"] / elapsed * 60 if elapsed > 0 else 0.0
+    print(
+        f"=== 巡回完了: {totals['done']} 件（失敗 {totals['failed']} 件 / リトライ {totals['retried']} 件）"
+        f"{elapsed:.1f}s, {rate:.0f} pages/min ==="
+    )
+    for domain, counts in sorted(per_domain.items()):
+        print(f"  {domain}: OK {counts['ok']} / 失敗 {counts['failed']}")
+    print(f"結果: {args.out}")
+    return totals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="タブプールで URL 一覧を並行に巡回するクローラ")
+    parser.add_argument("urls", nargs="*", help="巡回する URL")
+    parser.add_argument("--urls", dest="url_file", type=Path, help="URL 一覧ファイル（1行1URL）")
+    parser.add_argument("-c", "--command", action="append", help="ページごとのコマンド（複数指定可、既定: title）")
+    parser.add_argument("-k", "--tabs", type=int, default=DEFAULT_TABS, help=f"同時に開くタブ数（既定: {DEFAULT_TABS}）")
+    parser.add_argument("--per-domain", type=int, default=DEFAULT_PER_DOMAIN, help=f"ドメインごとの同時実行数（既定: {DEFAULT_PER_DOMAIN}）")
+    parser.add_argument("--delay", type=int, default=DEFAULT_DELAY_MS, help=f"同じドメインへのリクエストの開始間隔（ms、既定: {DEFAULT_DELAY_MS}）")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help=f"失敗時のリトライ回数（既定: {DEFAULT_RETRIES}）")
+    parser.add_argument("--backoff", type=int, default=DEFAULT_BACKOFF_MS, help=f"最初のリトライまでの待ち時間（ms、以降は倍々。既定: {DEFAULT_BACKOFF_MS}）")
+    parser.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT_MS, help=f"遷移のタイムアウト（ms、既定: {DEFAULT_TIMEOUT_MS}）")
+    parser.add_argument("--wait-until", choices=("commit", "domcontentloaded", "load", "networkidle"), default="domcontentloaded", help="遷移完了とみなすタイミング")
+    parser.add_argument("-p", type=str, help="セッションを使うプロファイル名")
+    parser.add_argument("--out", type=Path, help="結果の出力先（既定: logs/crawl_<日時>.jsonl）")
+    parser.add_argument("--headless", action="store_true", help="ヘッドレスモードで実行")
+    args = parser.parse_args()
+
+    urls = list(args.urls)
+    if args.url_file:
+        urls.extend(load_urls(args.url_file))
+    if not urls:
+        parser.error("URL を指定してください（引数または --urls）")
+    for cmd in args.command or []:
+        if parse_command(cmd)[0] == "extract":
+            try:
+                parse_extract_options(parse_command(cmd)[1])
+            except ValueError as e:
+                parser.error(f"{cmd}: {e}")
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    args.out = args.out or launcher.LOGS_DIR / f"crawl_{timestamp}.jsonl"
+    args.out_dir = args.out.with_suffix("")  # スクリーンショット・抽出結果の保存先
+    asyncio.run(crawl(urls, args.command or ["title"], args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""10_pdf_batch.py — マニフェストの URL / HTML ファイルをまとめて PDF にする
+
+03_advanced.py の demo_pdf_export は1ファイルごとにブラウザを起動・終了するが、
+ここでは headless のブラウザを1つだけ起動し、K 個のページ（タブ）を使い回して並行に描画する。
+
+  - マニフェストの1行が1ジョブ。ジョブごとに用紙サイズ・余白・向き・ヘッダー / フッターなどを指定できる
+  - PDF は一時ファイルに書いてから置き換える（途中で止めても壊れた PDF は残らない）
+  - 出力先が同じになるジョブがあれば、描画を始める前にエラーにする（互いの PDF を上書きしないように）
+  - ジョブごとの読み込み・描画・書き込み時間を JSONL に記録し、最後に docs/min を表示する
+
+マニフェスト:
+  .jsonl の場合は1行1ジョブの JSON（url か file のどちらかが必須）
+    {"url": "https://example.com", "out": "example.pdf", "format": "Letter", "landscape": true}
+    {"file": "reports/daily.html", "margin": "15mm", "footer": "<div style='font-size:8px'>...</div>"}
+  それ以外は1行1つの URL またはファイルパス（空行と # で始まる行は無視）
+  file と相対パスはマニフェストのディレクトリを基準にする
+
+ジョブのオプション（省略時はコマンドライン引数の値）:
+  out          出力ファイル名（--out-dir からの相対パス。既定は 連番_名前.pdf）
+  format       用紙サイズ（A4, Letter など）
+  landscape    横向き
+  margin       余白。"10mm" のように4辺共通、または {"top": "20mm", "bottom": "20mm", ...}
+  header / footer   ヘッダー / フッターの HTML（pageNumber, totalPages などのクラスが使える）
+  background   背景を印刷する
+  scale        拡大率（0.1〜2）
+  media        "print" または "screen"（CSS のメディアタイプ）
+  wait_until   遷移完了とみなすタイミング
+
+使い方:
+  uv run python examples/10_pdf_batch.py sample/pdf_manifest.jsonl
+  uv run python examples/10_pdf_batch.py urls.txt -k 8 --out-dir pdf/ --format Letter --margin 10mm
+  uv run python examples/10_pdf_batch.py reports.jsonl --skip-existing --report logs/pdf_report.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlsplit
+
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+LOGS_DIR = PROJECT_DIR / "logs"
+DEFAULT_OUT_DIR = PROJECT_DIR / "screenshots" / "pdf"
+
+DEFAULT_PAGES = 4
+DEFAULT_FORMAT = "A4"
+DEFAULT_TIMEOUT_MS = 30000
+
+_JOB_KEYS = {"url", "file", "out", "format", "landscape", "margin", "header", "footer", "background", "scale", "media", "wait_until"}
+_MARGIN_SIDES = ("top", "right", "bottom", "left")
+
+
+def load_manifest(path: Path) -> list[dict]:
+    """マニフェストを読み込み、ジョブの dict のリストを返す。"""
+    jobs = []
+    for lineno, line in enumerate(path.read_text().splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if path.suffix == ".jsonl":
+            job = json.loads(line)
+            unknown = set(job) - _JOB_KEYS
+            if unknown:
+                raise ValueError(f"{path}:{lineno}: 不明なキー: {', '.join(sorted(unknown))}")
+        elif re.match(r"^[a-z][a-z0-9+.-]*://", line):
+            job = {"url": line}
+        else:
+            job = {"file": line}
+        if ("url" in job) == ("file" in job):
+            raise ValueError(f"{path}:{lineno}: url か file のどちらか1つを指定してください")
+        if "file" in job:
+            file = Path(job.pop("file"))
+            file = file if file.is_absolute() else path.parent / file
+            if not file.exists():
+                raise ValueError(f"{path}:{lineno}: ファイルがありません: {file}")
+            job["url"] = file.resolve().as_uri()
+            job.setdefault("name", file.stem)
+        job["lineno"] = lineno
+        jobs.append(job)
+    return jobs
+
+
+def output_name(job: dict, index: int) -> str:
+    if job.get("out"):
+        return job["out"]
+    name = job.get("name") or (urlsplit(job["url"]).netloc + urlsplit(job["url"]).path)
+    name = re.sub(r"[^\w.-]+", "_", name).strip("_") or "page"
+    return f"{index:05d}_{name[:80]}.pdf"
+
+
+def find_duplicate_outputs(jobs: list[dict], out_dir: Path) -> list[str]:
+    """出力先が同じになるジョブを "出力先: ジョブ番号, ..." の形で返す。
+
+    同じ出力先のジョブが並行に描画されると、同じ一時ファイルに書き込んで互いの PDF を上書きするため、
+    描画を始める前に検出する。
+    """
+    owners: dict[Path, list[int]] = {}
+    for index, job in enumerate(jobs, 1):
+        owners.setdefault((out_dir / output_name(job, index)).resolve(), []).append(index)
+    return [
+        f"{path}: ジョブ {', '.join(map(str, indexes))}"
+        for path, indexes in owners.items()
+        if len(indexes) > 1
+    ]
+
+
+def parse_margin(value) -> dict | None:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return {side: value for side in _MARGIN_SIDES}
+    return {side: value[side] for side in _MARGIN_SIDES if side in value}
+
+
+def pdf_options(job: dict, args) -> dict:
+    """ジョブとコマンドライン引数から page.pdf() の引数を組み立てる。"""
+    options = {
+        "format": job.get("format", args.format),
+        "landscape": job.get("landscape", args.landscape),
+        "print_background": job.get("background", args.background),
+    }
+    margin = parse_margin(job.get("margin", args.margin))
+    if margin:
+        options["margin"] = margin
+    if "scale" in job:
+        options["scale"] = float(job["scale"])
+    header, footer = job.get("header", args.header), job.get("footer", args.footer)
+    if header is not None or footer is not None:
+        # 片方だけ指定した場合、もう片方は Chromium の既定（日付・URL）ではなく空にする
+        options["display_header_footer"] = True
+        options["header_template"] = header or "<span></span>"
+        options["footer_template"] = footer or "<span></span>"
+    return options
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+
+
+async def render_one(page, job: dict, out_path: Path, args) -> dict:
+    """ジョブを1つ描画して PDF を書き出す。"""
+    result: dict = {"url": job["url"], "out": str(out_path), "ok": False, "error": None}
+    start = time.perf_counter()
+    try:
+        await page.emulate_media(media=job.get("media", args.media))
+        response = await page.goto(job["url"], wait_until=job.get("wait_until", args.wait_until), timeout=args.timeout)
+        if response is not None and response.status >= 400:
+            raise RuntimeError(f"HTTP {response.status}")
+        loaded = time.perf_counter()
+        data = await page.pdf(**pdf_options(job, args))
+        rendered = time.perf_counter()
+        await asyncio.to_thread(_write_atomic, out_path, data)
+        written = time.perf_counter()
+        result.update(
+            ok=True,
+            bytes=len(data),
+            load_ms=round((loaded - start) * 1000, 1),
+            render_ms=round((rendered - loaded) * 1000, 1),
+            write_ms=round((written - rendered) * 1000, 1),
+        )
+    except Exception as e:
+        result["error"] = str(e).splitlines()[0] if str(e) else type(e).__name__
+    result["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+async def render_all(jobs: list[dict], args) -> list[dict]:
+    from playwright.async_api import async_playwright
+
+    queue: asyncio.Queue = asyncio.Queue()
+    skipped = 0
+    for index, job in enumerate(jobs, 1):
+        out_path = args.out_dir / output_name(job, index)
+        if args.skip_existing and out_path.exists():
+            skipped += 1
+            continue
+        queue.put_nowait((job, out_path))
+    total = queue.qsize()
+    if skipped:
+        print(f"既存の PDF をスキップ: {skipped} 件")
+    if not total:
+        return []
+
+    results: list[dict] = []
+    args.report.parent.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+
+    async with async_playwright() as pw:
+        # PDF 生成は Chromium の headless モードでのみサポート
+        browser = await pw.chromium.launch(headless=True)
+        context = await browser.new_context()
+
+        with args.report.open("w", encoding="utf-8") as report:
+
+            async def worker() -> None:
+                page = await context.new_page()
+                while not queue.empty():
+                    job, out_path = queue.get_nowait()
+                    if page.is_closed():
+                        page = await context.new_page()
+                    result = await render_one(page, job, out_path, args)
+                    results.append(result)
+                    report.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    report.flush()
+                    elapsed = time.perf_counter() - start
+                    rate = len(results) / elapsed * 60 if elapsed > 0 else 0.0
+                    status = f"OK {result['total_ms']:.0f}ms" if result["ok"] else f"NG ({result['error']})"
+                    print(f"[{len(results)}/{total}] {status} ({rate:.0f} docs/min) {out_path.name}")
+                await page.close()
+
+            pages = max(1, min(args.pages, total))
+            print(f"=== PDF 生成開始: {total} 件 / ページ {pages} ===")
+            await asyncio.gather(*(worker() for _ in range(pages)))
+
+        await context.close()
+        await browser.close()
+
+    elapsed = time.perf_counter() - start
+    ok = [r for r in results if r["ok"]]
+    rate = len(results) / elapsed * 60 if elapsed > 0 else 0.0
+    print(f"=== PDF 生成完了: {len(ok)}/{len(results)} 件 {elapsed:.1f}s, {rate:.0f} docs/min ===")
+    if ok:
+        for key in ("load_ms", "render_ms", "write_ms"):
+            values = sorted(r[key] for r in ok)
+            print(f"  {key:<10} median {values[len(values) // 2]:>8.1f}ms  max {values[-1]:>8.1f}ms")
+    print(f"レポート: {args.report}")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="マニフェストの URL / HTML ファイルをまとめて PDF にする")
+    parser.add_argument("manifest", type=Path, help="マニフェスト（.jsonl または1行1URL / ファイル）")
+    parser.add_argument("-k", "--pages", type=int, default=DEFAULT_PAGES, help=f"使い回すページ数（同時実行数、既定: {DEFAULT_PAGES}）")
+    parser.add_argument("--out-dir", type=Path, default=DEFAULT_OUT_DIR, help="PDF の出力先ディレクトリ（既定: screenshots/pdf）")
+    parser.add_argument("--report", type=Path, help="ジョブごとの結果の出力先（既定: logs/pdf_<日時>.jsonl）")
+    parser.add_argument("--skip-existing", action="store_true", help="出力先に PDF があるジョブをスキップ")
+    parser.add_argument("--format", default=DEFAULT_FORMAT, help=f"用紙サイズ（既定: {DEFAULT_FORMAT}）")
+    parser.add_argument("--landscape", action="store_true", help="横向き")
+    parser.add_argument("--margin", help="余白（4辺共通、例: 10mm）")
+    parser.add_argument("--header", help="ヘッダーの HTML")
+    parser.add_argument("--footer", help="フッターの HTML")
+    parser.add_argument("--background", action="store_true", help="背景を印刷する")
+    parser.add_argument("--media", choices=("print", "screen"), default="print", help="CSS のメディアタイプ（既定: print）")
+    parser.add_argument("--wait-until", choices=("commit", "domcontentloaded", "load", "networkidle"), default="load", help="遷移完了とみなすタイミング")
+    parser.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT_MS, help=f"遷移のタイムアウト（ms、既定: {DEFAULT_TIMEOUT_MS}）")
+    args = parser.parse_args()
+
+    try:
+        jobs = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if not jobs:
+        parser.error(f"ジョブがありません: {args.manifest}")
+    duplicates = find_duplicate_outputs(jobs, args.out_dir)
+    if duplicates:
+        print("\n".join(duplicates))
+        parser.exit(1, f"出力先が重複しているジョブがあります（{len(duplicates)} 件）。out を変えてください\n")
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    args.report = args.report or LOGS_DIR / f"pdf_{timestamp}.jsonl"
+    results = asyncio.run(render_all(jobs, args))
+    if any(not r["ok"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
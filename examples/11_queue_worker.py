@@ -0,0 +1,182 @@
+"""11_queue_worker.py — ジョブキューからコマンドファイルを取り出して実行するワーカー
+
+job_queue.py のキュー（logs/queue.db）から (profile, コマンドファイル, params) のジョブを
+取り出し、05_chrome_launcher.py の run_job で実行する。
+
+  - -n 個のワーカープロセスを起動する。各プロセスはブラウザを1回だけ起動し、ジョブの間も使い回す
+  - 実行中はハートビートのスレッドがリースを延長する。プロセスが落ちたジョブはリースが切れた後に
+    別のワーカーが取り直し、チェックポイント（05 の --resume と同じ）があれば続きから実行する
+  - 結果と所要時間はキューの行に記録する（job_queue.py status / list で確認できる）
+  - キュー（SQLite の WAL）は同じマシンのプロセスでだけ共有できる。別のマシンやネットワーク上の
+    ファイルシステムで DB を共有すると、ロックとリースの取り合いが正しく動かない
+
+使い方:
+  uv run python examples/job_queue.py add jobs.jsonl
+  uv run python examples/11_queue_worker.py -n 4 --headless                  # キューが空になっても待ち続ける
+  uv run python examples/11_queue_worker.py -n 4 --headless --exit-when-empty
+  uv run python examples/11_queue_worker.py -n 2 --lease 120 --retries 1 --on-error stop
+
+Ctrl+C で実行中のジョブを終えてから停止する。
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from pathlib import Path
+
+from job_queue import DEFAULT_BACKOFF, DEFAULT_DB, DEFAULT_LEASE, JobQueue, format_status
+from page_actions import DEFAULT_INPUT_MODE, DEFAULT_WAIT, DEFAULT_WAIT_TIMEOUT, parse_input_mode, parse_wait_strategy
+from screenshot_pipeline import ScreenshotPipeline
+
+# 05_chrome_launcher.py のジョブ実行・オプションを共有する
+launcher = importlib.import_module("05_chrome_launcher")
+
+DEFAULT_WORKERS = 2
+DEFAULT_POLL = 2.0
+# 再実行したジョブを続きから実行できるよう、ワーカーは既定でコマンドごとにチェックポイントを保存する
+DEFAULT_CHECKPOINT_EVERY = 1
+
+
+def heartbeat_loop(queue: JobQueue, job_id: int, worker: str, lease: float, done: threading.Event, lost: threading.Event) -> None:
+    """ジョブが終わるまで lease / 3 秒ごとにリースを延長する。"""
+    while not done.wait(lease / 3):
+        if not queue.heartbeat(job_id, worker, lease):
+            lost.set()
+            return
+
+
+def run_claimed_job(browser, queue: JobQueue, job: dict, worker: str, args, options: dict) -> str | None:
+    """取り出したジョブを実行して結果を記録する。新しい status を返す。"""
+    done, lost = threading.Event(), threading.Event()
+    heartbeat = threading.Thread(
+        target=heartbeat_loop, args=(queue, job["id"], worker, args.lease, done, lost), daemon=True
+    )
+    heartbeat.start()
+    # 2回目以降の試行は、前回のチェックポイントがあれば続きから実行する
+    job_options = {**options, **job["params"], "resume": job["attempts"] > 1}
+    try:
+        result = launcher.run_job(browser, {"profile": job["profile"], "file": job["file"], "url": job["url"]}, job_options)
+    finally:
+        done.set()
+        heartbeat.join()
+    result.update(worker=worker, attempt=job["attempts"])
+    if lost.is_set():
+        print(f"[{worker}] #{job['id']} リースを失ったため結果を記録しません")
+        return None
+    return queue.complete(job["id"], worker, result)
+
+
+def worker_main(index: int, args, options: dict, stop) -> None:
+    """ワーカープロセス。stop がセットされるか、キューが空になる（--exit-when-empty）まで処理する。"""
+    # Ctrl+C は親プロセスが受けて stop で伝える（実行中のジョブは最後まで実行する）
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from playwright.sync_api import sync_playwright
+
+    queue = JobQueue(args.db, backoff=args.backoff)
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    options = {**options, "screenshots": ScreenshotPipeline(launcher.LOGS_DIR)}
+    launch_args = launcher.LOW_MEMORY_ARGS if options.get("low_memory") else None
+    processed = 0
+
+    with sync_playwright() as pw:
+        browser = pw.chromium.launch(headless=args.headless, args=launch_args)
+        print(f"[{worker}] 起動しました（ワーカー {index + 1}）")
+        while not stop.is_set():
+            job = queue.claim(worker, args.lease)
+            if job is None:
+                if args.exit_when_empty and queue.pending() == 0:
+                    break
+                stop.wait(args.poll)
+                continue
+
+            print(f"[{worker}] #{job['id']} {job['profile']} {Path(job['file']).name}（{job['attempts']}/{job['max_attempts']}回目）")
+            start = time.perf_counter()
+            status = run_claimed_job(browser, queue, job, worker, args, options)
+            print(f"[{worker}] #{job['id']} → {status} {time.perf_counter() - start:.1f}s")
+            processed += 1
+            if args.max_jobs and processed >= args.max_jobs:
+                break
+            # ブラウザが落ちていれば起動し直す（以降のジョブを巻き込まない）
+            if not browser.is_connected():
+                print(f"[{worker}] ブラウザを再起動します")
+                browser = pw.chromium.launch(headless=args.headless, args=launch_args)
+        browser.close()
+
+    options["screenshots"].close()
+    print(f"[{worker}] 停止しました（{processed} ジョブ）")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ジョブキューからコマンドファイルを取り出して実行するワーカー")
+    parser.add_argument("-n", "--workers", type=int, default=DEFAULT_WORKERS, help=f"ワーカープロセス数（既定: {DEFAULT_WORKERS}）")
+    parser.add_argument("--db", type=Path, default=DEFAULT_DB, help="キューの DB ファイル")
+    parser.add_argument("--headless", action="store_true", help="ヘッドレスモードで実行")
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE, help=f"リースの長さ（秒、既定: {DEFAULT_LEASE:.0f}）")
+    parser.add_argument("--backoff", type=float, default=DEFAULT_BACKOFF, help=f"失敗したジョブを再実行するまでの待ち時間（秒、以降は倍々。既定: {DEFAULT_BACKOFF:.0f}）")
+    parser.add_argument("--poll", type=float, default=DEFAULT_POLL, help=f"キューが空のときの確認間隔（秒、既定: {DEFAULT_POLL:.0f}）")
+    parser.add_argument("--exit-when-empty", action="store_true", help="キューが空になったら終了する")
+    parser.add_argument("--max-jobs", type=int, default=0, help="ワーカーごとに処理するジョブ数の上限（0 で無制限）")
+    parser.add_argument("--wait", type=str, default=DEFAULT_WAIT, help="url:/click: 後の待機戦略（既定: fixed）")
+    parser.add_argument("--wait-timeout", type=int, default=DEFAULT_WAIT_TIMEOUT, help="待機戦略のタイムアウト（ms）")
+    parser.add_argument("--input-mode", type=str, default=DEFAULT_INPUT_MODE, help="input: の入力方式（既定: human）")
+    parser.add_argument("--on-error", choices=("continue", "stop"), default=launcher.DEFAULT_ON_ERROR, help="コマンドでエラーが起きたときの動作（既定: continue）")
+    parser.add_argument("--retries", type=int, default=0, help="失敗したコマンドのリトライ回数")
+    parser.add_argument("--checkpoint-every", type=int, default=DEFAULT_CHECKPOINT_EVERY, help=f"チェックポイントを保存する間隔（コマンド数、0 で無効。既定: {DEFAULT_CHECKPOINT_EVERY}）")
+    parser.add_argument("--mem-limit", type=float, default=0, help="JS ヒープ使用量がこれ（MB）を超えたらコンテキストを作り直す")
+    parser.add_argument("--recycle-every", type=int, default=0, help="コンテキストを作り直す間隔（コマンド数、0 で無効）")
+    parser.add_argument("--low-memory", action="store_true", help="Chromium をメモリ節約用のオプションで起動する")
+    args = parser.parse_args()
+
+    try:
+        parse_wait_strategy(args.wait)
+        parse_input_mode(args.input_mode)
+    except ValueError as e:
+        parser.error(str(e))
+    options = {
+        "wait": args.wait,
+        "wait_timeout": args.wait_timeout,
+        "input_mode": args.input_mode,
+        "on_error": args.on_error,
+        "retries": args.retries,
+        "retry_backoff": launcher.DEFAULT_RETRY_BACKOFF_MS,
+        "checkpoint_every": args.checkpoint_every,
+        "memory_limit": args.mem_limit,
+        "recycle_every": args.recycle_every,
+        "low_memory": args.low_memory,
+    }
+
+    queue = JobQueue(args.db)
+    for line in format_status(queue):
+        print(f"キュー: {line}")
+
+    # Playwright はスレッドを使うため、fork ではなく spawn でプロセスを起動する
+    ctx = multiprocessing.get_context("spawn")
+    stop = ctx.Event()
+    processes = [
+        ctx.Process(target=worker_main, args=(i, args, options, stop), name=f"queue-worker-{i + 1}")
+        for i in range(max(1, args.workers))
+    ]
+    for p in processes:
+        p.start()
+    try:
+        for p in processes:
+            p.join()
+    except KeyboardInterrupt:
+        print("\n停止します（実行中のジョブが終わるまで待ちます）")
+        stop.set()
+        for p in processes:
+            p.join()
+
+    for line in format_status(queue):
+        print(f"キュー: {line}")
+
+
+if __name__ == "__main__":
+    main()
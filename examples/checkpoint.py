@@ -0,0 +1,68 @@
+"""checkpoint.py — コマンドファイル実行のチェックポイント
+
+05_chrome_launcher.py の run_file で、成功したステップの位置・URL・選択中のセレクタ・
+storage_state を logs/checkpoints/ に保存する。--resume で最後に成功したステップの
+次から再開する。
+
+  - チェックポイントはプロファイル × コマンドファイルごとに1つ（一時ファイル経由で置き換える）
+  - 実行済みのコマンド列の SHA-1 を保存し、再開時にファイル先頭の同じ数のコマンドと比較する
+    （失敗した行以降を直して再開するのは可。実行済みの部分が変わっていれば再開しない）
+  - 最後まで実行できたらチェックポイントは削除する
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+from pathlib import Path
+
+
+def commands_hash(commands: list[str]) -> str:
+    return hashlib.sha1("\0".join(commands).encode()).hexdigest()
+
+
+class RunCheckpoint:
+    """プロファイル × コマンドファイルのチェックポイント。"""
+
+    def __init__(self, directory: Path, profile: str, command_file: Path) -> None:
+        self.command_file = command_file.resolve()
+        key = hashlib.sha1(str(self.command_file).encode()).hexdigest()[:12]
+        self.path = directory / f"{profile}_{command_file.stem}_{key}.json"
+        self.profile = profile
+        self.saved_index = 0
+
+    def save(self, commands: list[str], index: int, lineno: int, page, context, state: dict) -> None:
+        """commands の index 番目（1始まり）まで成功した状態を保存する。"""
+        data = {
+            "profile": self.profile,
+            "file": str(self.command_file),
+            "done_hash": commands_hash(commands[:index]),
+            "index": index,
+            "lineno": lineno,
+            "url": page.url,
+            "selected_selector": state.get("selected_selector"),
+            "storage_state": context.storage_state(),
+            "ts": time.time(),
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False))
+        tmp.replace(self.path)
+        self.saved_index = index
+
+    def load(self, commands: list[str]) -> dict | None:
+        """保存済みのチェックポイントを返す。
+
+        無い場合や、実行済みの範囲のコマンドが commands（現在のファイル内容）と違う場合は None。
+        """
+        if not self.path.exists():
+            return None
+        data = json.loads(self.path.read_text())
+        if data.get("done_hash") != commands_hash(commands[: data["index"]]):
+            print(f"  実行済みの範囲のコマンドが変更されているため再開できません: {self.command_file}")
+            return None
+        return data
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,183 @@
+"""command_plan.py — コマンドファイルのコンパイル（解析・検証・キャッシュ）
+
+05_chrome_launcher.py のコマンドファイルを、ヒアドキュメントを解決した Step の列（プラン）に変換する。
+各 Step はコマンド名・オプション・引数に分解済みで、コマンドの表（05 の command_table()）の検証関数で
+引数を検査した結果（error）を持つ。
+
+  - ファイルはブラウザを起動する前に全体をコンパイルし、エラーがあれば実行しない（--check で確認のみ）
+  - コンパイル結果は内容の SHA-1 をキーに logs/plans/ にキャッシュし、同じ内容なら解析・検証を省く
+  - 標準入力（-f -）は1行ずつ読みながらコンパイルし、読み終わるのを待たずに実行を始める
+    （空の input: は続きのコマンドを入力として読んでしまうため、エラーにする）
+  - {{変数}} を含むコマンド（--data のテンプレート）は名前だけを検査し、引数は値を埋めてから検査する
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+
+# キャッシュの形式・検証内容を変えたら上げる
+PLAN_VERSION = 4
+
+# name[option]:arg 形式のコマンド（option と :arg は省略可）
+_COMMAND_RE = re.compile(r"^(\w+)(?:\[(.*?)\])?(?::(.*))?$", re.DOTALL)
+_HEREDOC_RE = re.compile(r"^(input(?:\[[^\]]*\])?:)<<(.+)$")
+_TEMPLATE_RE = re.compile(r"\{\{\s*[\w.-]+\s*\}\}")
+
+# 空の input: は標準入力から複数行を読む。標準入力からコマンドを読む場合（-f -、08 のデーモン）や
+# --data の行では、続きのコマンドや RPC の行を読んでしまうため受け付けない
+EMPTY_INPUT_ERROR = "input: に入力するテキストがありません（複数行は input:<<END のヒアドキュメントで指定してください）"
+
+
+class CommandSpec(NamedTuple):
+    """コマンドの表の1項目。"""
+
+    handler: Callable | None
+    # (option, arg) を検査し、不正なら ValueError を送出する
+    check: Callable[[str | None, str], None] | None = None
+    # オプション・引数を取らないコマンド（title, save など）
+    bare: bool = False
+
+
+class Step(NamedTuple):
+    """コンパイル済みのコマンド1つ。"""
+
+    lineno: int
+    cmd: str
+    label: str
+    name: str
+    option: str | None
+    arg: str
+    error: str | None = None
+
+
+def parse_command(cmd: str) -> tuple[str, str | None, str]:
+    """コマンドを (名前, オプション, 引数) に分解する。
+
+    "click[networkidle]://button" → ("click", "networkidle", "//button")
+    "title"                        → ("title", None, "")
+    """
+    m = _COMMAND_RE.match(cmd)
+    if m is None:
+        return cmd, None, ""
+    return m.group(1), m.group(2), m.group(3) or ""
+
+
+def parse_command_lines(lines: Iterable[str]):
+    """コマンドファイルの行を解析し、(行番号, コマンド, 表示用ラベル) を順に返す。
+
+    lines は1行ずつ読めればよい（リストでも、ファイルや標準入力でもよい）。
+
+    input:<<DELIM で複数行入力（ヒアドキュメント）:
+        input:<<END
+        1行目
+        2行目
+        END
+    """
+    lines = iter(lines)
+    lineno = 0
+    for raw in lines:
+        lineno += 1
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        # input:<<DELIM（input[方式]:<<DELIM）のヒアドキュメント処理
+        heredoc = _HEREDOC_RE.match(line)
+        if heredoc:
+            head, delimiter = heredoc.group(1), heredoc.group(2).strip()
+            body_lines = []
+            for body in lines:
+                lineno += 1
+                if body.strip() == delimiter:
+                    break
+                body_lines.append(body.rstrip("\r\n"))
+            yield lineno, head + "\n".join(body_lines), f"{head}(heredoc {len(body_lines)}行)"
+        else:
+            yield lineno, line, line
+
+
+def check_command(name: str, option: str | None, arg: str, commands: dict[str, CommandSpec]) -> str | None:
+    """コマンドを表で検査し、エラーの内容を返す（問題なければ None）。"""
+    spec = commands.get(name)
+    if spec is None or (spec.bare and (option is not None or arg)):
+        return "不明なコマンド"
+    if spec.check is None:
+        return None
+    if _TEMPLATE_RE.search(arg) or (option and _TEMPLATE_RE.search(option)):
+        # テンプレートの引数は値を埋めるまで検査できない（05 の render_steps で行ごとに検査する）
+        return None
+    try:
+        spec.check(option, arg)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def check_noninteractive(name: str, arg: str) -> str | None:
+    """標準入力から読めない場面で実行できないコマンド（空の input:）ならエラーの内容を返す。"""
+    if name == "input" and not arg.strip():
+        return EMPTY_INPUT_ERROR
+    return None
+
+
+def compile_steps(lines: Iterable[str], commands: dict[str, CommandSpec], interactive: bool = True) -> Iterator[Step]:
+    """行を1つずつ Step にコンパイルする（読み終わりを待たずに返す）。
+
+    interactive が偽なら（lines が標準入力のとき）、空の input: もエラーにする。
+    """
+    for lineno, cmd, label in parse_command_lines(lines):
+        name, option, arg = parse_command(cmd)
+        error = check_command(name, option, arg, commands)
+        if error is None and not interactive:
+            error = check_noninteractive(name, arg)
+        yield Step(lineno, cmd, label, name, option, arg, error)
+
+
+class Plan(NamedTuple):
+    path: str
+    steps: list[Step]
+    digest: str
+    cached: bool
+
+    @property
+    def errors(self) -> list[Step]:
+        return [step for step in self.steps if step.error is not None]
+
+
+class PlanCache:
+    """コンパイル済みのプランを内容の SHA-1 ごとに JSON で保存する。"""
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+
+    def compile_file(self, path: Path, commands: dict[str, CommandSpec], save: bool = True) -> Plan:
+        """path をコンパイルする。キャッシュがあれば使い、save なら結果をキャッシュに書く（--check では書かない）。"""
+        data = path.read_bytes()
+        key = hashlib.sha1(data)
+        key.update(f"\0{PLAN_VERSION}\0{','.join(sorted(commands))}".encode())
+        digest = key.hexdigest()
+        cache_path = self.directory / f"{digest}.json"
+        if cache_path.exists():
+            try:
+                steps = [Step(*fields) for fields in json.loads(cache_path.read_text())]
+                return Plan(str(path), steps, digest, True)
+            except (ValueError, TypeError):
+                # 壊れたキャッシュはコンパイルし直す
+                pass
+        steps = list(compile_steps(data.decode().splitlines(), commands))
+        if not save:
+            return Plan(str(path), steps, digest, False)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = cache_path.with_name(cache_path.name + ".tmp")
+        tmp.write_text(json.dumps(steps, ensure_ascii=False))
+        tmp.replace(cache_path)
+        return Plan(str(path), steps, digest, False)
+
+
+def format_errors(plan: Plan) -> list[str]:
+    return [f"{plan.path}:{step.lineno}: {step.error}: {step.label}" for step in plan.errors]
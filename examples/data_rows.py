@@ -0,0 +1,144 @@
+"""data_rows.py — コマンドファイルのテンプレートとデータ行
+
+05_chrome_launcher.py の --data で使用する。コマンドファイル中の {{変数}} を、CSV / JSONL の
+1行ごとの値で置き換えて実行する。
+
+  - データは1行ずつ読む（ファイル全体をメモリに載せないため、行数が多くてもメモリ使用量は一定）
+  - CSV は1行目を列名とする。JSONL は1行1オブジェクト
+  - 行ごとの結果を JSONL に追記する。同じ結果ファイルで再実行すると、成功済みの行は飛ばす
+  - 行の識別には --data-key の列の値（省略時は行の内容の SHA-1）を使う
+
+テンプレートの例:
+  url:{{target}}
+  select:[data-testid="tweetTextarea_0"]
+  input:{{message}}
+"""
+
+from __future__ import annotations
+
+import csv
+import hashlib
+import json
+import re
+import time
+from pathlib import Path
+
+
+_VAR_RE = re.compile(r"\{\{\s*([\w.-]+)\s*\}\}")
+
+
+def template_vars(text: str) -> set[str]:
+    return set(_VAR_RE.findall(text))
+
+
+def render(text: str, row: dict) -> str:
+    """{{変数}} を行の値で置き換える。行に無い変数があれば ValueError。"""
+
+    def value(m: re.Match) -> str:
+        name = m.group(1)
+        if name not in row:
+            raise ValueError(f"データに {name} がありません")
+        v = row[name]
+        return "" if v is None else str(v)
+
+    return _VAR_RE.sub(value, text)
+
+
+def iter_rows(path: Path):
+    """データファイルの行を (行番号, dict, エラー) で1行ずつ返す。
+
+    壊れた行（JSON として読めない・列数がヘッダより多いなど）は dict を None、エラーに内容を入れて返し、
+    以降の行の読み込みは続ける。
+    """
+    if path.suffix == ".jsonl":
+        with path.open(encoding="utf-8") as f:
+            for lineno, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield lineno, None, f"JSON として読めません: {e}"
+                    continue
+                if isinstance(row, dict):
+                    yield lineno, row, None
+                else:
+                    yield lineno, None, "JSON オブジェクトではありません"
+    else:
+        # Excel で保存した CSV の BOM を除く
+        with path.open(encoding="utf-8-sig", newline="") as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                # 値に改行を含む行もあるため、ファイル上の（最後の）行番号を使う
+                if None in row:
+                    yield reader.line_num, None, f"列数がヘッダより多い（{len(reader.fieldnames) + len(row[None])}列）"
+                else:
+                    yield reader.line_num, row, None
+
+
+def row_key(row: dict, key_field: str | None = None) -> str:
+    """結果の記録と、成功済みの判定に使う行の識別子。"""
+    if key_field is not None:
+        if key_field not in row:
+            raise ValueError(f"データに {key_field} がありません")
+        return str(row[key_field])
+    try:
+        text = json.dumps(row, sort_keys=True, ensure_ascii=False, default=str)
+    except TypeError as e:
+        # 文字列以外のキー（None など）が混ざった行
+        raise ValueError(f"行を識別できません: {e}") from e
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+class DataResults:
+    """行ごとの結果を JSONL に追記する。既存の結果から成功済みの行を読み込む。"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.succeeded: set[str] = set()
+        if path.exists():
+            with path.open(encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 異常終了で途中まで書かれた行
+                        continue
+                    if record.get("ok"):
+                        self.succeeded.add(record["key"])
+        self.ok = 0
+        self.failed = 0
+        self.skipped = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = path.open("a", encoding="utf-8")
+
+    def record(self, row: int, key: str, error: str | None, lineno: int | None, seconds: float) -> None:
+        if error is None:
+            self.ok += 1
+            self.succeeded.add(key)
+        else:
+            self.failed += 1
+        self._file.write(
+            json.dumps(
+                {
+                    "ts": time.time(),
+                    "row": row,
+                    "key": key,
+                    "ok": error is None,
+                    "error": error,
+                    "lineno": lineno,
+                    "seconds": round(seconds, 3),
+                },
+                ensure_ascii=False,
+            )
+            + "\n"
+        )
+        self._file.flush()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+    def summary(self) -> str:
+        return f"成功 {self.ok} 行 / 失敗 {self.failed} 行 / 成功済みでスキップ {self.skipped} 行 → {self.path}"
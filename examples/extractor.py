@@ -0,0 +1,151 @@
+"""extractor.py — セレクタに一致する全要素のデータを JSONL に書き出す
+
+05_chrome_launcher.py の extract[<フィールド>]:<selector> と、07_async_engine.py / 09_crawler.py の
+extract コマンド（async_api 版の extract_to_jsonl_async）で使用する。
+
+  1. locator.evaluate_all で一致した要素の配列をページ側（window.__pwExtract）に保持する
+  2. page.evaluate で page_size 件ずつフィールドを取り出し、JSONL に1行ずつ書き込む
+  3. 最後にページ側の配列を削除する
+
+要素ごとに Locator を往復させないため、10 万件規模のページでも往復回数は 件数 / page_size で済み、
+Python 側のメモリも1ページ分しか使わない。
+
+フィールド（カンマ区切り、既定は text）:
+  text         textContent（前後の空白を除く）
+  inner_text   innerText（表示されている文字列）
+  html         outerHTML
+  tag          タグ名（小文字）
+  href / src / value   同名のプロパティ（href / src は絶対 URL）
+  @<name>      属性（例: @data-id）
+  css:<prop>   計算済みスタイル（例: css:color）
+  prop:<name>  DOM プロパティ（例: prop:checked）
+オプション:
+  out=<path>   出力先（既定は logs/extract_<日時>.jsonl）
+  limit=<n>    最大件数
+  page=<n>     1回の往復で取り出す件数（既定 1000）
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+
+
+DEFAULT_FIELDS = ("text",)
+PAGE_SIZE = 1000
+
+_SIMPLE_FIELDS = {"text", "inner_text", "html", "tag", "href", "src", "value"}
+
+# 一致した要素をページ側に保持し、件数だけを返す
+_STASH_JS = """
+(els, key) => {
+    (window.__pwExtract ||= {})[key] = els;
+    return els.length;
+}
+"""
+
+# 保持した要素の [offset, offset + size) からフィールドを取り出す
+_PAGE_JS = """
+([key, offset, size, fields]) => {
+    const els = window.__pwExtract[key].slice(offset, offset + size);
+    return els.map(el => {
+        const row = {};
+        let style = null;
+        for (const f of fields) {
+            let v;
+            if (f === "text") v = (el.textContent || "").trim();
+            else if (f === "inner_text") v = el.innerText;
+            else if (f === "html") v = el.outerHTML;
+            else if (f === "tag") v = el.tagName.toLowerCase();
+            else if (f.startsWith("@")) v = el.getAttribute(f.slice(1));
+            else if (f.startsWith("css:")) v = (style ||= getComputedStyle(el)).getPropertyValue(f.slice(4));
+            else if (f.startsWith("prop:")) v = el[f.slice(5)];
+            else v = el[f];
+            row[f] = v === undefined ? null : v;
+        }
+        return row;
+    });
+}
+"""
+
+_CLEANUP_JS = "key => { if (window.__pwExtract) delete window.__pwExtract[key]; }"
+
+
+def parse_extract_options(option: str | None) -> dict:
+    """extract[...] のオプションを解析する。
+
+    "text,href,@data-id,out=links.jsonl,limit=500"
+      → {"fields": ["text", "href", "@data-id"], "out": "links.jsonl", "limit": 500, "page_size": 1000}
+    """
+    result: dict = {"fields": [], "out": None, "limit": None, "page_size": PAGE_SIZE}
+    for item in (option or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if item.startswith("out="):
+            result["out"] = item[4:]
+        elif item.startswith("limit="):
+            result["limit"] = int(item[6:])
+        elif item.startswith("page="):
+            result["page_size"] = max(1, int(item[5:]))
+        elif item in _SIMPLE_FIELDS or item.startswith(("@", "css:", "prop:")):
+            result["fields"].append(item)
+        else:
+            raise ValueError(f"不明なフィールド: {item}")
+    result["fields"] = result["fields"] or list(DEFAULT_FIELDS)
+    return result
+
+
+def extract_to_jsonl(
+    page,
+    selector: str,
+    fields: list[str],
+    out_path: Path,
+    limit: int | None = None,
+    page_size: int = PAGE_SIZE,
+    key: str = "extract",
+) -> tuple[int, int]:
+    """selector に一致する要素のフィールドを out_path に書き出す。(一致件数, 書き込み件数) を返す。"""
+    total = page.locator(selector).evaluate_all(_STASH_JS, key)
+    count = total if limit is None else min(total, limit)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    try:
+        with out_path.open("w", encoding="utf-8") as f:
+            for offset in range(0, count, page_size):
+                rows = page.evaluate(_PAGE_JS, [key, offset, min(page_size, count - offset), fields])
+                f.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+                written += len(rows)
+    finally:
+        page.evaluate(_CLEANUP_JS, key)
+    return total, written
+
+
+async def extract_to_jsonl_async(
+    page,
+    selector: str,
+    fields: list[str],
+    out_path: Path,
+    limit: int | None = None,
+    page_size: int = PAGE_SIZE,
+    key: str = "extract",
+) -> tuple[int, int]:
+    """extract_to_jsonl の async_api 版。(一致件数, 書き込み件数) を返す。
+
+    取り出した page_size 件ごとにワーカースレッドで書き込むため、イベントループを止めず、
+    Python 側のメモリも1ページ分しか使わない。
+    """
+    total = await page.locator(selector).evaluate_all(_STASH_JS, key)
+    count = total if limit is None else min(total, limit)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    try:
+        with out_path.open("w", encoding="utf-8") as f:
+            for offset in range(0, count, page_size):
+                rows = await page.evaluate(_PAGE_JS, [key, offset, min(page_size, count - offset), fields])
+                await asyncio.to_thread(f.writelines, [json.dumps(row, ensure_ascii=False) + "\n" for row in rows])
+                written += len(rows)
+    finally:
+        await page.evaluate(_CLEANUP_JS, key)
+    return total, written
@@ -0,0 +1,353 @@
+"""job_queue.py — SQLite によるジョブキュー（リースとハートビート付き）
+
+11_queue_worker.py のワーカーが (profile, コマンドファイル, params) のジョブを取り出して実行する。
+キューは logs/queue.db（--db で変更可）の1ファイルで、同じマシンの複数プロセスから同時に使える。
+WAL モードは共有メモリを使うため、別のマシンやネットワーク上のファイルシステム（NFS など）からは使えない。
+
+  - claim はジョブを1件取り出し、lease 秒のリース（期限）を付けて running にする
+  - 実行中のワーカーは heartbeat でリースを延長する。ワーカーが落ちてリースが切れたジョブは
+    別のワーカーが取り直す（attempts を1増やす）
+  - 失敗したジョブは max_attempts 回まで、backoff 秒 × 2^(試行回数-1) 後に再実行する
+  - 結果（ok / error / 所要時間 / ワーカー）はジョブの行に記録する
+  - 書き込みは BEGIN IMMEDIATE のトランザクションで行うため、同じジョブを2つのワーカーが取ることはない
+
+使い方:
+  uv run python examples/job_queue.py add jobs.jsonl               # 05 の --batch と同じ形式
+  uv run python examples/job_queue.py add -p teddy -f sample/commands.txt --max-attempts 5
+  uv run python examples/job_queue.py status
+  uv run python examples/job_queue.py list --status failed
+  uv run python examples/job_queue.py requeue                       # 失敗したジョブを再投入
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+DEFAULT_DB = Path(__file__).resolve().parent.parent / "logs" / "queue.db"
+DEFAULT_LEASE = 60.0
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BACKOFF = 5.0
+
+STATUSES = ("queued", "running", "done", "failed")
+
+# params で上書きできる 05_chrome_launcher.py のオプション
+PARAM_KEYS = {
+    "wait",
+    "wait_timeout",
+    "input_mode",
+    "on_error",
+    "retries",
+    "retry_backoff",
+    "checkpoint_every",
+    "memory_limit",
+    "recycle_every",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    profile      TEXT NOT NULL,
+    file         TEXT NOT NULL,
+    url          TEXT,
+    params       TEXT NOT NULL DEFAULT '{}',
+    status       TEXT NOT NULL DEFAULT 'queued',
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner  TEXT,
+    lease_until  REAL,
+    created_at   REAL NOT NULL,
+    started_at   REAL,
+    finished_at  REAL,
+    result       TEXT,
+    error        TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, available_at);
+"""
+
+_JOB_COLUMNS = (
+    "id, profile, file, url, params, status, attempts, max_attempts, lease_owner, "
+    "created_at, started_at, finished_at, result, error"
+)
+
+
+def _row_job(row: tuple) -> dict:
+    job = dict(zip([c.strip() for c in _JOB_COLUMNS.split(",")], row))
+    job["params"] = json.loads(job["params"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def validate_job(job: dict) -> dict:
+    """ジョブ定義を検証し、キューに入れる形（file は絶対パス）に正規化する。"""
+    if "profile" not in job or "file" not in job:
+        raise ValueError("profile と file を指定してください")
+    params = job.get("params") or {}
+    unknown = set(params) - PARAM_KEYS
+    if unknown:
+        raise ValueError(f"params の不明なキー: {', '.join(sorted(unknown))}")
+    path = Path(job["file"]).resolve()
+    if not path.exists():
+        raise ValueError(f"ファイルが見つかりません: {job['file']}")
+    return {"profile": job["profile"], "file": str(path), "url": job.get("url"), "params": params}
+
+
+class JobQueue:
+    """SQLite のジョブキュー。"""
+
+    def __init__(self, db_path: Path = DEFAULT_DB, backoff: float = DEFAULT_BACKOFF) -> None:
+        self.db_path = db_path
+        self.backoff = backoff
+        # sqlite3 の接続はスレッドをまたいで使えないため、スレッドごとに開く
+        # （ハートビートは実行中のジョブとは別のスレッドから送る）
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, fn):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    # --- 投入 ---
+
+    def enqueue(self, jobs: list[dict], max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> list[int]:
+        """ジョブを投入し、ID を返す。"""
+        jobs = [validate_job(job) for job in jobs]
+        now = time.time()
+
+        def insert(conn: sqlite3.Connection) -> list[int]:
+            ids = []
+            for job in jobs:
+                cur = conn.execute(
+                    "INSERT INTO jobs (profile, file, url, params, max_attempts, available_at, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job["profile"], job["file"], job["url"], json.dumps(job["params"]), max_attempts, now, now),
+                )
+                ids.append(cur.lastrowid)
+            return ids
+
+        return self._transaction(insert)
+
+    def requeue(self, status: str = "failed") -> int:
+        """status のジョブを attempts を0に戻して再投入する。件数を返す。"""
+        return self._transaction(
+            lambda conn: conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = 0, available_at = ?, lease_owner = NULL,"
+                " lease_until = NULL, error = NULL WHERE status = ?",
+                (time.time(), status),
+            ).rowcount
+        )
+
+    # --- ワーカー ---
+
+    def claim(self, worker: str, lease: float = DEFAULT_LEASE) -> dict | None:
+        """実行できるジョブを1件取り出して running にする。無ければ None。
+
+        リースの切れた running のジョブ（ワーカーが落ちたもの）も取り直す。
+        試行回数を使い切っていれば failed にする。
+        """
+
+        def take(conn: sqlite3.Connection) -> dict | None:
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, lease_owner = NULL,"
+                " error = coalesce(error, 'リース切れ（ワーカーが応答しない）')"
+                " WHERE status = 'running' AND lease_until < ? AND attempts >= max_attempts",
+                (now, now),
+            )
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE (status = 'queued' AND available_at <= ?)"
+                " OR (status = 'running' AND lease_until < ?) ORDER BY id LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?,"
+                " lease_until = ?, started_at = ? WHERE id = ?",
+                (worker, now + lease, now, row[0]),
+            )
+            return _row_job(conn.execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (row[0],)).fetchone())
+
+        return self._transaction(take)
+
+    def heartbeat(self, job_id: int, worker: str, lease: float = DEFAULT_LEASE) -> bool:
+        """リースを延長する。リースを失っていれば（別のワーカーが取り直した）False。"""
+        return bool(
+            self._transaction(
+                lambda conn: conn.execute(
+                    "UPDATE jobs SET lease_until = ? WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                    (time.time() + lease, job_id, worker),
+                ).rowcount
+            )
+        )
+
+    def complete(self, job_id: int, worker: str, result: dict) -> str | None:
+        """結果を記録する。失敗で試行回数が残っていれば queued に戻す。
+
+        新しい status を返す。リースを失っていた場合は何もせず None。
+        """
+
+        def finish(conn: sqlite3.Connection) -> str | None:
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                (job_id, worker),
+            ).fetchone()
+            if row is None:
+                return None
+            attempts, max_attempts = row
+            now = time.time()
+            if result.get("ok"):
+                status, available_at = "done", now
+            elif attempts < max_attempts:
+                status, available_at = "queued", now + self.backoff * 2 ** (attempts - 1)
+            else:
+                status, available_at = "failed", now
+            conn.execute(
+                "UPDATE jobs SET status = ?, available_at = ?, lease_owner = NULL, lease_until = NULL,"
+                " finished_at = ?, result = ?, error = ? WHERE id = ?",
+                (status, available_at, now, json.dumps(result, ensure_ascii=False), result.get("error"), job_id),
+            )
+            return status
+
+        return self._transaction(finish)
+
+    # --- 参照 ---
+
+    def counts(self) -> dict[str, int]:
+        counts = dict.fromkeys(STATUSES, 0)
+        if self.db_path.exists():
+            counts.update(self._conn().execute("SELECT status, count(*) FROM jobs GROUP BY status"))
+        return counts
+
+    def pending(self) -> int:
+        """queued と running の件数（ワーカーがまだ処理するジョブ）。"""
+        counts = self.counts()
+        return counts["queued"] + counts["running"]
+
+    def jobs(self, status: str | None = None, limit: int = 100) -> list[dict]:
+        if not self.db_path.exists():
+            return []
+        if status is None:
+            rows = self._conn().execute(f"SELECT {_JOB_COLUMNS} FROM jobs ORDER BY id DESC LIMIT ?", (limit,))
+        else:
+            rows = self._conn().execute(
+                f"SELECT {_JOB_COLUMNS} FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?", (status, limit)
+            )
+        return [_row_job(row) for row in rows]
+
+    def timings(self) -> dict:
+        """完了したジョブの件数・平均所要時間・スループット（jobs/min）を返す。"""
+        if not self.db_path.exists():
+            return {"done": 0}
+        row = self._conn().execute(
+            "SELECT count(*), avg(finished_at - started_at), min(started_at), max(finished_at)"
+            " FROM jobs WHERE status = 'done'"
+        ).fetchone()
+        done, avg_s, first, last = row
+        if not done:
+            return {"done": 0}
+        span = last - first
+        return {
+            "done": done,
+            "avg_seconds": round(avg_s, 3),
+            "jobs_per_min": round(done / span * 60, 1) if span > 0 else None,
+        }
+
+
+def format_status(queue: JobQueue) -> list[str]:
+    """状態ごとの件数と、完了したジョブの平均所要時間・スループットを表示用の行にする。"""
+    counts = queue.counts()
+    lines = ["  ".join(f"{status} {counts[status]}" for status in STATUSES)]
+    timings = queue.timings()
+    if timings["done"]:
+        rate = f", {timings['jobs_per_min']} jobs/min" if timings["jobs_per_min"] else ""
+        lines.append(f"完了 {timings['done']} 件: 平均 {timings['avg_seconds']}s{rate}")
+    return lines
+
+
+def _load_jobs_file(path: Path) -> list[dict]:
+    """1行1ジョブの JSONL を読み込む（05 の --batch と同じ形式 + params）。"""
+    jobs = []
+    for lineno, line in enumerate(path.read_text().splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            jobs.append(validate_job(json.loads(line)))
+        except ValueError as e:
+            raise ValueError(f"{path}:{lineno}: {e}") from None
+    return jobs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ジョブキュー（logs/queue.db）の管理")
+    parser.add_argument("--db", type=Path, default=DEFAULT_DB, help="キューの DB ファイル")
+    sub = parser.add_subparsers(dest="mode", required=True)
+    p_add = sub.add_parser("add", help="ジョブを投入")
+    p_add.add_argument("jobs", type=Path, nargs="?", help="ジョブ定義（JSONL）")
+    p_add.add_argument("-p", type=str, help="プロファイル名（jobs を使わない場合）")
+    p_add.add_argument("-f", type=str, help="コマンドファイル（jobs を使わない場合）")
+    p_add.add_argument("-u", type=str, help="開く URL")
+    p_add.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help=f"最大試行回数（既定: {DEFAULT_MAX_ATTEMPTS}）")
+    sub.add_parser("status", help="状態ごとの件数とスループット")
+    p_list = sub.add_parser("list", help="ジョブ一覧（新しい順）")
+    p_list.add_argument("--status", choices=STATUSES)
+    p_list.add_argument("-n", type=int, default=20, help="表示件数")
+    p_requeue = sub.add_parser("requeue", help="ジョブを再投入")
+    p_requeue.add_argument("--status", choices=("failed", "done"), default="failed")
+    args = parser.parse_args()
+
+    queue = JobQueue(args.db)
+    if args.mode == "add":
+        try:
+            if args.jobs:
+                jobs = _load_jobs_file(args.jobs)
+            elif args.p and args.f:
+                jobs = [validate_job({"profile": args.p, "file": args.f, "url": args.u})]
+            else:
+                parser.error("ジョブ定義ファイル、または -p と -f を指定してください")
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        ids = queue.enqueue(jobs, max_attempts=args.max_attempts)
+        print(f"{len(ids)} 件を投入しました（ID {ids[0]}〜{ids[-1]}）" if ids else "投入するジョブがありません")
+    elif args.mode == "status":
+        for line in format_status(queue):
+            print(line)
+    elif args.mode == "list":
+        for job in queue.jobs(args.status, args.n):
+            seconds = f" {job['result']['seconds']}s" if job["result"] and "seconds" in job["result"] else ""
+            owner = f" @{job['lease_owner']}" if job["lease_owner"] else ""
+            error = f"  {job['error']}" if job["error"] else ""
+            print(
+                f"#{job['id']} {job['status']:<7} {job['attempts']}/{job['max_attempts']}"
+                f" {job['profile']} {Path(job['file']).name}{seconds}{owner}{error}"
+            )
+    elif args.mode == "requeue":
+        print(f"{queue.requeue(args.status)} 件を再投入しました")
+
+
+if __name__ == "__main__":
+    main()
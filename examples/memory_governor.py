@@ -0,0 +1,123 @@
+"""memory_governor.py — 長時間セッションのメモリ監視とコンテキストの作り直し
+
+05_chrome_launcher.py のシェル・コマンドファイル・バッチで、コマンドの合間に CDP の
+Performance.getMetrics でページの JS ヒープ・DOM ノード数などを取得し、JSONL に記録する。
+
+  - sample_every コマンドごとに計測する（CDP の1往復のみ。ページの実行は止めない）
+  - JS ヒープ使用量が limit_mb を超えたとき、または recycle_every コマンドごとに
+    コンテキストの作り直しを要求する（作り直し自体は 05 の recycle_context で行う）
+  - 作り直しの前後も記録するため、ログを見れば解放された量が分かる
+
+SPA を長時間操作するとヒープ・ノード・イベントリスナーが単調に増えるため、
+コンテキストごと閉じて storage_state から開き直すのが確実にメモリを戻す方法になる。
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from pathlib import Path
+
+
+DEFAULT_SAMPLE_EVERY = 10
+
+# Performance.getMetrics のうち記録する項目（名前 → ログのキー）
+_METRICS = {
+    "JSHeapUsedSize": "heap_used",
+    "JSHeapTotalSize": "heap_total",
+    "Nodes": "nodes",
+    "Documents": "documents",
+    "Frames": "frames",
+    "JSEventListeners": "listeners",
+}
+
+# --low-memory で Chromium に渡す起動オプション
+LOW_MEMORY_ARGS = [
+    "--disable-dev-shm-usage",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-features=Translate,BackForwardCache,MediaRouter,OptimizationHints",
+    "--renderer-process-limit=2",
+]
+
+
+def _mb(value: float) -> float:
+    return round(value / (1024 * 1024), 1)
+
+
+class MemoryGovernor:
+    """ページのメモリを定期的に計測し、しきい値でコンテキストの作り直しを要求する。"""
+
+    def __init__(
+        self,
+        log_path: Path,
+        limit_mb: float = 0,
+        recycle_every: int = 0,
+        sample_every: int = DEFAULT_SAMPLE_EVERY,
+    ) -> None:
+        self.log_path = log_path
+        self.limit_mb = limit_mb
+        self.recycle_every = recycle_every
+        self.sample_every = max(1, sample_every)
+        self.commands = 0
+        self.since_recycle = 0
+        self.recycles = 0
+        self.peak_mb = 0.0
+        self.last: dict | None = None
+        self._page = None
+        self._cdp = None
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = log_path.open("a", encoding="utf-8")
+
+    def sample(self, page, event: str = "sample", **extra) -> dict | None:
+        """ページのメモリを計測して記録する。CDP が使えない（Chromium 以外など）場合は None。"""
+        try:
+            if self._page is not page:
+                self._cdp = page.context.new_cdp_session(page)
+                self._cdp.send("Performance.enable")
+                self._page = page
+            metrics = {m["name"]: m["value"] for m in self._cdp.send("Performance.getMetrics")["metrics"]}
+        except Exception:
+            self._page = self._cdp = None
+            return None
+        record = {"event": event, "ts": time.time(), "commands": self.commands, "url": page.url, **extra}
+        for name, key in _METRICS.items():
+            if name in metrics:
+                value = metrics[name]
+                record[key] = _mb(value) if name.startswith("JSHeap") else int(value)
+        self.peak_mb = max(self.peak_mb, record.get("heap_used", 0.0))
+        self.last = record
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        return record
+
+    def after_command(self, page) -> str | None:
+        """コマンドを1つ実行した後に呼ぶ。作り直すべきならその理由を返す。"""
+        self.commands += 1
+        self.since_recycle += 1
+        if self.recycle_every and self.since_recycle >= self.recycle_every:
+            self.sample(page)
+            return f"{self.since_recycle}コマンド"
+        if self.commands % self.sample_every:
+            return None
+        record = self.sample(page)
+        if record and self.limit_mb and record.get("heap_used", 0.0) >= self.limit_mb:
+            return f"JS ヒープ {record['heap_used']}MB ≥ {self.limit_mb}MB"
+        return None
+
+    def recycled(self, page, reason: str, elapsed_ms: float) -> None:
+        """コンテキストを作り直した後に呼ぶ。新しいページで計測し直す。"""
+        self.recycles += 1
+        self.since_recycle = 0
+        self._page = self._cdp = None
+        self.sample(page, event="recycle", reason=reason, ms=round(elapsed_ms, 1))
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+    def summary(self) -> str:
+        last = f"直近 {self.last['heap_used']}MB / " if self.last and "heap_used" in self.last else ""
+        return f"{last}最大 {self.peak_mb}MB / 作り直し {self.recycles}回 → {self.log_path}"
@@ -0,0 +1,121 @@
+"""metrics.py — コマンドのレイテンシ計測
+
+コマンド種別 × フェーズ（total, resolve, action, post_wait など）ごとに
+対数バケットのヒストグラムで所要時間を集計する。記録は配列のカウンタを1つ増やすだけで、
+サンプル数によらずメモリ使用量は一定。05_chrome_launcher.py の stats コマンドと
+終了時の JSON 出力で使用する。
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+# バケットの下限（ms）と1オクターブあたりの分割数（相対誤差は約 4%）
+_MIN_MS = 0.01
+_STEPS_PER_OCTAVE = 8
+_NUM_BUCKETS = 30 * _STEPS_PER_OCTAVE  # 0.01ms 〜 約 3 時間
+
+PERCENTILES = (50, 90, 99)
+
+
+class LatencyHistogram:
+    """対数バケットのレイテンシヒストグラム。"""
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self) -> None:
+        self.counts = [0] * _NUM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, ms: float) -> None:
+        if ms <= _MIN_MS:
+            index = 0
+        else:
+            index = min(int(math.log2(ms / _MIN_MS) * _STEPS_PER_OCTAVE), _NUM_BUCKETS - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += ms
+        self.min = min(self.min, ms)
+        self.max = max(self.max, ms)
+
+    def percentile(self, p: float) -> float:
+        """p パーセンタイルの近似値（バケットの上端）を返す。"""
+        if self.count == 0:
+            return 0.0
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                upper = _MIN_MS * 2 ** ((index + 1) / _STEPS_PER_OCTAVE)
+                return min(upper, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        result = {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "min_ms": round(self.min, 3) if self.count else 0.0,
+            "max_ms": round(self.max, 3),
+        }
+        for p in PERCENTILES:
+            result[f"p{p}_ms"] = round(self.percentile(p), 3)
+        return result
+
+
+class Metrics:
+    """コマンド種別 × フェーズごとのヒストグラムを保持する。"""
+
+    def __init__(self) -> None:
+        self.histograms: dict[tuple[str, str], LatencyHistogram] = {}
+        self.started = time.time()
+        # バッチモードでは複数スレッドから共有される
+        self._lock = threading.Lock()
+
+    def record(self, command: str, phase: str, ms: float) -> None:
+        key = (command, phase)
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = LatencyHistogram()
+            hist.record(ms)
+
+    @contextmanager
+    def phase(self, command: str, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(command, phase, (time.perf_counter() - start) * 1000)
+
+    def format_table(self) -> list[str]:
+        header = f"{'command':<10} {'phase':<10} {'count':>6} " + " ".join(f"{'p' + str(p):>8}" for p in PERCENTILES) + f" {'max':>8}"
+        lines = [header]
+        with self._lock:
+            items = sorted(self.histograms.items())
+        for (command, phase), hist in items:
+            pcts = " ".join(f"{hist.percentile(p):>7.0f}ms" for p in PERCENTILES)
+            lines.append(f"{command:<10} {phase:<10} {hist.count:>6} {pcts} {hist.max:>7.0f}ms")
+        return lines
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            items = sorted(self.histograms.items())
+        commands: dict[str, dict] = {}
+        for (command, phase), hist in items:
+            commands.setdefault(command, {})[phase] = hist.to_dict()
+        return {"started": self.started, "finished": time.time(), "commands": commands}
+
+    def export(self, path: Path) -> Path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), indent=2, ensure_ascii=False))
+        return path
@@ -0,0 +1,255 @@
+"""net_capture.py — メモリ使用量が一定のネットワークキャプチャ
+
+ページの request / response / requestfinished イベントを記録し、バックグラウンドの
+書き込みスレッドで JSONL または HAR ファイルにストリーミング出力する。
+05_chrome_launcher.py の --capture / --capture-ring で使用する。
+
+  - イベントハンドラはレコードをキューに積むだけ（キューが満杯なら破棄して件数を数える）
+  - ファイルは rotate_bytes を超えるとローテーションする（path.1, path.2, ...）
+  - sample で URL 単位の間引き、url_patterns / resource_types で絞り込みができる
+  - ring_size > 0 なら直近 N 件をメモリに保持し、net: コマンドで参照できる
+"""
+
+from __future__ import annotations
+
+import json
+import queue
+import threading
+import time
+import zlib
+from collections import deque
+from fnmatch import fnmatchcase
+from pathlib import Path
+
+
+QUEUE_SIZE = 10_000
+ROTATE_BYTES = 100 * 1024 * 1024
+ROTATE_BACKUPS = 5
+
+_HAR_HEADER = '{"log": {"version": "1.2", "creator": {"name": "05_chrome_launcher", "version": "0.1.0"}, "entries": [\n'
+_HAR_FOOTER = "\n]}}\n"
+
+
+def _headers_to_har(headers: dict[str, str]) -> list[dict[str, str]]:
+    return [{"name": k, "value": v} for k, v in headers.items()]
+
+
+class NetworkCapture:
+    """ページのネットワークイベントをファイルとリングバッファに記録する。"""
+
+    def __init__(
+        self,
+        path: str | None = None,
+        sample: float = 1.0,
+        url_patterns: list[str] | None = None,
+        resource_types: list[str] | None = None,
+        ring_size: int = 0,
+        rotate_bytes: int = ROTATE_BYTES,
+    ) -> None:
+        self.path = Path(path) if path else None
+        self.format = "har" if self.path and self.path.suffix == ".har" else "jsonl"
+        self.sample = sample
+        self.url_patterns = url_patterns or []
+        self.resource_types = set(resource_types or [])
+        self.ring: deque[dict] = deque(maxlen=max(ring_size, 0))
+        self.rotate_bytes = rotate_bytes
+        self.captured = 0
+        self.dropped = 0
+        self.written = 0
+
+        self._queue: queue.Queue[dict | None] = queue.Queue(maxsize=QUEUE_SIZE)
+        self._writer: threading.Thread | None = None
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._writer = threading.Thread(target=self._write_loop, name="net-capture", daemon=True)
+            self._writer.start()
+
+    # --- イベント受信（Playwright のスレッドで呼ばれる） ---
+
+    def attach(self, page) -> None:
+        page.on("request", self._on_request)
+        page.on("response", self._on_response)
+        page.on("requestfinished", self._on_finished)
+
+    def _wanted(self, request) -> bool:
+        if self.resource_types and request.resource_type not in self.resource_types:
+            return False
+        url = request.url
+        if self.url_patterns and not any(fnmatchcase(url, p) for p in self.url_patterns):
+            return False
+        if self.sample < 1.0:
+            # URL のハッシュで間引くため、同じリクエストのイベントは揃って残る
+            return zlib.crc32(url.encode()) % 10_000 < self.sample * 10_000
+        return True
+
+    def _emit(self, record: dict) -> None:
+        self.captured += 1
+        self.ring.append(record)
+        if self._writer is None:
+            return
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _on_request(self, request) -> None:
+        if not self._wanted(request):
+            return
+        self._emit({
+            "event": "request",
+            "ts": time.time(),
+            "method": request.method,
+            "url": request.url,
+            "type": request.resource_type,
+        })
+
+    def _on_response(self, response) -> None:
+        request = response.request
+        if not self._wanted(request):
+            return
+        record = {
+            "event": "response",
+            "ts": time.time(),
+            "method": request.method,
+            "url": response.url,
+            "type": request.resource_type,
+            "status": response.status,
+            "content_type": response.headers.get("content-type"),
+            "content_length": response.headers.get("content-length"),
+        }
+        if self.format == "har":
+            record["request_headers"] = request.headers
+            record["response_headers"] = response.headers
+            record["status_text"] = response.status_text
+        self._emit(record)
+
+    def _on_finished(self, request) -> None:
+        if not self._wanted(request):
+            return
+        timing = request.timing
+        self._emit({
+            "event": "finished",
+            "ts": time.time(),
+            "method": request.method,
+            "url": request.url,
+            "type": request.resource_type,
+            "duration_ms": round(timing["responseEnd"], 1) if timing.get("responseEnd", -1) >= 0 else None,
+        })
+
+    # --- 書き込みスレッド ---
+
+    def _open(self):
+        f = self.path.open("w", encoding="utf-8")
+        if self.format == "har":
+            f.write(_HAR_HEADER)
+        return f
+
+    def _close_file(self, f) -> None:
+        if self.format == "har":
+            f.write(_HAR_FOOTER)
+        f.close()
+
+    def _rotate(self, f):
+        self._close_file(f)
+        for i in range(ROTATE_BACKUPS - 1, 0, -1):
+            older = self.path.with_name(f"{self.path.name}.{i}")
+            if older.exists():
+                older.replace(self.path.with_name(f"{self.path.name}.{i + 1}"))
+        self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+        return self._open()
+
+    def _format(self, record: dict) -> str | None:
+        if self.format == "jsonl":
+            return json.dumps(record, ensure_ascii=False)
+        # HAR はレスポンス単位のエントリのみ出力する
+        if record["event"] != "response":
+            return None
+        entry = {
+            "startedDateTime": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record["ts"])) + "Z",
+            "time": 0,
+            "request": {
+                "method": record["method"],
+                "url": record["url"],
+                "httpVersion": "",
+                "headers": _headers_to_har(record["request_headers"]),
+                "queryString": [],
+                "cookies": [],
+                "headersSize": -1,
+                "bodySize": -1,
+            },
+            "response": {
+                "status": record["status"],
+                "statusText": record["status_text"],
+                "httpVersion": "",
+                "headers": _headers_to_har(record["response_headers"]),
+                "cookies": [],
+                "content": {"size": int(record["content_length"] or -1), "mimeType": record["content_type"] or ""},
+                "redirectURL": "",
+                "headersSize": -1,
+                "bodySize": -1,
+            },
+            "cache": {},
+            "timings": {"send": 0, "wait": 0, "receive": 0},
+            "_resourceType": record["type"],
+        }
+        return json.dumps(entry, ensure_ascii=False)
+
+    def _write_loop(self) -> None:
+        f = self._open()
+        first = True
+        try:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    break
+                line = self._format(record)
+                if line is None:
+                    continue
+                if self.format == "har" and not first:
+                    f.write(",\n")
+                f.write(line if self.format == "har" else line + "\n")
+                first = False
+                self.written += 1
+                # キューが空になったタイミングでまとめて flush する（tail で追えるように）
+                if self._queue.empty():
+                    f.flush()
+                if f.tell() >= self.rotate_bytes:
+                    f = self._rotate(f)
+                    first = True
+        finally:
+            self._close_file(f)
+
+    def close(self) -> None:
+        """未書き込みのレコードを書き切ってファイルを閉じる。"""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+    # --- 参照 ---
+
+    def query(self, arg: str) -> list[str]:
+        """net: コマンドの表示内容を返す。arg は件数（1 以上）または URL の glob パターン。"""
+        limit = 20
+        pattern = None
+        if arg.isdigit():
+            limit = int(arg)
+            # records[-0:] は全件になるため、0 は明示的に弾く
+            if limit <= 0:
+                raise ValueError(f"net: の件数は 1 以上で指定してください: {arg}")
+        elif arg:
+            pattern = arg if any(c in arg for c in "*?[") else f"*{arg}*"
+
+        records = [r for r in self.ring if r["event"] != "request"]
+        if pattern:
+            records = [r for r in records if fnmatchcase(r["url"], pattern)]
+        lines = []
+        for r in records[-limit:]:
+            status = r.get("status", "")
+            duration = f" {r['duration_ms']:.0f}ms" if r.get("duration_ms") is not None else ""
+            lines.append(f"{r['event'][:4]} {status:>3} {r['method']} {r['type']}{duration} {r['url'][:100]}")
+        return lines
+
+    def summary(self) -> str:
+        target = f" → {self.path}" if self.path else ""
+        return f"記録 {self.captured}件 / 書き込み {self.written}件 / 破棄 {self.dropped}件{target}"
@@ -0,0 +1,199 @@
+"""page_actions.py — 待機戦略と入力方式（sync_api / async_api 共通）
+
+url: / click: の後の待ち方（待機戦略）と input: の打ち方（入力方式）の解析と実行をまとめる。
+05_chrome_launcher.py（sync_api）と 07_async_engine.py（async_api）が同じ既定値・同じ JS を使うように、
+実行関数は sync 版と async 版を並べて置く。
+
+待機戦略:
+  fixed[=ms]     固定時間待機（既定 1000ms）
+  commit         ナビゲーション確定のみ待つ（click: では追加待機なし）
+  networkidle    ネットワークが落ち着くまで待つ
+  quiet[=ms]     DOM 変更が ms ミリ秒止まるまで待つ（既定 500ms）
+  selector=<sel> 指定セレクタの要素が表示されるまで待つ
+入力方式:
+  human          1文字ずつ 80〜300ms 間隔で打鍵
+  fill           locator.fill で一括設定
+  insert         keyboard.insert_text で一括挿入（input イベントのみ発生）
+  chunk[=n]      n 文字ずつ（既定 8）ブラウザ側で挿入し、チャンク間にランダム待機
+"""
+
+from __future__ import annotations
+
+import random
+
+
+# 待機戦略の既定値
+WAIT_STRATEGIES = ("fixed", "commit", "networkidle", "quiet", "selector")
+DEFAULT_WAIT = "fixed"
+DEFAULT_WAIT_TIMEOUT = 10000
+FIXED_WAIT_MS = 1000
+QUIET_WAIT_MS = 500
+
+# 入力方式の既定値
+INPUT_MODES = ("human", "fill", "insert", "chunk")
+DEFAULT_INPUT_MODE = "human"
+CHUNK_SIZE = 8
+TYPING_DELAY_MS = (80, 300)
+
+# ブラウザ側で text を size 文字ずつ挿入し、チャンク間に minDelay〜maxDelay ms 待つ
+# （Python との往復は1回で済む）
+CHUNK_TYPE_JS = """
+async (el, [text, size, minDelay, maxDelay]) => {
+    const sleep = ms => new Promise(r => setTimeout(r, ms));
+    el.focus();
+    const editable = el.isContentEditable;
+    for (let i = 0; i < text.length; i += size) {
+        text.slice(i, i + size).split("\\n").forEach((part, j) => {
+            if (j > 0) {
+                if (editable) document.execCommand("insertParagraph");
+                else document.execCommand("insertText", false, "\\n");
+            }
+            if (part) document.execCommand("insertText", false, part);
+        });
+        await sleep(minDelay + Math.random() * (maxDelay - minDelay));
+    }
+}
+"""
+
+# DOM 変更が quietMs ミリ秒止まるまで待つ（timeoutMs で打ち切り）
+DOM_QUIET_JS = """
+([quietMs, timeoutMs]) => new Promise(resolve => {
+    let timer = null;
+    let hard = null;
+    const observer = new MutationObserver(() => {
+        clearTimeout(timer);
+        timer = setTimeout(() => done(true), quietMs);
+    });
+    const done = settled => {
+        observer.disconnect();
+        clearTimeout(timer);
+        clearTimeout(hard);
+        resolve(settled);
+    };
+    observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+    timer = setTimeout(() => done(true), quietMs);
+    hard = setTimeout(() => done(false), timeoutMs);
+})
+"""
+
+
+def parse_wait_strategy(spec: str) -> tuple[str, str | None]:
+    """待機戦略の指定文字列を (種類, 値) に分解する。"""
+    kind, _, value = spec.partition("=")
+    kind = kind.strip()
+    if kind not in WAIT_STRATEGIES:
+        raise ValueError(f"不明な待機戦略: {spec}")
+    if kind == "selector" and not value:
+        raise ValueError("selector 戦略にはセレクタを指定してください（selector=<sel>）")
+    if kind in ("fixed", "quiet") and value:
+        try:
+            ms = int(value)
+        except ValueError:
+            ms = -1
+        if ms < 0:
+            raise ValueError(f"{kind} の待機時間はミリ秒の整数で指定してください: {spec}")
+    return kind, value or None
+
+
+def parse_input_mode(spec: str) -> tuple[str, int | None]:
+    """入力方式の指定文字列を (方式, チャンクサイズ) に分解する。"""
+    mode, _, value = spec.partition("=")
+    mode = mode.strip()
+    if mode not in INPUT_MODES:
+        raise ValueError(f"不明な入力方式: {spec}")
+    if mode == "chunk":
+        if not value:
+            return mode, CHUNK_SIZE
+        # 0 以下だと CHUNK_TYPE_JS のループが終わらない
+        if not value.strip().isdigit() or int(value) <= 0:
+            raise ValueError(f"chunk のサイズは 1 以上の整数で指定してください: {spec}")
+        return mode, int(value)
+    return mode, None
+
+
+def type_text(page, element, text: str, mode: str, chunk_size: int | None) -> None:
+    """要素に、指定の入力方式でテキストを入力する。"""
+    if mode == "fill":
+        element.fill(text)
+    elif mode == "insert":
+        element.click()
+        page.keyboard.insert_text(text)
+    elif mode == "chunk":
+        element.click()
+        element.evaluate(CHUNK_TYPE_JS, [text, chunk_size, *TYPING_DELAY_MS])
+    else:
+        element.click()
+        for ch in text:
+            page.keyboard.type(ch)
+            page.wait_for_timeout(random.randint(*TYPING_DELAY_MS))
+
+
+async def type_text_async(page, element, text: str, mode: str, chunk_size: int | None) -> None:
+    """type_text の async_api 版。"""
+    if mode == "fill":
+        await element.fill(text)
+    elif mode == "insert":
+        await element.click()
+        await page.keyboard.insert_text(text)
+    elif mode == "chunk":
+        await element.click()
+        await element.evaluate(CHUNK_TYPE_JS, [text, chunk_size, *TYPING_DELAY_MS])
+    else:
+        await element.click()
+        for ch in text:
+            await page.keyboard.type(ch)
+            await page.wait_for_timeout(random.randint(*TYPING_DELAY_MS))
+
+
+def wait_for_settle(page, kind: str, value: str | None, timeout_ms: int) -> str | None:
+    """url: / click: の後、戦略に従ってページが落ち着くまで待つ。
+
+    タイムアウトした場合は打ち切った内容を返す（コマンド自体は継続する）。落ち着けば None。
+    """
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+    try:
+        if kind == "fixed":
+            page.wait_for_timeout(int(value) if value else FIXED_WAIT_MS)
+        elif kind == "networkidle":
+            page.wait_for_load_state("networkidle", timeout=timeout_ms)
+        elif kind == "selector":
+            page.wait_for_selector(value, state="visible", timeout=timeout_ms)
+        elif kind == "quiet":
+            quiet_ms = int(value) if value else QUIET_WAIT_MS
+            try:
+                settled = page.evaluate(DOM_QUIET_JS, [quiet_ms, timeout_ms])
+            except Exception:
+                # 待機中にページ遷移するとコンテキストが破棄されるので、遷移先で測り直す
+                page.wait_for_load_state("domcontentloaded", timeout=timeout_ms)
+                settled = page.evaluate(DOM_QUIET_JS, [quiet_ms, timeout_ms])
+            if not settled:
+                return f"待機打ち切り: DOM 変更が {timeout_ms}ms 以内に止まりませんでした"
+        return None
+    except PlaywrightTimeoutError:
+        return f"待機打ち切り: {kind} が {timeout_ms}ms 以内に満たされませんでした"
+
+
+async def wait_for_settle_async(page, kind: str, value: str | None, timeout_ms: int) -> str | None:
+    """wait_for_settle の async_api 版。"""
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+    try:
+        if kind == "fixed":
+            await page.wait_for_timeout(int(value) if value else FIXED_WAIT_MS)
+        elif kind == "networkidle":
+            await page.wait_for_load_state("networkidle", timeout=timeout_ms)
+        elif kind == "selector":
+            await page.wait_for_selector(value, state="visible", timeout=timeout_ms)
+        elif kind == "quiet":
+            quiet_ms = int(value) if value else QUIET_WAIT_MS
+            try:
+                settled = await page.evaluate(DOM_QUIET_JS, [quiet_ms, timeout_ms])
+            except Exception:
+                await page.wait_for_load_state("domcontentloaded", timeout=timeout_ms)
+                settled = await page.evaluate(DOM_QUIET_JS, [quiet_ms, timeout_ms])
+            if not settled:
+                return f"待機打ち切り: DOM 変更が {timeout_ms}ms 以内に止まりませんでした"
+        return None
+    except PlaywrightTimeoutError:
+        return f"待機打ち切り: {kind} が {timeout_ms}ms 以内に満たされませんでした"
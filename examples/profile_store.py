@@ -0,0 +1,315 @@
+"""profile_store.py — SQLite によるプロファイル（storage_state）の保存
+
+Cookie は1件1行、localStorage は origin ごとに1行で profiles/profiles.db に保存する。
+保存時は既存の行との差分だけを書き込み、期限切れの Cookie は削除する。
+書き込みは BEGIN IMMEDIATE のトランザクションで行うため、複数プロセスから同時に保存しても壊れない。
+
+従来の profiles/<name>.json は、DB に無いプロファイルを初めて読むときに自動で取り込む。
+
+使い方:
+  uv run python examples/profile_store.py list
+  uv run python examples/profile_store.py export teddy > teddy.json
+  uv run python examples/profile_store.py import teddy teddy.json
+  uv run python examples/profile_store.py prune
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    name       TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cookies (
+    profile   TEXT NOT NULL,
+    domain    TEXT NOT NULL,
+    path      TEXT NOT NULL,
+    name      TEXT NOT NULL,
+    value     TEXT NOT NULL,
+    expires   REAL NOT NULL,
+    http_only INTEGER NOT NULL,
+    secure    INTEGER NOT NULL,
+    same_site TEXT NOT NULL,
+    PRIMARY KEY (profile, domain, path, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS origins (
+    profile       TEXT NOT NULL,
+    origin        TEXT NOT NULL,
+    local_storage TEXT NOT NULL,
+    PRIMARY KEY (profile, origin)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sync_watermarks (
+    profile   TEXT NOT NULL,
+    source    TEXT NOT NULL,
+    watermark INTEGER NOT NULL,
+    PRIMARY KEY (profile, source)
+) WITHOUT ROWID;
+"""
+
+_COOKIE_COLUMNS = "domain, path, name, value, expires, http_only, secure, same_site"
+
+
+def _cookie_row(cookie: dict) -> tuple:
+    """storage_state の Cookie を DB の行（主キー以外も含む）に変換する。"""
+    return (
+        cookie["domain"],
+        cookie.get("path", "/"),
+        cookie["name"],
+        cookie.get("value", ""),
+        float(cookie.get("expires", -1)),
+        int(bool(cookie.get("httpOnly", False))),
+        int(bool(cookie.get("secure", False))),
+        cookie.get("sameSite", "Lax"),
+    )
+
+
+def _row_cookie(row: tuple) -> dict:
+    domain, path, name, value, expires, http_only, secure, same_site = row
+    return {
+        "name": name,
+        "value": value,
+        "domain": domain,
+        "path": path,
+        "expires": expires,
+        "httpOnly": bool(http_only),
+        "secure": bool(secure),
+        "sameSite": same_site,
+    }
+
+
+class ProfileStore:
+    """プロファイルの storage_state を SQLite に保存・復元する。"""
+
+    def __init__(self, db_path: Path, legacy_dir: Path | None = None) -> None:
+        self.db_path = db_path
+        self.legacy_dir = legacy_dir
+        # sqlite3 の接続はスレッドをまたいで使えないため、スレッドごとに開く
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _legacy_path(self, name: str) -> Path | None:
+        if self.legacy_dir is None:
+            return None
+        path = self.legacy_dir / f"{name}.json"
+        return path if path.exists() else None
+
+    # --- 参照 ---
+
+    def names(self) -> list[str]:
+        names = set()
+        if self.db_path.exists():
+            names.update(row[0] for row in self._conn().execute("SELECT name FROM profiles"))
+        if self.legacy_dir is not None and self.legacy_dir.exists():
+            names.update(p.stem for p in self.legacy_dir.glob("*.json"))
+        return sorted(names)
+
+    def exists(self, name: str) -> bool:
+        # 参照だけで DB ファイルを作らないようにする
+        if self.db_path.exists():
+            row = self._conn().execute("SELECT 1 FROM profiles WHERE name = ?", (name,)).fetchone()
+            if row is not None:
+                return True
+        return self._legacy_path(name) is not None
+
+    def load(self, name: str) -> dict | None:
+        """storage_state 形式の dict を返す。期限切れの Cookie は含めない。存在しなければ None。"""
+        if not self.exists(name):
+            return None
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM profiles WHERE name = ?", (name,)).fetchone() is None:
+            legacy = self._legacy_path(name)
+            if legacy is None:
+                return None
+            self.import_json(name, legacy)
+
+        now = time.time()
+        cookies = [
+            _row_cookie(row)
+            for row in conn.execute(
+                f"SELECT {_COOKIE_COLUMNS} FROM cookies WHERE profile = ? AND (expires < 0 OR expires > ?)",
+                (name, now),
+            )
+        ]
+        origins = [
+            {"origin": origin, "localStorage": json.loads(local_storage)}
+            for origin, local_storage in conn.execute(
+                "SELECT origin, local_storage FROM origins WHERE profile = ?", (name,)
+            )
+        ]
+        return {"cookies": cookies, "origins": origins}
+
+    def get_watermark(self, name: str, source: str) -> int:
+        """source（06_export_cookies.py の同期元）から最後に同期した時点を返す。未同期なら 0。"""
+        row = self._conn().execute(
+            "SELECT watermark FROM sync_watermarks WHERE profile = ? AND source = ?", (name, source)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def set_watermark(self, name: str, source: str, watermark: int) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO sync_watermarks (profile, source, watermark) VALUES (?, ?, ?)",
+            (name, source, watermark),
+        )
+
+    # --- 書き込み ---
+
+    def save(self, name: str, state: dict) -> dict:
+        """storage_state を差分保存する。変更件数を返す。
+
+        state に無い Cookie / origin は削除する（ブラウザ側の状態をそのまま反映する）。
+        """
+        return self._write(name, state.get("cookies", []), state.get("origins", []), replace=True)
+
+    def merge_cookies(self, name: str, cookies: list[dict], watermark: tuple[str, int] | None = None) -> dict:
+        """Cookie を追加・上書きする（既存の Cookie と origin は残す）。変更件数を返す。
+
+        watermark に (source, 値) を渡すと、同じトランザクションで同期位置も更新する。
+        """
+        return self._write(name, cookies, None, replace=False, watermark=watermark)
+
+    def _write(
+        self,
+        name: str,
+        cookies: list[dict],
+        origins: list[dict] | None,
+        replace: bool,
+        watermark: tuple[str, int] | None = None,
+    ) -> dict:
+        stats = {"inserted": 0, "updated": 0, "deleted": 0, "origins": 0, "pruned": 0}
+        new_cookies = {}
+        for cookie in cookies:
+            row = _cookie_row(cookie)
+            new_cookies[row[:3]] = row
+
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            existing = {
+                row[:3]: row
+                for row in conn.execute(f"SELECT {_COOKIE_COLUMNS} FROM cookies WHERE profile = ?", (name,))
+            }
+            upserts = []
+            for key, row in new_cookies.items():
+                old = existing.get(key)
+                if old is None:
+                    stats["inserted"] += 1
+                elif old != row:
+                    stats["updated"] += 1
+                else:
+                    continue
+                upserts.append((name, *row))
+            conn.executemany(
+                f"INSERT OR REPLACE INTO cookies (profile, {_COOKIE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                upserts,
+            )
+
+            if replace:
+                removed = [(name, *key) for key in existing.keys() - new_cookies.keys()]
+                conn.executemany("DELETE FROM cookies WHERE profile = ? AND domain = ? AND path = ? AND name = ?", removed)
+                stats["deleted"] = len(removed)
+
+            if origins is not None:
+                stats["origins"] = self._write_origins(conn, name, origins)
+
+            stats["pruned"] = conn.execute(
+                "DELETE FROM cookies WHERE profile = ? AND expires >= 0 AND expires < ?", (name, time.time())
+            ).rowcount
+            conn.execute(
+                "INSERT OR REPLACE INTO profiles (name, updated_at) VALUES (?, ?)", (name, time.time())
+            )
+            if watermark is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO sync_watermarks (profile, source, watermark) VALUES (?, ?, ?)",
+                    (name, *watermark),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return stats
+
+    @staticmethod
+    def _write_origins(conn: sqlite3.Connection, name: str, origins: list[dict]) -> int:
+        existing = dict(conn.execute("SELECT origin, local_storage FROM origins WHERE profile = ?", (name,)))
+        new = {o["origin"]: json.dumps(o.get("localStorage", []), ensure_ascii=False) for o in origins}
+        changed = [(name, origin, data) for origin, data in new.items() if existing.get(origin) != data]
+        conn.executemany("INSERT OR REPLACE INTO origins (profile, origin, local_storage) VALUES (?, ?, ?)", changed)
+        removed = [(name, origin) for origin in existing.keys() - new.keys()]
+        conn.executemany("DELETE FROM origins WHERE profile = ? AND origin = ?", removed)
+        return len(changed) + len(removed)
+
+    def import_json(self, name: str, path: Path) -> dict:
+        """storage_state 形式の JSON ファイルを取り込む。"""
+        return self.save(name, json.loads(path.read_text()))
+
+    def prune_expired(self) -> int:
+        """全プロファイルから期限切れの Cookie を削除する。"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            count = conn.execute("DELETE FROM cookies WHERE expires >= 0 AND expires < ?", (time.time(),)).rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return count
+
+
+def format_stats(stats: dict) -> str:
+    """save / merge_cookies の戻り値を表示用の文字列にする。"""
+    return (
+        f"Cookie 追加 {stats['inserted']} / 更新 {stats['updated']} / 削除 {stats['deleted']}"
+        f" / 期限切れ {stats['pruned']}, origin 変更 {stats['origins']}"
+    )
+
+
+def main() -> None:
+    profiles_dir = Path(__file__).resolve().parent.parent / "profiles"
+    parser = argparse.ArgumentParser(description="プロファイルストア（profiles/profiles.db）の管理")
+    sub = parser.add_subparsers(dest="mode", required=True)
+    sub.add_parser("list", help="プロファイル一覧")
+    p_export = sub.add_parser("export", help="storage_state 形式の JSON を出力")
+    p_export.add_argument("name")
+    p_import = sub.add_parser("import", help="storage_state 形式の JSON を取り込む")
+    p_import.add_argument("name")
+    p_import.add_argument("path", type=Path)
+    sub.add_parser("prune", help="期限切れの Cookie を削除")
+    args = parser.parse_args()
+
+    store = ProfileStore(profiles_dir / "profiles.db", legacy_dir=profiles_dir)
+    if args.mode == "list":
+        for name in store.names():
+            print(name)
+    elif args.mode == "export":
+        state = store.load(args.name)
+        if state is None:
+            print(f"プロファイルが見つかりません: {args.name}", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(state, indent=2, ensure_ascii=False))
+    elif args.mode == "import":
+        print(format_stats(store.import_json(args.name, args.path)))
+    elif args.mode == "prune":
+        print(f"期限切れの Cookie を {store.prune_expired()} 件削除しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""request_filter.py — page.route によるリソースブロック
+
+設定ファイル（JSON）のルールに一致したリクエストを中断し、ルールごとのヒット数と
+削減できた通信量（推定）を集計する。05_chrome_launcher.py の --block で使用する。
+
+設定例:
+  {
+    "rules": [
+      {"name": "media", "resource_types": ["image", "media", "font"]},
+      {"name": "analytics", "domains": ["google-analytics.com", "doubleclick.net"]},
+      {"name": "video", "urls": ["**/*.mp4", "**/*.m3u8"]}
+    ],
+    "allow": ["https://abs.twimg.com/**"],
+    "estimated_bytes": {"image": 80000}
+  }
+
+ルール内で複数の条件を指定した場合はすべてを満たすときに一致する（各条件のリスト内はいずれか）。
+allow の URL パターンに一致したリクエストはルールより優先して通す。
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from fnmatch import fnmatchcase
+from pathlib import Path
+from urllib.parse import urlsplit
+
+
+# ブロックしたリクエストの推定サイズ（バイト）。レスポンスを受け取らないため実測できない
+DEFAULT_ESTIMATED_BYTES = {
+    "image": 50_000,
+    "media": 500_000,
+    "font": 40_000,
+    "script": 30_000,
+    "stylesheet": 15_000,
+    "xhr": 5_000,
+    "fetch": 5_000,
+    "other": 5_000,
+}
+
+
+def _domain_matches(host: str, domains: list[str]) -> bool:
+    return any(host == d or host.endswith("." + d) for d in domains)
+
+
+class RequestFilter:
+    """ルールに一致したリクエストを中断し、ヒット数を数える。"""
+
+    def __init__(self, config: dict) -> None:
+        self.rules = config.get("rules", [])
+        self.allow = config.get("allow", [])
+        self.estimated_bytes = {**DEFAULT_ESTIMATED_BYTES, **config.get("estimated_bytes", {})}
+        for i, rule in enumerate(self.rules):
+            rule.setdefault("name", f"rule{i + 1}")
+            if not any(k in rule for k in ("resource_types", "urls", "domains")):
+                raise ValueError(f"ルール {rule['name']} に条件がありません（resource_types / urls / domains）")
+        self.hits = {rule["name"]: 0 for rule in self.rules}
+        self.bytes_saved = {rule["name"]: 0 for rule in self.rules}
+        self.allowed = 0
+        self.passed = 0
+        # バッチモードでは複数スレッドから共有される
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> RequestFilter:
+        return cls(json.loads(Path(path).read_text()))
+
+    def match(self, url: str, resource_type: str) -> str | None:
+        """一致したルール名を返す。allow に一致した場合や、どのルールにも一致しない場合は None。"""
+        if any(fnmatchcase(url, pattern) for pattern in self.allow):
+            if any(self._rule_matches(rule, url, resource_type) for rule in self.rules):
+                with self._lock:
+                    self.allowed += 1
+            return None
+        for rule in self.rules:
+            if self._rule_matches(rule, url, resource_type):
+                return rule["name"]
+        return None
+
+    @staticmethod
+    def _rule_matches(rule: dict, url: str, resource_type: str) -> bool:
+        if "resource_types" in rule and resource_type not in rule["resource_types"]:
+            return False
+        if "urls" in rule and not any(fnmatchcase(url, pattern) for pattern in rule["urls"]):
+            return False
+        if "domains" in rule and not _domain_matches(urlsplit(url).hostname or "", rule["domains"]):
+            return False
+        return True
+
+    def handle(self, route) -> None:
+        """page.route のハンドラ。"""
+        request = route.request
+        name = self.match(request.url, request.resource_type)
+        if name is None:
+            with self._lock:
+                self.passed += 1
+            route.continue_()
+            return
+        with self._lock:
+            self.hits[name] += 1
+            self.bytes_saved[name] += self.estimated_bytes.get(request.resource_type, self.estimated_bytes["other"])
+        route.abort("blockedbyclient")
+
+    def install(self, page) -> None:
+        page.route("**/*", self.handle)
+
+    def print_summary(self) -> None:
+        total_hits = sum(self.hits.values())
+        total_bytes = sum(self.bytes_saved.values())
+        print("=== リクエストフィルタ ===")
+        for name in self.hits:
+            print(f"  {name}: {self.hits[name]}件 推定 {self.bytes_saved[name] / 1024:.0f}KB 削減")
+        print(
+            f"  合計: ブロック {total_hits}件（推定 {total_bytes / 1024 / 1024:.1f}MB）"
+            f" / 通過 {self.passed}件 / allow で許可 {self.allowed}件"
+        )
@@ -0,0 +1,196 @@
+"""screenshot_pipeline.py — 書き込みをスレッドに逃がすスクリーンショット
+
+ページ（または要素）のスクリーンショットをバイト列で取得し、エンコードとディスク書き込みは
+ワーカースレッドで行う。05_chrome_launcher.py の ss コマンドと終了時の保存で使用する。
+
+  - PNG / JPEG（quality 指定可）/ WebP（Pillow がある場合。PNG で取得して変換する）
+  - clip（x,y,w,h）、要素のみ、フルページの撮影
+  - 直前と同じ内容（SHA-1 が一致）のフレームは保存しない
+  - interval 秒ごとの自動撮影（max_frames 枚まで）
+  - 書き込みに失敗した画像はその場で表示し、failed に数える（saved には含めない）
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import importlib.util
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+
+FORMATS = ("png", "jpeg", "webp")
+_EXTENSIONS = {"png": "png", "jpeg": "jpg", "webp": "webp"}
+
+
+@functools.cache
+def _has_pillow() -> bool:
+    """WebP 変換に使う Pillow がインストールされているか（初回だけ調べる）。"""
+    return importlib.util.find_spec("PIL") is not None
+
+
+def parse_screenshot_options(option: str | None) -> dict:
+    """ss[...] のオプション（カンマ区切り）を解析する。解析できない項目があれば ValueError。
+
+    "jpeg=70"              → {"format": "jpeg", "quality": 70}
+    "webp=80,clip=0,0,800,600" → {"format": "webp", "quality": 80, "clip": {...}}
+    "full"                 → {"full_page": True}
+    """
+    result: dict = {}
+    items = [item.strip() for item in option.split(",")] if option else []
+    while items:
+        item = items.pop(0)
+        key, sep, value = item.partition("=")
+        if key in FORMATS:
+            result["format"] = key
+            if sep:
+                if not value.isdigit() or int(value) > 100:
+                    raise ValueError(f"品質は 0〜100 の整数で指定してください: {item}")
+                result["quality"] = int(value)
+        elif item == "full":
+            result["full_page"] = True
+        elif key == "clip" and sep:
+            # clip の値はカンマを含むので、続く3項目も clip の値として読む
+            values, items = [value, *items[:3]], items[3:]
+            try:
+                parts = [float(v) for v in values]
+            except ValueError:
+                parts = []
+            if len(parts) != 4:
+                raise ValueError("clip は x,y,幅,高さ で指定してください")
+            result["clip"] = dict(zip(("x", "y", "width", "height"), parts))
+        else:
+            raise ValueError(f"不明なスクリーンショットのオプション: {item}")
+    return result
+
+
+class ScreenshotPipeline:
+    """スクリーンショットを取得し、保存はワーカースレッドで行う。"""
+
+    def __init__(
+        self,
+        out_dir: Path,
+        fmt: str = "png",
+        quality: int | None = None,
+        dedup: bool = True,
+        interval: float = 0.0,
+        max_frames: int = 0,
+    ) -> None:
+        if fmt not in FORMATS:
+            raise ValueError(f"不明な画像形式: {fmt}")
+        self.out_dir = out_dir
+        self.format = fmt
+        self.quality = quality
+        self.dedup = dedup
+        self.interval = interval
+        self.max_frames = max_frames
+        self.saved = 0
+        self.skipped = 0
+        self._webp_warned = False
+        self.failed = 0
+        self.auto_frames = 0
+        self._last_digest: dict[int, bytes] = {}
+        self._last_auto = time.monotonic()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="screenshot")
+
+    def capture(
+        self,
+        target,
+        name: str = "screenshot",
+        fmt: str | None = None,
+        quality: int | None = None,
+        clip: dict | None = None,
+        full_page: bool = False,
+    ) -> Path | None:
+        """ページまたは Locator を撮影し、保存先パスを返す。直前と同一なら None。"""
+        fmt, quality, kwargs = self.screenshot_args(fmt, quality, clip, full_page)
+        data = target.screenshot(**kwargs)
+        # ページ（要素の場合はその所属ページ）ごとに直前のフレームと比較する
+        return self.store(data, getattr(target, "page", target), name, fmt, quality)
+
+    def screenshot_args(
+        self, fmt: str | None = None, quality: int | None = None, clip: dict | None = None, full_page: bool = False
+    ) -> tuple[str, int | None, dict]:
+        """(形式, 品質, screenshot() の引数) を返す。async_api のページでも同じ引数で撮影できる。"""
+        fmt = fmt or self.format
+        quality = quality if quality is not None else self.quality
+        kwargs: dict = {"type": "jpeg" if fmt == "jpeg" else "png"}
+        if fmt == "jpeg" and quality is not None:
+            kwargs["quality"] = quality
+        if clip is not None:
+            kwargs["clip"] = clip
+        if full_page:
+            kwargs["full_page"] = True
+        return fmt, quality, kwargs
+
+    def store(self, data: bytes, page, name: str, fmt: str, quality: int | None) -> Path | None:
+        """撮影したバイト列を保存する。page の直前のフレームと同一なら保存せず None を返す。"""
+        digest = hashlib.sha1(data).digest()
+        with self._lock:
+            if self.dedup and self._last_digest.get(id(page)) == digest:
+                self.skipped += 1
+                return None
+            self._last_digest[id(page)] = digest
+            self.saved += 1
+
+        # Pillow がなければ PNG で保存する。返すパスと書き込むパスが食い違わないよう、ここで拡張子を決める
+        if fmt == "webp" and not _has_pillow():
+            if not self._webp_warned:
+                self._webp_warned = True
+                print("  WebP 変換には Pillow が必要です（pip install pillow）。PNG で保存します")
+            fmt = "png"
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        path = self.out_dir / f"{name}_{timestamp}.{_EXTENSIONS[fmt]}"
+        future = self._executor.submit(self._write, data, path, fmt, quality)
+        future.add_done_callback(functools.partial(self._written, path))
+        return path
+
+    def _written(self, path: Path, future) -> None:
+        """書き込みの結果を確認する。失敗は保存枚数から除いて数える。"""
+        error = future.exception()
+        if error is None:
+            return
+        with self._lock:
+            self.saved -= 1
+            self.failed += 1
+        print(f"  スクリーンショットの保存に失敗しました: {path}: {error}")
+
+    def _write(self, data: bytes, path: Path, fmt: str, quality: int | None) -> None:
+        """ワーカースレッドでエンコードと書き込みを行う。"""
+        if fmt == "webp":
+            from PIL import Image
+
+            buf = io.BytesIO()
+            Image.open(io.BytesIO(data)).save(buf, "WEBP", quality=quality or 80)
+            data = buf.getvalue()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(data)
+        tmp.replace(path)
+
+    def maybe_auto_capture(self, page) -> Path | None:
+        """自動撮影が有効で、前回から interval 秒経過していれば撮影する。"""
+        if self.interval <= 0 or (self.max_frames and self.auto_frames >= self.max_frames):
+            return None
+        now = time.monotonic()
+        if now - self._last_auto < self.interval:
+            return None
+        self._last_auto = now
+        self.auto_frames += 1
+        return self.capture(page, name="auto")
+
+    def close(self) -> None:
+        """保存待ちのスクリーンショットを書き切る。"""
+        self._executor.shutdown(wait=True)
+        if self.failed:
+            print(f"スクリーンショットの保存に失敗: {self.failed}枚")
+
+    def summary(self) -> str:
+        auto = f" / 自動 {self.auto_frames}枚" if self.interval > 0 else ""
+        failed = f" / 保存失敗 {self.failed}枚" if self.failed else ""
+        return f"保存 {self.saved}枚 / 重複スキップ {self.skipped}枚{auto}{failed}"
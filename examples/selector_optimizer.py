@@ -0,0 +1,269 @@
+"""selector_optimizer.py — 長い絶対 XPath を短く安定したセレクタに置き換える
+
+05_chrome_launcher.py の select: / click: で長い XPath（または深い CSS）が使われたとき、
+同じ要素を指す短いセレクタを次の優先順で探す。
+
+  1. [data-testid="..."]
+  2. #id（数字の連番や自動生成らしい id は除く）
+  3. role=<ロール>[name="<名前>"]（Playwright のロールセレクタ）
+  4. data-testid / id を持つ祖先からの短い CSS パス（例: [data-testid="toolBar"] > div > button:nth-of-type(2)）
+
+候補は元のセレクタで見つけた要素（select: と同じ参照属性）と一致し、かつ一致件数が1件のものだけを採用する。
+採用したセレクタはサイト（ホスト）ごとに logs/selector_cache.json にキャッシュし、次回からは
+元のセレクタの代わりに使う（見つからなければ元のセレクタに戻してキャッシュから外す）。
+最適化の前後で解決時間（locator の1往復、repeat 回の中央値）を計測して表示する。
+
+キャッシュを使ってコマンドファイルを書き換えることもできる:
+  uv run python examples/selector_optimizer.py list
+  uv run python examples/selector_optimizer.py rewrite sample/commands.txt -o commands_fast.txt
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+
+DEFAULT_CACHE = Path(__file__).resolve().parent.parent / "logs" / "selector_cache.json"
+DEFAULT_REPEAT = 3
+
+# これより長い CSS、または XPath を最適化の対象にする
+MAX_PLAIN_SELECTOR = 60
+
+# 参照属性の付いた要素について、短いセレクタの候補を優先順に返す
+# （CSS の候補はページ内で一意かつ同じ要素かを確認済み。role= は Python 側で確認する）
+_CANDIDATES_JS = """
+([attr, ref, maxDepth]) => {
+    const el = document.querySelector(`[${attr}="${ref}"]`);
+    if (!el) return [];
+    const q = v => JSON.stringify(v);
+    const stableId = id => id && !/\\d{3,}|^_|:/.test(id);
+    const unique = sel => {
+        try {
+            const m = document.querySelectorAll(sel);
+            return m.length === 1 && m[0] === el;
+        } catch (e) {
+            return false;
+        }
+    };
+    const anchor = node => {
+        const testid = node.getAttribute("data-testid");
+        if (testid) return `[data-testid=${q(testid)}]`;
+        if (stableId(node.id)) return `#${CSS.escape(node.id)}`;
+        return null;
+    };
+    const out = [];
+
+    const testid = el.getAttribute("data-testid");
+    if (testid && unique(`[data-testid=${q(testid)}]`)) out.push(["testid", `[data-testid=${q(testid)}]`]);
+    if (stableId(el.id) && unique(`#${CSS.escape(el.id)}`)) out.push(["id", `#${CSS.escape(el.id)}`]);
+
+    const tag = el.tagName.toLowerCase();
+    const type = (el.getAttribute("type") || "text").toLowerCase();
+    const implicit = {
+        button: "button", textarea: "textbox", select: "combobox",
+        h1: "heading", h2: "heading", h3: "heading", h4: "heading", h5: "heading", h6: "heading",
+    };
+    let role = el.getAttribute("role") || implicit[tag] || null;
+    if (!role && tag === "a" && el.hasAttribute("href")) role = "link";
+    if (!role && tag === "input") {
+        role = {checkbox: "checkbox", radio: "radio", button: "button", submit: "button"}[type]
+            || (["text", "email", "search", "tel", "url"].includes(type) ? "textbox" : null);
+    }
+    const name = (el.getAttribute("aria-label") || el.innerText || "").trim().replace(/\\s+/g, " ");
+    if (role && name && name.length <= 50) out.push(["role", `role=${role}[name=${q(name)}]`]);
+
+    // 祖先をたどって短い CSS パスを作る（data-testid / id を持つ祖先で止める）
+    const parts = [];
+    for (let node = el; node && node !== document.documentElement && parts.length < maxDepth; node = node.parentElement) {
+        const a = node === el ? null : anchor(node);
+        if (a) {
+            parts.unshift(a);
+        } else {
+            let part = node.tagName.toLowerCase();
+            const parent = node.parentElement;
+            if (parent) {
+                const same = [...parent.children].filter(c => c.tagName === node.tagName);
+                if (same.length > 1) part += `:nth-of-type(${same.indexOf(node) + 1})`;
+            }
+            parts.unshift(part);
+        }
+        const css = parts.join(" > ");
+        if (unique(css)) {
+            out.push(["css", css]);
+            break;
+        }
+        if (a) break;
+    }
+    return out;
+}
+"""
+
+# 候補のセレクタが参照属性の付いた要素1件だけに一致するか
+_SAME_ELEMENT_JS = "(els, [attr, ref]) => els.length === 1 && els[0].getAttribute(attr) === ref"
+
+
+def is_brittle(selector: str) -> bool:
+    """最適化の対象か（XPath、または長い CSS）。"""
+    if selector.startswith(("/", "xpath=", "(")):
+        return True
+    return len(selector) > MAX_PLAIN_SELECTOR
+
+
+def site_of(url: str) -> str:
+    return urlsplit(url).netloc or "-"
+
+
+def rewrite_selector(name: str, option: str | None, selector: str) -> str:
+    """select: / click: のコマンドのセレクタを差し替える。"""
+    return f"{name}[{option}]:{selector}" if option else f"{name}:{selector}"
+
+
+class SelectorOptimizer:
+    """セレクタの最適化とサイトごとのキャッシュ。"""
+
+    def __init__(self, cache_path: Path = DEFAULT_CACHE, repeat: int = DEFAULT_REPEAT, max_depth: int = 6) -> None:
+        self.cache_path = cache_path
+        self.repeat = max(1, repeat)
+        self.max_depth = max_depth
+        self.cache: dict[str, dict[str, str]] = {}
+        if cache_path.exists():
+            self.cache = json.loads(cache_path.read_text())
+        self.optimized: list[dict] = []
+        self.hits = 0
+        self.stale = 0
+        # バッチ実行ではスレッドをまたいで共有する
+        self._lock = threading.Lock()
+
+    def lookup(self, url: str, selector: str) -> str | None:
+        with self._lock:
+            found = self.cache.get(site_of(url), {}).get(selector)
+            if found is not None:
+                self.hits += 1
+            return found
+
+    def invalidate(self, url: str, selector: str) -> None:
+        """キャッシュしたセレクタで見つからなかったときに呼ぶ。"""
+        with self._lock:
+            if self.cache.get(site_of(url), {}).pop(selector, None) is not None:
+                self.stale += 1
+                self._save()
+
+    def resolve_ms(self, page, selector: str) -> float:
+        """セレクタの解決時間（locator の1往復）の中央値。"""
+        samples = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            page.locator(selector).evaluate_all("els => els.length")
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
+
+    def optimize(self, page, selector: str, ref_attr: str, ref: str) -> dict | None:
+        """参照属性 ref の要素（selector で見つけたもの）を指す短いセレクタを探してキャッシュする。
+
+        {"selector", "kind", "before_ms", "after_ms"} を返す。見つからなければ None。
+        """
+        for kind, candidate in page.evaluate(_CANDIDATES_JS, [ref_attr, ref, self.max_depth]):
+            try:
+                if not page.locator(candidate).evaluate_all(_SAME_ELEMENT_JS, [ref_attr, ref]):
+                    continue
+            except Exception:
+                # role= の名前に使えない文字が含まれるなど
+                continue
+            result = {
+                "original": selector,
+                "selector": candidate,
+                "kind": kind,
+                "before_ms": round(self.resolve_ms(page, selector), 2),
+                "after_ms": round(self.resolve_ms(page, candidate), 2),
+            }
+            with self._lock:
+                self.cache.setdefault(site_of(page.url), {})[selector] = candidate
+                self.optimized.append(result)
+                self._save()
+            return result
+        return None
+
+    def _save(self) -> None:
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # 複数プロセス（キューのワーカーなど）から書いても一時ファイルがぶつからないようにする
+        tmp = self.cache_path.with_name(f"{self.cache_path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(self.cache, indent=2, ensure_ascii=False))
+        tmp.replace(self.cache_path)
+
+    def summary(self) -> str:
+        text = f"最適化 {len(self.optimized)}件 / キャッシュ利用 {self.hits}件 / 無効化 {self.stale}件"
+        if self.optimized:
+            before = statistics.mean(r["before_ms"] for r in self.optimized)
+            after = statistics.mean(r["after_ms"] for r in self.optimized)
+            text += f"（解決時間 平均 {before:.1f}ms → {after:.1f}ms）"
+        return text
+
+
+_URL_RE = re.compile(r"^url(?:\[[^\]]*\])?:(.+)$")
+_SELECTOR_COMMAND_RE = re.compile(r"^(select|click)(?:\[(.*?)\])?:(.+)$")
+
+
+def rewrite_command_file(lines: list[str], cache: dict[str, dict[str, str]]) -> tuple[list[str], int]:
+    """キャッシュを使ってコマンドファイルの select: / click: を書き換える。(行, 置換数) を返す。
+
+    サイトは直前の url: コマンドで判定する（ヒアドキュメントの中身はそのまま）。
+    """
+    out, replaced, site, heredoc = [], 0, None, None
+    for line in lines:
+        stripped = line.strip()
+        if heredoc is not None:
+            if stripped == heredoc:
+                heredoc = None
+            out.append(line)
+            continue
+        if "<<" in stripped and stripped.startswith("input"):
+            heredoc = stripped.split("<<", 1)[1].strip()
+        elif m := _URL_RE.match(stripped):
+            site = site_of(m.group(1).strip())
+        elif (m := _SELECTOR_COMMAND_RE.match(stripped)) and site is not None:
+            name, option, selector = m.groups()
+            optimized = cache.get(site, {}).get(selector.strip())
+            if optimized is not None:
+                line = rewrite_selector(name, option, optimized)
+                replaced += 1
+        out.append(line)
+    return out, replaced
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="セレクタのキャッシュ（logs/selector_cache.json）の確認とコマンドファイルの書き換え")
+    parser.add_argument("--cache", type=Path, default=DEFAULT_CACHE, help="キャッシュファイル")
+    sub = parser.add_subparsers(dest="mode", required=True)
+    sub.add_parser("list", help="サイトごとのキャッシュを表示")
+    p_rewrite = sub.add_parser("rewrite", help="コマンドファイルのセレクタをキャッシュで置き換える")
+    p_rewrite.add_argument("file", type=Path)
+    p_rewrite.add_argument("-o", "--out", type=Path, help="出力先（省略時は標準出力）")
+    args = parser.parse_args()
+
+    cache = json.loads(args.cache.read_text()) if args.cache.exists() else {}
+    if args.mode == "list":
+        for site, entries in sorted(cache.items()):
+            print(f"{site} ({len(entries)}件)")
+            for original, optimized in entries.items():
+                print(f"  {optimized}  ← {original}")
+    elif args.mode == "rewrite":
+        lines, replaced = rewrite_command_file(args.file.read_text().splitlines(), cache)
+        text = "\n".join(lines) + "\n"
+        if args.out:
+            args.out.write_text(text)
+        else:
+            sys.stdout.write(text)
+        print(f"{replaced}件のセレクタを置き換えました", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""session_journal.py — 追記専用のセッションジャーナル
+
+05_chrome_launcher.py のシェルで実行したコマンドを、実行するたびに JSONL で1行ずつ追記する。
+終了時にまとめて書くのではないため、クラッシュや SIGKILL でもそれまでのコマンドは残る。
+
+  - 1行 = 1コマンド（seq, ts, cmd, log, ms, ok, error）。先頭に start、正常終了時に end の行を書く
+  - 書き込みは1行ごとに flush する（tail -f で追える）。fsync は sync_every 行ごと
+    または sync_interval 秒ごとにまとめて行う
+  - メモリには何も溜めないため、長時間のセッションでもメモリ使用量と終了時の I/O は一定
+
+ジャーナルからコマンドファイル（-f でそのまま再実行できる形式）を復元できる:
+  uv run python examples/session_journal.py list
+  uv run python examples/session_journal.py show logs/session_20250101_120000.jsonl
+  uv run python examples/session_journal.py rebuild logs/session_20250101_120000.jsonl -o recovered.txt
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+
+SYNC_EVERY = 50
+SYNC_INTERVAL = 1.0
+
+
+class SessionJournal:
+    """コマンドの実行結果を JSONL ファイルに追記する。"""
+
+    def __init__(
+        self,
+        path: Path,
+        profile: str | None = None,
+        sync_every: int = SYNC_EVERY,
+        sync_interval: float = SYNC_INTERVAL,
+    ) -> None:
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.seq = 0
+        self.errors = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = path.open("a", encoding="utf-8")
+        self._append({"event": "start", "ts": time.time(), "profile": profile, "pid": os.getpid()})
+        self.sync()
+
+    def _append(self, record: dict) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+
+    def record(self, cmd: str, log: str | None, ms: float, error: str | None = None) -> None:
+        """コマンドを1つ記録する。log は再実行用の文字列（記録不要なコマンドは None）。"""
+        self.seq += 1
+        if error is not None:
+            self.errors += 1
+        self._append({
+            "event": "command",
+            "seq": self.seq,
+            "ts": time.time(),
+            "cmd": cmd,
+            "log": log,
+            "ms": round(ms, 1),
+            "ok": error is None,
+            "error": error,
+        })
+        if self._unsynced >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self) -> None:
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        """end の行を書いて閉じる。end が無いジャーナルは異常終了したセッション。"""
+        if self._file.closed:
+            return
+        self._append({"event": "end", "ts": time.time(), "commands": self.seq, "errors": self.errors})
+        self.sync()
+        self._file.close()
+
+    def summary(self) -> str:
+        return f"{self.seq}コマンド / エラー {self.errors}件 → {self.path}"
+
+
+def read_journal(path: Path):
+    """ジャーナルのレコードを順に返す。クラッシュで途中まで書かれた最終行は無視する。"""
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                break
+
+
+def inspect_journal(path: Path) -> dict:
+    """ジャーナルを1回走査して概要を返す（メモリには行を溜めない）。"""
+    info = {"path": str(path), "profile": None, "started": None, "commands": 0, "errors": 0, "clean": False, "last": None}
+    for record in read_journal(path):
+        event = record.get("event")
+        if event == "start":
+            info["profile"] = record.get("profile")
+            info["started"] = record.get("ts")
+        elif event == "command":
+            info["commands"] += 1
+            info["errors"] += not record.get("ok", True)
+            info["last"] = record
+        elif event == "end":
+            info["clean"] = True
+    return info
+
+
+def rebuild_command_log(path: Path, out, include_failed: bool = True) -> int:
+    """ジャーナルから再実行用のコマンドファイルを out に書き出し、行数を返す。"""
+    count = 0
+    for record in read_journal(path):
+        if record.get("event") != "command" or record.get("log") is None:
+            continue
+        if not include_failed and not record.get("ok", True):
+            continue
+        out.write(record["log"] + "\n")
+        count += 1
+    return count
+
+
+def _format_ts(ts: float | None) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)) if ts else "-"
+
+
+def main() -> None:
+    logs_dir = Path(__file__).resolve().parent.parent / "logs"
+    parser = argparse.ArgumentParser(description="セッションジャーナル（logs/session_*.jsonl）の確認と復元")
+    sub = parser.add_subparsers(dest="mode", required=True)
+    sub.add_parser("list", help="ジャーナル一覧（異常終了したセッションに印を付ける）")
+    p_show = sub.add_parser("show", help="ジャーナルの概要と最後のコマンドを表示")
+    p_show.add_argument("journal", type=Path)
+    p_rebuild = sub.add_parser("rebuild", help="再実行用のコマンドファイルを復元")
+    p_rebuild.add_argument("journal", type=Path)
+    p_rebuild.add_argument("-o", "--out", type=Path, help="出力先（省略時は標準出力）")
+    p_rebuild.add_argument("--skip-failed", action="store_true", help="失敗したコマンドを除く")
+    args = parser.parse_args()
+
+    if args.mode == "list":
+        for path in sorted(logs_dir.glob("session_*.jsonl")):
+            info = inspect_journal(path)
+            status = "正常終了" if info["clean"] else "異常終了"
+            print(f"{path.name}  {status}  {info['profile'] or '-'}  {info['commands']}コマンド / エラー {info['errors']}件")
+    elif args.mode == "show":
+        info = inspect_journal(args.journal)
+        print(f"プロファイル: {info['profile'] or '-'}")
+        print(f"開始: {_format_ts(info['started'])}")
+        print(f"状態: {'正常終了' if info['clean'] else '異常終了（end の記録なし）'}")
+        print(f"コマンド: {info['commands']}件 / エラー {info['errors']}件")
+        last = info["last"]
+        if last is not None:
+            result = "OK" if last["ok"] else f"エラー: {last['error']}"
+            print(f"最後のコマンド: [{last['seq']}] {last['cmd']} ({_format_ts(last['ts'])}, {last['ms']}ms, {result})")
+    elif args.mode == "rebuild":
+        if args.out:
+            with args.out.open("w", encoding="utf-8") as f:
+                count = rebuild_command_log(args.journal, f, include_failed=not args.skip_failed)
+            print(f"{count}行を復元しました: {args.out}", file=sys.stderr)
+        else:
+            rebuild_command_log(args.journal, sys.stdout, include_failed=not args.skip_failed)
+
+
+if __name__ == "__main__":
+    main()